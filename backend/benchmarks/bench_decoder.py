@@ -0,0 +1,70 @@
+"""
+Decoding of a provider page of hourly rows: `decodeRows` against the row-oriented pd.DataFrame path it replaced. The
+rows hold a float, an integer and a sparse float column, as parsed from JSON.
+
+    python benchmarks/bench_decoder.py [--rows 60000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from data.decoder import decodeRows
+
+
+def makeRows(rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2018-01-01", periods=rows, freq="h")
+    reserves = rng.random(rows).tolist()
+    counts = rng.integers(0, 10000, rows).tolist()
+    flows = [value if value > 0.1 else None for value in rng.random(rows).tolist()]
+
+    return [
+        { "start_time": int(timestamp.timestamp() * 1000), "datetime": str(timestamp), "reserve": reserve, "transactions_count": count, "inflow_mean": flow }
+        for timestamp, reserve, count, flow in zip(index, reserves, counts, flows)
+    ]
+
+
+def decodeRowsWithDataFrame(rows: List[Dict[str, Any]], prefix: str) -> pd.DataFrame:
+    """The decoding of DataLoader before `decodeRows`."""
+    data = pd.DataFrame(rows).drop(columns="start_time")
+    data["datetime"] = pd.to_datetime(data["datetime"])
+    data.set_index("datetime", inplace=True)
+    data.rename(columns={ name: f"{prefix}{name}" for name in data.columns }, inplace=True)
+    return data
+
+
+def bestOf(repeat: int, function, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=60000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = makeRows(args.rows)
+    pd.testing.assert_frame_equal(decodeRows(rows, prefix="exchange_"), decodeRowsWithDataFrame(rows, prefix="exchange_"))
+
+    dataFrameTime = bestOf(args.repeat, decodeRowsWithDataFrame, rows, prefix="exchange_")
+    decodeTime = bestOf(args.repeat, decodeRows, rows, prefix="exchange_")
+
+    print(f"rows: {args.rows}, best of {args.repeat}")
+    print(f"pd.DataFrame(rows): {dataFrameTime * 1000:.1f} ms")
+    print(f"decodeRows:         {decodeTime * 1000:.1f} ms ({dataFrameTime / decodeTime:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
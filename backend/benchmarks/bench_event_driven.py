@@ -0,0 +1,64 @@
+"""
+Throughput of the event-driven engine on synthetic hourly bars: a signal every ~50 bars on average, so about 600 round
+trips over 7 years, with a 2% stop-loss and a 3% take-profit attached to every entry.
+
+    python benchmarks/bench_event_driven.py [--bars 61320] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from engine.event_driven import EventDrivenBacktester
+from schemas.order import OrderStatus
+
+
+def makeData(bars: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.006, bars)))
+    openPrice = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.004, bars)) * close
+    data = pd.DataFrame({
+        "open": openPrice,
+        "high": np.maximum(openPrice, close) + spread,
+        "low": np.minimum(openPrice, close) - spread,
+        "close": close
+    }, index=pd.date_range("2018-01-01", periods=bars, freq="h"))
+
+    signals = np.zeros(bars)
+    events = rng.random(bars) < 1 / 50
+    signals[events] = rng.choice([1, -1], events.sum())
+    return data, signals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=61320)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data, signals = makeData(args.bars)
+    engine = EventDrivenBacktester(stopLoss=0.02, takeProfit=0.03)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = engine.runSignals(data, signals)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    orders = len(result.orders)
+    fills = sum(order.status == OrderStatus.COMPLETED for order in result.orders)
+    events = args.bars + orders + fills
+
+    print(f"bars: {args.bars}, orders: {orders}, fills: {fills}, round trips: {result.numberOfTrades}")
+    print(f"best of {args.repeat}: {best:.3f} s, {events / best:,.0f} events/s (bars + orders + fills)")
+
+
+if __name__ == "__main__":
+    main()
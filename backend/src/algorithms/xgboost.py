@@ -12,6 +12,8 @@ from sklearn.model_selection import (
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
+from pipeline.rolling import rollingZScore
+
 class XGBModel:
     def __init__(self, model_path: str = "models/xgb_model.joblib", random_state: int = 42):
         self.name = "xgb"
@@ -25,8 +27,7 @@ class XGBModel:
     
     def rolling_zscore(self, df: pd.DataFrame, window: int = 720) -> pd.DataFrame:
         """Apply rolling z-score for feature scaling."""
-        return (df - df.rolling(window=window, min_periods=1).mean()) / \
-               df.rolling(window=window, min_periods=1).std().replace(0, 1)  # Avoid division by zero
+        return rollingZScore(df, window=window, minPeriods=1)  # A zero deviation is replaced by 1 to avoid division by zero
     
     def fit(self, X: pd.DataFrame, y: pd.Series, optimize: bool = False, apply_rolling_zscore: bool = True, window: int = 720):
         """
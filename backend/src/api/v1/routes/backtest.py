@@ -4,7 +4,7 @@ from api.v1.routes.deps import getBacktesterService
 from services.backtester import BacktesterService
 from errors.base_exception import BacktesterError
 from schemas.base import ResponseModel
-from schemas.backtest import BacktestRequestModel, BacktestResponseModel
+from schemas.backtest import BacktestRequestModel, BacktestResponseModel, PortfolioRequestModel, PortfolioResponseModel, SweepRequestModel, SweepResponseModel
 
 backtestRouter = APIRouter(prefix="/backtest", tags=["Backtester"])
 
@@ -15,6 +15,28 @@ async def simulateTrade(request: BacktestRequestModel, backtestService: Backtest
 
     return ResponseModel(
         success=True,
-        data = BacktestResponseModel(),
+        data = result,
         error = None
-    )
\ No newline at end of file
+    )
+
+@backtestRouter.post("/sweep", response_model=ResponseModel[SweepResponseModel])
+async def sweepParameters(request: SweepRequestModel, backtestService: BacktesterService = Depends(getBacktesterService)):
+
+    result: SweepResponseModel = await backtestService.sweep(request)
+
+    return ResponseModel(
+        success=True,
+        data = result,
+        error = None
+    )
+
+@backtestRouter.post("/portfolio", response_model=ResponseModel[PortfolioResponseModel])
+async def simulatePortfolio(request: PortfolioRequestModel, backtestService: BacktesterService = Depends(getBacktesterService)):
+
+    result: PortfolioResponseModel = await backtestService.runPortfolio(request)
+
+    return ResponseModel(
+        success=True,
+        data = result,
+        error = None
+    )
@@ -1,6 +1,59 @@
-from pydantic_settings import BaseSettings
+import os
+from dotenv import load_dotenv
 
+load_dotenv()
 
-class BacktestDefaultConfig(BaseSettings):
-    mode: RuntimeMode.BACKTEST
-    
\ No newline at end of file
+class BacktestConfig:
+
+    # Exit assumed first on a bar reaching both the stop-loss and the take-profit: 'stop-first', 'target-first' or 'nearest-to-open'
+    EXIT_TIE_BREAK: str = os.getenv("BACKTEST_EXIT_TIE_BREAK", "stop-first")
+
+    # Bars per year of the dataset (hourly bars), to annualize the metrics
+    BARS_PER_YEAR: int = int(os.getenv("BACKTEST_BARS_PER_YEAR", 24 * 365))
+    # Elements of the (runs x bars) curves built at once by the batch simulations, bounds their memory
+    BATCH_CHUNK_SIZE: int = int(os.getenv("BACKTEST_BATCH_CHUNK_SIZE", 4 * 1024 ** 2))
+
+    # Worker processes of the parameter sweeps, one group of signals per task
+    SWEEP_WORKERS: int = int(os.getenv("BACKTEST_SWEEP_WORKERS", os.cpu_count() or 1))
+    # Maximum number of runs of a parameter sweep
+    SWEEP_MAX_RUNS: int = int(os.getenv("BACKTEST_SWEEP_MAX_RUNS", 100000))
+
+    # Permutation test of the strategies: number of permuted price paths, their method ('shuffle' or 'block') and
+    # block size in bars, the seed of their random streams and the metric tested
+    PERMUTATIONS: int = int(os.getenv("BACKTEST_PERMUTATIONS", 1000))
+    PERMUTATION_MAX_COUNT: int = int(os.getenv("BACKTEST_PERMUTATION_MAX_COUNT", 100000))
+    PERMUTATION_METHOD: str = os.getenv("BACKTEST_PERMUTATION_METHOD", "shuffle")
+    PERMUTATION_BLOCK_SIZE: int = int(os.getenv("BACKTEST_PERMUTATION_BLOCK_SIZE", 24))
+    PERMUTATION_SEED: int = int(os.getenv("BACKTEST_PERMUTATION_SEED", 42))
+    PERMUTATION_METRIC: str = os.getenv("BACKTEST_PERMUTATION_METRIC", "sharpeRatio")
+    # Worker processes of the permutation tests
+    PERMUTATION_WORKERS: int = int(os.getenv("BACKTEST_PERMUTATION_WORKERS", os.cpu_count() or 1))
+
+    # Bootstrap confidence intervals of the metrics: number of resampled return series, their method ('stationary' or
+    # 'block') and mean block size in bars, the confidence level of the intervals and the seed of their random streams
+    BOOTSTRAP_RESAMPLES: int = int(os.getenv("BACKTEST_BOOTSTRAP_RESAMPLES", 1000))
+    BOOTSTRAP_MAX_RESAMPLES: int = int(os.getenv("BACKTEST_BOOTSTRAP_MAX_RESAMPLES", 100000))
+    BOOTSTRAP_METHOD: str = os.getenv("BACKTEST_BOOTSTRAP_METHOD", "stationary")
+    BOOTSTRAP_BLOCK_SIZE: int = int(os.getenv("BACKTEST_BOOTSTRAP_BLOCK_SIZE", 24))
+    BOOTSTRAP_CONFIDENCE_LEVEL: float = float(os.getenv("BACKTEST_BOOTSTRAP_CONFIDENCE_LEVEL", 0.95))
+    BOOTSTRAP_SEED: int = int(os.getenv("BACKTEST_BOOTSTRAP_SEED", 42))
+    # Elements of the (resamples x bars) curves of a batch of resamples, as fast as larger batches for a quarter of the memory
+    BOOTSTRAP_BATCH_SIZE: int = int(os.getenv("BACKTEST_BOOTSTRAP_BATCH_SIZE", 1024 ** 2))
+    # Worker processes of the bootstrap, one batch of resamples per task. It runs in the request handler, and the
+    # default resamples of a year of hourly bars take a fraction of a second in-process, less than starting a pool
+    BOOTSTRAP_WORKERS: int = int(os.getenv("BACKTEST_BOOTSTRAP_WORKERS", 1))
+
+    # Walk-forward test: 'rolling' or 'expanding' train windows, their length and the length of the test windows in
+    # days, the minimum number of bars to train on, and whether the fold models optimize their hyperparameters
+    WALK_FORWARD_MODE: str = os.getenv("BACKTEST_WALK_FORWARD_MODE", "rolling")
+    WALK_FORWARD_TRAIN_DAYS: int = int(os.getenv("BACKTEST_WALK_FORWARD_TRAIN_DAYS", 365))
+    WALK_FORWARD_TEST_DAYS: int = int(os.getenv("BACKTEST_WALK_FORWARD_TEST_DAYS", 30))
+    WALK_FORWARD_MIN_TRAIN_BARS: int = int(os.getenv("BACKTEST_WALK_FORWARD_MIN_TRAIN_BARS", 24 * 30))
+    # Bars after a bar that the labels of the strategy models look at, purged from the end of every train window
+    WALK_FORWARD_LABEL_HORIZON: int = int(os.getenv("BACKTEST_WALK_FORWARD_LABEL_HORIZON", 24))
+    WALK_FORWARD_OPTIMIZE: bool = os.getenv("BACKTEST_WALK_FORWARD_OPTIMIZE", "false").lower() == "true"
+    # Worker processes fitting the fold models
+    WALK_FORWARD_WORKERS: int = int(os.getenv("BACKTEST_WALK_FORWARD_WORKERS", os.cpu_count() or 1))
+
+    # Bars between two rebalances of a multi-asset portfolio to its target weights, 0 to rebalance on changes only
+    PORTFOLIO_REBALANCE_PERIOD: int = int(os.getenv("BACKTEST_PORTFOLIO_REBALANCE_PERIOD", 24 * 7))
@@ -0,0 +1,53 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class DataConfig:
+
+    # Maximum number of in-flight requests shared by all categories in async ingestion
+    MAX_CONCURRENCY: int = int(os.getenv("DATA_MAX_CONCURRENCY", 8))
+    REQUEST_TIMEOUT: int = int(os.getenv("DATA_REQUEST_TIMEOUT", 60))
+    KEEPALIVE_TIMEOUT: int = int(os.getenv("DATA_KEEPALIVE_TIMEOUT", 30))
+    # Asset of the datasets stored without asset prefix (e.g. cryptoquant_market_data), the other assets are prefixed
+    DEFAULT_ASSET: str = os.getenv("DATA_DEFAULT_ASSET", "btc")
+    # Rows requested per page, the endpoints are paginated by `start_time` until the history is exhausted
+    PAGE_LIMIT: int = int(os.getenv("DATA_PAGE_LIMIT", 10000))
+
+    # On-disk response cache. A TTL <= 0 keeps the entries until they are evicted
+    CACHE_ENABLED: bool = os.getenv("DATA_CACHE_ENABLED", "true").lower() == "true"
+    CACHE_TTL: float = float(os.getenv("DATA_CACHE_TTL", 900))
+    CACHE_MAX_BYTES: int = int(os.getenv("DATA_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+    CACHE_REVALIDATE: bool = os.getenv("DATA_CACHE_REVALIDATE", "true").lower() == "true"
+
+    # Request scheduling per provider: token bucket rate limit, jittered exponential backoff and retry budget
+    RATE_LIMIT: float = float(os.getenv("DATA_RATE_LIMIT", 10))     # Sustained requests per second
+    RATE_LIMIT_BURST: int = int(os.getenv("DATA_RATE_LIMIT_BURST", 10))
+    MAX_RETRIES: int = int(os.getenv("DATA_MAX_RETRIES", 5))      # Per request
+    RETRY_BASE_DELAY: float = float(os.getenv("DATA_RETRY_BASE_DELAY", 0.5))
+    RETRY_MAX_DELAY: float = float(os.getenv("DATA_RETRY_MAX_DELAY", 30))
+    RETRY_BUDGET_RATIO: float = float(os.getenv("DATA_RETRY_BUDGET_RATIO", 0.2))    # Retries allowed per request made
+    RETRY_BUDGET_MIN: int = int(os.getenv("DATA_RETRY_BUDGET_MIN", 10))
+
+    # Storage backend of the raw categories and of the merged dataset: 'parquet', 'feather' or 'csv'
+    STORAGE_FORMAT: str = os.getenv("DATA_STORAGE_FORMAT", "parquet")
+    PARQUET_ROW_GROUP_SIZE: int = int(os.getenv("DATA_PARQUET_ROW_GROUP_SIZE", 24 * 90))   # ~1 quarter of hourly rows
+
+    # Alignment of the categories observed at different frequencies in the merged dataset: 'asof' or 'exact'
+    MERGE_ALIGNMENT: str = os.getenv("DATA_MERGE_ALIGNMENT", "asof")
+
+    # Cache of the computed feature columns, in memory (LRU entries) and on disk in the features directory (LRU bytes)
+    FEATURE_STORE_ENABLED: bool = os.getenv("DATA_FEATURE_STORE_ENABLED", "true").lower() == "true"
+    FEATURE_STORE_MAX_BYTES: int = int(os.getenv("DATA_FEATURE_STORE_MAX_BYTES", 512 * 1024 ** 2))
+    FEATURE_STORE_MEMORY_ENTRIES: int = int(os.getenv("DATA_FEATURE_STORE_MEMORY_ENTRIES", 64))
+
+    # Threads computing the independent features and column groups concurrently, 1 to compute them sequentially
+    FEATURE_WORKERS: int = int(os.getenv("DATA_FEATURE_WORKERS", os.cpu_count() or 1))
+    # Columns per group of the multi-column features. Fixed, so the results do not depend on the number of workers
+    FEATURE_COLUMN_GROUP_SIZE: int = int(os.getenv("DATA_FEATURE_COLUMN_GROUP_SIZE", 16))
+
+    # How the process-wide dataset cache detects changed files: 'mtime' (mtime + size) or 'hash' (content hash on mtime change)
+    DATASET_CACHE_VALIDATION: str = os.getenv("DATA_DATASET_CACHE_VALIDATION", "mtime")
+    # Bounds of the dataset cache, the least recently used datasets are evicted past either of them (the last one is kept)
+    DATASET_CACHE_MAX_ENTRIES: int = int(os.getenv("DATA_DATASET_CACHE_MAX_ENTRIES", 16))
+    DATASET_CACHE_MAX_BYTES: int = int(os.getenv("DATA_DATASET_CACHE_MAX_BYTES", 2 * 1024 ** 3))
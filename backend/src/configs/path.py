@@ -11,12 +11,13 @@ class PathConfig:
     DATA_DIR: str = f"{BASE_DIR}/data"
     RAW_DATA_DIR: str = f"{DATA_DIR}/raw"
     FEATURES_DIR: str = f"{DATA_DIR}/features"
+    CACHE_DIR: str = f"{DATA_DIR}/cache"
 
     MODELS_DIR: str = f"{BASE_DIR}/models"
 
     @staticmethod
     def createDirectories(self):
-        directories = [self.DATA_DIR, self.RAW_DATA_DIR, self.FEATURES_DIR, self.MODELS_DIR]
+        directories = [self.DATA_DIR, self.RAW_DATA_DIR, self.FEATURES_DIR, self.CACHE_DIR, self.MODELS_DIR]
 
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
@@ -1,18 +1,27 @@
 import os
+import json
+import asyncio
+import aiohttp
 import requests
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from configs.data import DataConfig
+from data.response_cache import ResponseCache
+from data.scheduler import RequestScheduler, getScheduler
 from errors.base_exception import BacktesterError
 
 load_dotenv()
 
 class APIClient:
 
-    def __init__(self, provider: Optional[str], apiKey: Optional[str]):
+    def __init__(self, provider: Optional[str], apiKey: Optional[str], cache: Optional[ResponseCache] = None, scheduler: Optional[RequestScheduler] = None):
         self.apiKey = os.getenv("CYBOTRADE_API_KEY") or apiKey
         self.baseUrl = os.getenv("CYBOTRADE_BASE_URL") or "https://api.datasource.cybotrade.rs"
         self.provider = provider or "cryptoquant"
+        self.cache = cache
+        self.scheduler = scheduler or getScheduler(self.provider)
+        self.session = requests.Session()   # Reuse keep-alive connections across endpoints
 
     def get(self, endpoint: str):
 
@@ -22,24 +31,236 @@ class APIClient:
         url = f"{self.baseUrl}/{self.provider}/{endpoint}"
         headers = { "X-API-Key": self.apiKey }
 
-        print("URL:", url)
+        if self.cache is not None:
+            cacheKey = self.cache.makeKey(self.provider, endpoint)
+            cached = self.cache.getFresh(cacheKey)
+            if cached is not None:
+                return cached
+            headers.update(self.cache.getConditionalHeaders(cacheKey))
+
+        try:
+            response = self._send(url, headers)
+
+            if response.status_code == 304:
+                cached = self.cache.revalidated(cacheKey) if self.cache is not None else None
+                if cached is not None:
+                    return cached
+
+                # The entry was evicted since the conditional request was sent: ask for the full response
+                response = self._send(url, { "X-API-Key": self.apiKey })
+                if response.status_code == 304:
+                    raise BacktesterError("data/fail-to-fetch-data", details=f"Not Modified (304) without a cached response: {url}")
 
-        try: 
-            response = requests.get(url, headers=headers, timeout=60)
             response.raise_for_status()
-            return response.json()
-    
+            data = response.json()
+
+            if self.cache is not None:
+                self.cache.store(cacheKey, url, response.content, response.headers)
+
+            return data
+
         except requests.exceptions.HTTPError as httpErr:
             raise BacktesterError("data/fail-to-fetch-data", details=f"HTTP Error occurred: {httpErr}")
-        
+
         except requests.exceptions.ConnectionError as connErr:
             raise BacktesterError("data/fail-to-fetch-data", details=f"Connection Error occurred: {connErr}")
-        
+
         except requests.exceptions.Timeout as timeoutErr:
             raise BacktesterError("data/fail-to-fetch-data", details=f"Connection Timeout: {timeoutErr}")
-        
+
         except requests.exceptions.JSONDecodeError as jsonErr:
             raise BacktesterError("data/fail-to-fetch-data", details=f"Error while decoding JSON: {jsonErr}")
-        
+
         except requests.exceptions.RequestException as err:
             raise BacktesterError("data/fail-to-fetch-data", details=f"Request Error: {err}")
+
+    def _send(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        """Send the request paced by the provider's scheduler, retrying throttled and transient failures."""
+        attempt = 0
+
+        while True:
+            self.scheduler.acquire()
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=DataConfig.REQUEST_TIMEOUT)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not self.scheduler.retry(attempt):
+                    raise
+            else:
+                if not self.scheduler.isRetryable(response.status_code):
+                    return response
+                if not self.scheduler.retry(attempt, response.status_code, response.headers.get("Retry-After")):
+                    return response     # Out of retries, the caller reports the HTTP error
+
+            attempt += 1
+
+    def paginate(self, endpoint: str, startTime: int, limit: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Follow the time-based pagination of an endpoint from `startTime` (unix ms), yielding one page of rows at a time.
+        Each page starts right after the last `start_time` of the previous one. Stop on a short or empty page.
+        """
+        cursor = startTime
+
+        while True:
+            page = self.get(_pageUrl(endpoint, cursor, limit))["data"]
+
+            if not page:
+                return
+
+            yield page
+
+            lastStartTime = max(int(row["start_time"]) for row in page)
+            if len(page) < limit or lastStartTime < cursor:
+                return
+
+            cursor = lastStartTime + 1
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncAPIClient:
+    """
+    Asynchronous counterpart of APIClient.
+    All requests share one aiohttp session, so connections are pooled and kept alive across endpoints and categories.
+    At most `maxConnections` requests are in flight at any time. Use it as an async context manager.
+    """
+
+    def __init__(
+            self,
+            provider: Optional[str],
+            apiKey: Optional[str],
+            maxConnections: int = DataConfig.MAX_CONCURRENCY,
+            cache: Optional[ResponseCache] = None,
+            scheduler: Optional[RequestScheduler] = None):
+        self.apiKey = os.getenv("CYBOTRADE_API_KEY") or apiKey
+        self.baseUrl = os.getenv("CYBOTRADE_BASE_URL") or "https://api.datasource.cybotrade.rs"
+        self.provider = provider or "cryptoquant"
+        self.cache = cache
+        self.scheduler = scheduler or getScheduler(self.provider)
+        self.maxConnections = maxConnections
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncAPIClient":
+        connector = aiohttp.TCPConnector(limit=self.maxConnections, keepalive_timeout=DataConfig.KEEPALIVE_TIMEOUT)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=DataConfig.REQUEST_TIMEOUT)
+        )
+        self.semaphore = asyncio.Semaphore(self.maxConnections)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, endpoint: str):
+
+        if self.apiKey is None:
+            raise BacktesterError("data/missing-api-key")
+
+        if self.session is None:
+            raise BacktesterError("data/fail-to-fetch-data", details="[BUG] AsyncAPIClient must be used inside `async with`.")
+
+        url = f"{self.baseUrl}/{self.provider}/{endpoint}"
+        headers = { "X-API-Key": self.apiKey }
+
+        if self.cache is not None:
+            cacheKey = self.cache.makeKey(self.provider, endpoint)
+            cached = self.cache.getFresh(cacheKey)
+            if cached is not None:
+                return cached
+            headers.update(self.cache.getConditionalHeaders(cacheKey))
+
+        try:
+            statusCode, responseHeaders, body = await self._send(url, headers)
+
+            if statusCode == 304:
+                cached = self.cache.revalidated(cacheKey) if self.cache is not None else None
+                if cached is not None:
+                    return cached
+
+                # The entry was evicted since the conditional request was sent: ask for the full response
+                statusCode, responseHeaders, body = await self._send(url, { "X-API-Key": self.apiKey })
+                if statusCode == 304:
+                    raise BacktesterError("data/fail-to-fetch-data", details=f"Not Modified (304) without a cached response: {url}")
+
+            data = json.loads(body)
+
+            if self.cache is not None:
+                self.cache.store(cacheKey, url, body, responseHeaders)
+
+            return data
+
+        except aiohttp.ClientResponseError as httpErr:
+            raise BacktesterError("data/fail-to-fetch-data", details=f"HTTP Error occurred: {httpErr}")
+
+        except aiohttp.ClientConnectionError as connErr:
+            raise BacktesterError("data/fail-to-fetch-data", details=f"Connection Error occurred: {connErr}")
+
+        except asyncio.TimeoutError as timeoutErr:
+            raise BacktesterError("data/fail-to-fetch-data", details=f"Connection Timeout: {timeoutErr}")
+
+        except json.JSONDecodeError as jsonErr:
+            raise BacktesterError("data/fail-to-fetch-data", details=f"Error while decoding JSON: {jsonErr}")
+
+        except aiohttp.ClientError as err:
+            raise BacktesterError("data/fail-to-fetch-data", details=f"Request Error: {err}")
+
+    async def _send(self, url: str, headers: Dict[str, str]) -> Tuple[int, Any, bytes]:
+        """Send the request paced by the provider's scheduler, retrying throttled and transient failures."""
+        attempt = 0
+
+        while True:
+            await self.scheduler.acquireAsync()
+            statusCode, retryAfter = None, None
+
+            try:
+                async with self.semaphore, self.session.get(url, headers=headers) as response:
+                    statusCode, retryAfter = response.status, response.headers.get("Retry-After")
+
+                    if not self.scheduler.isRetryable(statusCode):
+                        response.raise_for_status()
+                        return statusCode, response.headers, await response.read()
+
+                    try:
+                        response.raise_for_status()
+                    except aiohttp.ClientResponseError as httpErr:
+                        error = httpErr
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as connErr:
+                error = connErr
+
+            # The connection slot is released while waiting for the next attempt
+            if not await self.scheduler.retryAsync(attempt, statusCode, retryAfter):
+                raise error
+
+            attempt += 1
+
+    async def paginate(self, endpoint: str, startTime: int, limit: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Asynchronous version of `APIClient.paginate`."""
+        cursor = startTime
+
+        while True:
+            page = (await self.get(_pageUrl(endpoint, cursor, limit)))["data"]
+
+            if not page:
+                return
+
+            yield page
+
+            lastStartTime = max(int(row["start_time"]) for row in page)
+            if len(page) < limit or lastStartTime < cursor:
+                return
+
+            cursor = lastStartTime + 1
+
+
+def _pageUrl(endpoint: str, startTime: int, limit: int) -> str:
+    separator = "&" if "?" in endpoint else "?"
+    return f"{endpoint}{separator}start_time={startTime}&limit={limit}"
@@ -1,67 +1,240 @@
 import os
 import json
+import shutil
+import asyncio
+import tempfile
 import pandas as pd
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 
+from configs.data import DataConfig
 from configs.path import PathConfig
 from errors.base_exception import BacktesterError
-from data.api_client import APIClient
+from data.api_client import APIClient, AsyncAPIClient
+from data.decoder import decodeRows
+from data.response_cache import ResponseCache
+from data.scheduler import RequestScheduler
+from data.storage import DatasetStore
 from data.endpoints.endpoints import endpointsParams
 from utils.util import convertDatetimeToUnixTimestamp, getStartTime
 
+COLUMN_PREFIXES: Dict[str, str] = {
+    "miner-flows": "miner_",
+    "exchange-flows": "exchange_"
+}
+
+
+def getDatasetName(category: str, provider: str = "cryptoquant", asset: Optional[str] = None) -> str:
+    """Name of the stored dataset of a category of an asset. Only the datasets of the default asset have no asset prefix."""
+    category = category.replace("-", "_")   # Rename category
+    if asset is None or asset == DataConfig.DEFAULT_ASSET:
+        return f"{provider}_{category}"
+    return f"{provider}_{asset}_{category}"
+
+
+class EndpointSpool:
+    """Temporary files receiving the rows of one endpoint page by page, so a full history is never held in memory as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pagePaths: List[str] = []
+        self.rowCount = 0
+        self.columns: Optional[List[str]] = None
+        self.lastStartTime: Optional[int] = None
+        self.lastDatetime: Optional[pd.Timestamp] = None
+
+    def append(self, data: pd.DataFrame, lastStartTime: int) -> None:
+        pagePath = f"{self.path}_{len(self.pagePaths)}.feather"
+        data.reset_index().to_feather(pagePath)
+        self.pagePaths.append(pagePath)
+
+        self.rowCount += len(data)
+        self.columns = list(data.columns)
+        self.lastStartTime = max(lastStartTime, self.lastStartTime or lastStartTime)
+        self.lastDatetime = max(data.index.max(), self.lastDatetime or data.index.max())
+
+    def read(self) -> Optional[pd.DataFrame]:
+        if self.rowCount == 0:
+            return None
+        data = pd.concat([pd.read_feather(pagePath) for pagePath in self.pagePaths], ignore_index=True)
+        return data.set_index("datetime")
+
+
 class DataLoader:
-    """Responsible for fetching data from API providers and store into CSV format"""
+    """Responsible for fetching data from API providers and store it with the configured storage format"""
 
-    def __init__(self, apiKey: Optional[str] = None, provider: Optional[str] = "cryptoquant"):
+    def __init__(
+            self,
+            apiKey: Optional[str] = None,
+            provider: Optional[str] = "cryptoquant",
+            cache: Optional[ResponseCache] = None,
+            scheduler: Optional[RequestScheduler] = None,
+            asset: Optional[str] = None):
 
         if provider is not None and provider not in endpointsParams:
             raise BacktesterError("data/invalid-provider")
 
-        self.apiClient = APIClient(apiKey=apiKey, provider=provider)
+        if cache is None and DataConfig.CACHE_ENABLED:
+            cache = ResponseCache()
+
+        self.apiKey = apiKey
+        self.asset = asset or DataConfig.DEFAULT_ASSET     # Asset of the endpoints, e.g. 'btc' or 'eth'
+        self.cache = cache
+        self.store = DatasetStore(directory=PathConfig.RAW_DATA_DIR)
+        self.apiClient = APIClient(apiKey=apiKey, provider=provider, cache=cache, scheduler=scheduler)
         self.endpoints = endpointsParams[provider]
-        self.limit = 70000
+        self.limit = DataConfig.PAGE_LIMIT  # Rows per page
 
-    def run(self, category: str) -> None:
+    def run(self, category: str, incremental: bool = False) -> None:
+        """
+        Fetch all the endpoints of a category and store them into a single file.
+        Every endpoint is paginated by time and each page is spooled to disk as it arrives.
+        With `incremental=True`, only the rows newer than the last stored timestamp of each endpoint are requested
+        and merged into the existing file. Falls back to a full refresh if nothing has been stored yet.
+        """
+        self._validateCategory(category)
 
-        df: pd.DataFrame = pd.DataFrame()   # Clean the dataframe
-        dataframes: List[pd.DataFrame] = []
-        
-        startTime = getStartTime(dayInterval=7*365)   # Default 7 years
-        startTime = convertDatetimeToUnixTimestamp(startTime)
-        
-        if category not in self.endpoints:
-            raise BacktesterError("data/invalid-category")
+        state = self._loadState(category) if incremental else None
+        defaultStartTime = self._getDefaultStartTime()
+        spoolDir = self._createSpoolDir()
+
+        try:
+            spools: Dict[str, EndpointSpool] = {}
+
+            for endpoint, params in self.endpoints[category].items():
+                spool = EndpointSpool(f"{spoolDir}/{category}_{endpoint}")
+                startTime = self._getEndpointStartTime(state, endpoint, defaultStartTime)
+                endpointUrl = self._parseEndpointUrl(category, endpoint, params)
+
+                for page in self.apiClient.paginate(endpointUrl, startTime, self.limit):
+                    spool.append(*self._processResponse(category, endpoint, page))
+
+                spools[endpoint] = self._checkSpool(spool, allowEmpty=state is not None)
+
+            self._storeCategory(category, spools, state)
+
+        finally:
+            shutil.rmtree(spoolDir, ignore_errors=True)
+
+    def runAll(self, categories: Optional[List[str]] = None, maxConcurrency: Optional[int] = None, incremental: bool = False) -> None:
+        """Fetch several categories (all by default) concurrently. Blocking wrapper around `runAsync`."""
+        asyncio.run(self.runAsync(categories=categories, maxConcurrency=maxConcurrency, incremental=incremental))
+
+    async def runAsync(self, categories: Optional[List[str]] = None, maxConcurrency: Optional[int] = None, incremental: bool = False) -> None:
+        """
+        Fetch the endpoints of all the given categories concurrently over a shared connection pool.
+        `maxConcurrency` bounds the number of in-flight requests across all categories.
+        The output files are identical to calling `run` on each category.
+        """
+        categories = categories or list(self.endpoints.keys())
+        maxConcurrency = maxConcurrency or DataConfig.MAX_CONCURRENCY
+
+        for category in categories:
+            self._validateCategory(category)
+
+        startTime = self._getDefaultStartTime()
+
+        client = AsyncAPIClient(
+            provider=self.apiClient.provider,
+            apiKey=self.apiKey,
+            maxConnections=maxConcurrency,
+            cache=self.cache,
+            scheduler=self.apiClient.scheduler
+        )
+
+        async with client:
+            await asyncio.gather(*[
+                self._runCategoryAsync(client, category, startTime, incremental) for category in categories
+            ])
+
+    def runAssets(self, assets: List[str], categories: Optional[List[str]] = None, maxConcurrency: Optional[int] = None, incremental: bool = False) -> None:
+        """
+        Fetch the categories (all by default) of several assets concurrently, each into its own datasets (see
+        `getDatasetName`). The assets share the request cache and the rate limit of the provider, and split
+        `maxConcurrency` between them.
+        """
+        maxConcurrency = maxConcurrency or DataConfig.MAX_CONCURRENCY
+        loaders = [
+            DataLoader(apiKey=self.apiKey, provider=self.apiClient.provider, cache=self.cache, scheduler=self.apiClient.scheduler, asset=asset)
+            for asset in dict.fromkeys(assets)
+        ]
+        assetConcurrency = max(maxConcurrency // max(len(loaders), 1), 1)
+
+        async def runLoaders():
+            await asyncio.gather(*[
+                loader.runAsync(categories=categories, maxConcurrency=assetConcurrency, incremental=incremental) for loader in loaders
+            ])
+
+        asyncio.run(runLoaders())
+
+    async def _runCategoryAsync(self, client: AsyncAPIClient, category: str, defaultStartTime: int, incremental: bool) -> None:
+
+        state = self._loadState(category) if incremental else None
+        spoolDir = self._createSpoolDir()
+
+        async def fetch(endpoint: str, params: Dict[str, str]) -> EndpointSpool:
+            spool = EndpointSpool(f"{spoolDir}/{category}_{endpoint}")
+            startTime = self._getEndpointStartTime(state, endpoint, defaultStartTime)
+            endpointUrl = self._parseEndpointUrl(category, endpoint, params)
+
+            async for page in client.paginate(endpointUrl, startTime, self.limit):
+                spool.append(*self._processResponse(category, endpoint, page))
 
-        for endpoint, params in self.endpoints[category].items():
-            endpointUrl = self._parseEndpointUrl(category, startTime, endpoint, params)
-            response = self.apiClient.get(endpointUrl)["data"]
+            return self._checkSpool(spool, allowEmpty=state is not None)
 
-            if response is None or []:
-                raise BacktesterError("data/fail-to-fetch-data", details="Response data is empty.")
+        try:
+            # gather() keeps the endpoint order, so the columns are concatenated exactly like `run`
+            endpoints = list(self.endpoints[category].items())
+            results = await asyncio.gather(*[fetch(endpoint, params) for endpoint, params in endpoints])
+            spools = { endpoint: spool for (endpoint, _), spool in zip(endpoints, results) }
 
-            # Preprocess data
-            data = pd.DataFrame(response).drop(columns="start_time")
+            await asyncio.to_thread(self._storeCategory, category, spools, state)
 
-            # Replace 'date' with 'datetime'
-            if self.endpoints[category][endpoint]["window"] == "day":
-                data.rename(columns={"date": "datetime"}, inplace=True)
-                                
-            data["datetime"] = pd.to_datetime(data["datetime"])
-            data.set_index("datetime", inplace=True)
+        finally:
+            shutil.rmtree(spoolDir, ignore_errors=True)
 
-            # Add suffix for these two categories to avoid duplicated column names
-            if category == "miner-flows":
-                columnNames = data.columns
-                columnNames = { name: f"miner_{name}" for name in columnNames }
-                data.rename(columns=columnNames, inplace=True)
+    def _processResponse(self, category: str, endpoint: str, response: List[Dict[str, Any]]) -> tuple:
+        """
+        Decode a page of raw rows of an endpoint into a dataframe indexed by datetime (see `decodeRows` for the dtypes).
+        Also return the latest `start_time` (unix ms) of the page, used as the cursor of the next incremental refresh.
+        """
+        lastStartTime = max(int(row["start_time"]) for row in response)
 
-            elif category == "exchange-flows":
-                columnNames = data.columns
-                columnNames = { name: f"exchange_{name}" for name in columnNames }
-                data.rename(columns=columnNames, inplace=True)
+        # Daily endpoints are keyed by 'date' instead of 'datetime'
+        timeKey = "date" if self.endpoints[category][endpoint]["window"] == "day" else "datetime"
 
-            dataframes.append(data)
+        # Add a prefix for these categories to avoid duplicated column names
+        data = decodeRows(response, timeKey=timeKey, prefix=COLUMN_PREFIXES.get(category))
+
+        return data, lastStartTime
+
+    def _checkSpool(self, spool: EndpointSpool, allowEmpty: bool) -> EndpointSpool:
+        # An empty delta only means that there is no new row since the last refresh
+        if spool.rowCount == 0 and not allowEmpty:
+            raise BacktesterError("data/fail-to-fetch-data", details="Response data is empty.")
+        return spool
+
+    def _storeCategory(self, category: str, spools: Dict[str, EndpointSpool], state: Optional[Dict[str, Any]]) -> None:
+
+        if state is None:
+            self._mergeAndSave(category, [spool.read() for spool in spools.values()])
+            state = { "endpoints": {} }
+        else:
+            self._mergeDelta(category, spools, state)
+
+        for endpoint, spool in spools.items():
+            if spool.rowCount == 0:
+                continue    # Keep the previous cursor
+
+            state["endpoints"][endpoint] = {
+                "columns": spool.columns,
+                "lastStartTime": spool.lastStartTime,
+                "lastDatetime": str(spool.lastDatetime)
+            }
+
+        self._saveState(category, state)
+
+    def _mergeAndSave(self, category: str, dataframes: List[pd.DataFrame]) -> None:
 
         df = pd.concat(dataframes, sort=True, axis=1)
         df.sort_index(inplace=True)
@@ -72,19 +245,95 @@ class DataLoader:
 
         self.saveData(data=df, category=category, provider = self.apiClient.provider)
 
+    def _mergeDelta(self, category: str, spools: Dict[str, EndpointSpool], state: Dict[str, Any]) -> None:
+        """
+        Merge the newly fetched rows into the stored category file.
+        Only the boundary region, starting at the earliest last stored timestamp among the endpoints, is re-interpolated.
+        The rows before it are final: they lie between two real observations of every endpoint.
+        """
+        newData = [data for data in (spool.read() for spool in spools.values()) if data is not None]
+
+        if not newData:
+            return
+
+        existing = self.store.load(self._getDatasetName(category))
+
+        lastDatetimes = { endpoint: pd.Timestamp(meta["lastDatetime"]) for endpoint, meta in state["endpoints"].items() }
+        boundary = min(lastDatetimes.values())
+
+        head = existing.loc[existing.index < boundary]
+        region = existing.loc[existing.index >= boundary].copy()
+
+        # Values after the last real observation of an endpoint were forward-filled by the interpolation, discard them
+        for endpoint, meta in state["endpoints"].items():
+            columns = [column for column in meta["columns"] if column in region.columns]
+            region.loc[region.index > lastDatetimes[endpoint], columns] = float("nan")
+
+        fresh = pd.concat(newData, sort=True, axis=1)
+        region = fresh.combine_first(region)
+        region.sort_index(inplace=True)
+
+        # Clean data
+        region.drop_duplicates(inplace=True)
+        region.interpolate(method="linear", limit_direction="forward", inplace=True)
+
+        columns = list(existing.columns) + [column for column in region.columns if column not in existing.columns]
+        df = pd.concat([head, region], axis=0).reindex(columns=columns)
+
+        self.saveData(data=df, category=category, provider = self.apiClient.provider)
+
     def saveData(self, data: pd.DataFrame, category: str, provider: str):
+        self.store.save(data, self._getDatasetName(category, provider))
+
+    def _getDatasetName(self, category: str, provider: Optional[str] = None) -> str:
+        return getDatasetName(category, provider or self.apiClient.provider, self.asset)
+
+    def _getStatePath(self, category: str) -> str:
+        return f"{PathConfig.RAW_DATA_DIR}/{self._getDatasetName(category)}.state.json"
+
+    def _createSpoolDir(self) -> str:
         os.makedirs(PathConfig.RAW_DATA_DIR, exist_ok=True)
+        return tempfile.mkdtemp(prefix=".spool_", dir=PathConfig.RAW_DATA_DIR)
+
+    def _loadState(self, category: str) -> Optional[Dict[str, Any]]:
+        """Return the stored refresh state of a category, or None if a full refresh is required."""
+        statePath = self._getStatePath(category)
 
-        # Rename category
-        category = category.replace("-", "_")
-        outputPath = f"{PathConfig.RAW_DATA_DIR}/{provider}_{category}.csv"
-        data.to_csv(outputPath)
+        if not os.path.exists(statePath) or not self.store.exists(self._getDatasetName(category)):
+            print(f"[INFO] No stored data for '{category}', running a full refresh.")
+            return None
 
-    def _parseEndpointUrl(self, category: str, startTime: int, endpoint: str, params: Dict[str, str]) -> str:
-        endpointUrl = f"btc/{category}/{endpoint}?start_time={startTime}&limit={self.limit}"
+        with open(statePath, "r") as file:
+            state = json.load(file)
 
-        for key, value in params.items():
-            endpointUrl += f"&{key}={value}"
+        # A newly added endpoint has no history yet
+        if any(endpoint not in state["endpoints"] for endpoint in self.endpoints[category]):
+            print(f"[INFO] New endpoints found in '{category}', running a full refresh.")
+            return None
+
+        return state
+
+    def _saveState(self, category: str, state: Dict[str, Any]) -> None:
+        with open(self._getStatePath(category), "w") as file:
+            json.dump(state, file, indent=2)
+
+    def _getEndpointStartTime(self, state: Optional[Dict[str, Any]], endpoint: str, defaultStartTime: int) -> int:
+        if state is None:
+            return defaultStartTime
+        return state["endpoints"][endpoint]["lastStartTime"] + 1
+
+    def _validateCategory(self, category: str) -> None:
+        if category not in self.endpoints:
+            raise BacktesterError("data/invalid-category")
+
+    def _getDefaultStartTime(self) -> int:
+        startTime = getStartTime(dayInterval=7*365)   # Default 7 years
+        # Align on the day, so the request URLs (and their cached responses) stay the same across reruns
+        startTime = startTime.replace(hour=0, minute=0, second=0, microsecond=0)
+        return convertDatetimeToUnixTimestamp(startTime)
 
-        return endpointUrl
+    def _parseEndpointUrl(self, category: str, endpoint: str, params: Dict[str, str]) -> str:
+        """Endpoint path with its query parameters. The pagination parameters are added by the API client."""
+        query = "&".join(f"{key}={value}" for key, value in params.items())
+        return f"{self.asset}/{category}/{endpoint}?{query}"
 
@@ -0,0 +1,46 @@
+from itertools import chain
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+
+def decodeRows(rows: List[Dict[str, Any]], timeKey: str = "datetime", prefix: Optional[str] = None) -> pd.DataFrame:
+    """
+    Decode the rows of a provider response straight into typed columns.
+    Every value column becomes one array of the dtype pd.DataFrame(rows) would give it: int64 or bool when all its
+    values are, float64 when they are numbers and missing values (as NaN), else object (e.g. strings, even numeric
+    ones). `timeKey` becomes a datetime64[ns] index named 'datetime'. `start_time` is dropped and `prefix` is
+    prepended to the value columns.
+    The integer columns are not cast to float64: the features and the engines convert their inputs to float64.
+    """
+    # Union of the keys of all the rows, in the order first seen, like pd.DataFrame(rows). Usually the keys of the first row
+    keys = set().union(*rows)
+    columns: Dict[str, None] = dict.fromkeys(rows[0] if rows and len(keys) == len(rows[0]) else chain.from_iterable(rows))
+
+    if timeKey not in columns:
+        raise KeyError(timeKey)
+
+    index = pd.DatetimeIndex(
+        pd.to_datetime(np.array([row.get(timeKey) for row in rows], dtype=object), format="ISO8601"),
+        name="datetime"
+    )
+
+    data = {}
+    for column in columns:
+        if column in ("start_time", timeKey):
+            continue
+
+        values = [row.get(column) for row in rows]
+        array = np.array(values)
+        if array.dtype.kind not in "biuf":
+            array = np.array(values, dtype=np.float64 if _isNumeric(values) else object)    # None is converted to NaN
+
+        data[f"{prefix}{column}" if prefix else column] = array
+
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def _isNumeric(values: List[Any]) -> bool:
+    """Whether the values are numbers and missing values, with at least one number."""
+    types = set(map(type, values))
+    return bool(types & { int, float }) and types <= { int, float, type(None) }
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+from configs.data import DataConfig
+from configs.path import PathConfig
+
+
+class ResponseCache:
+    """
+    On-disk cache of provider responses.
+    Entries are addressed by the hash of (provider, endpoint path, sorted query parameters), so the same request
+    made by another job or a rerun is served from disk. Stale entries can be revalidated with a conditional request
+    (ETag / Last-Modified), and the least recently used entries are evicted once the cache exceeds `maxBytes`.
+    """
+
+    def __init__(
+            self,
+            cacheDir: str = PathConfig.CACHE_DIR,
+            ttl: float = DataConfig.CACHE_TTL,
+            maxBytes: int = DataConfig.CACHE_MAX_BYTES,
+            revalidate: bool = DataConfig.CACHE_REVALIDATE):
+        self.cacheDir = cacheDir
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.revalidate = revalidate
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = { "hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0 }
+
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    @staticmethod
+    def makeKey(provider: str, endpoint: str) -> str:
+        path, _, query = endpoint.partition("?")
+        params = sorted(parse_qsl(query, keep_blank_values=True))
+        return hashlib.sha256(json.dumps([provider, path, params]).encode()).hexdigest()
+
+    def getFresh(self, key: str) -> Optional[Any]:
+        """
+        Return the cached JSON if the entry exists and has not expired. Counts as a hit, and any other lookup as a miss
+        whether the request then fails or not (a stale entry renewed by a 304 is also counted as revalidated).
+        """
+        meta = self._readMeta(key)
+        data = self._readBody(key) if meta is not None and self._isFresh(meta) else None
+
+        self._record("hits" if data is not None else "misses")
+        return data
+
+    def getConditionalHeaders(self, key: str) -> Dict[str, str]:
+        """Validators of a stale entry, to be sent with the request so the provider can answer 304 Not Modified."""
+        meta = self._readMeta(key)
+
+        if not self.revalidate or meta is None:
+            return {}
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("lastModified"):
+            headers["If-Modified-Since"] = meta["lastModified"]
+        return headers
+
+    def revalidated(self, key: str) -> Optional[Any]:
+        """Renew a stale entry after a 304 response and return its JSON."""
+        meta = self._readMeta(key)
+
+        if meta is None:
+            return None
+
+        meta["storedAt"] = time.time()
+        self._writeAtomic(self._metaPath(key), json.dumps(meta).encode())
+
+        data = self._readBody(key)
+        if data is not None:
+            self._record("revalidated")
+        return data
+
+    def store(self, key: str, url: str, body: bytes, headers: Dict[str, str]) -> None:
+        meta = {
+            "url": url,
+            "storedAt": time.time(),
+            "size": len(body),
+            "etag": headers.get("ETag"),
+            "lastModified": headers.get("Last-Modified")
+        }
+
+        self._writeAtomic(self._bodyPath(key), body)
+        self._writeAtomic(self._metaPath(key), json.dumps(meta).encode())
+        self._record("stores")
+
+        self._evict()
+
+    def getStats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+
+        # The revalidated lookups are misses served from the cache
+        lookups = stats["hits"] + stats["misses"]
+        stats["hitRate"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        stats["sizeBytes"] = sum(size for _, size, _ in self._listEntries())
+        return stats
+
+    def clear(self) -> None:
+        for key, _, _ in self._listEntries():
+            self._remove(key)
+
+    def _isFresh(self, meta: Dict[str, Any]) -> bool:
+        return self.ttl <= 0 or time.time() - meta["storedAt"] < self.ttl
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits into `maxBytes`."""
+        entries = self._listEntries()
+        totalBytes = sum(size for _, size, _ in entries)
+
+        for key, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if totalBytes <= self.maxBytes:
+                break
+            self._remove(key)
+            totalBytes -= size
+            self._record("evictions")
+
+    def _listEntries(self) -> list:
+        """(key, size, last access time) of every entry."""
+        entries = []
+
+        for name in os.listdir(self.cacheDir):
+            if not name.endswith(".body"):
+                continue
+            try:
+                stat = os.stat(f"{self.cacheDir}/{name}")
+            except FileNotFoundError:
+                continue    # Evicted by another process
+            entries.append((name[:-len(".body")], stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _readMeta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._metaPath(key), "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _readBody(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._bodyPath(key), "rb") as file:
+                data = json.loads(file.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._remove(key)   # Corrupted or partially evicted entry
+            return None
+
+        os.utime(self._bodyPath(key))   # Mark as recently used
+        return data
+
+    def _remove(self, key: str) -> None:
+        for path in (self._bodyPath(key), self._metaPath(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _writeAtomic(self, path: str, content: bytes) -> None:
+        tempPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tempPath, "wb") as file:
+            file.write(content)
+        os.replace(tempPath, path)
+
+    def _record(self, stat: str) -> None:
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _bodyPath(self, key: str) -> str:
+        return f"{self.cacheDir}/{key}.body"
+
+    def _metaPath(self, key: str) -> str:
+        return f"{self.cacheDir}/{key}.meta.json"
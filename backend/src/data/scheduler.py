@@ -0,0 +1,159 @@
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from configs.data import DataConfig
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, up to `capacity`.
+    `reserve` takes a token immediately and returns how long the caller has to wait before using it,
+    so the same bucket serves both the threaded and the asyncio clients.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updatedAt = time.monotonic()
+        self.pausedUntil = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updatedAt) * self.rate)
+            self.updatedAt = now
+            self.tokens -= 1
+
+            return max(0.0, -self.tokens / self.rate, self.pausedUntil - now)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds`, e.g. when the provider answers 429 with a Retry-After."""
+        with self.lock:
+            self.pausedUntil = max(self.pausedUntil, time.monotonic() + seconds)
+
+
+class RequestScheduler:
+    """
+    Schedule the requests made to one provider.
+    Requests are paced by a token bucket so the sustained rate stays under the provider's quota.
+    Throttled (429), transient server errors (5xx) and connection failures are retried with jittered exponential backoff,
+    bounded per request by `maxRetries` and globally by a retry budget proportional to the number of requests made.
+    """
+
+    RETRYABLE_STATUS_CODES = { 429, 500, 502, 503, 504 }
+
+    def __init__(
+            self,
+            rate: float = DataConfig.RATE_LIMIT,
+            burst: int = DataConfig.RATE_LIMIT_BURST,
+            maxRetries: int = DataConfig.MAX_RETRIES,
+            baseDelay: float = DataConfig.RETRY_BASE_DELAY,
+            maxDelay: float = DataConfig.RETRY_MAX_DELAY,
+            budgetRatio: float = DataConfig.RETRY_BUDGET_RATIO,
+            minBudget: int = DataConfig.RETRY_BUDGET_MIN,
+            seed: Optional[int] = None):
+        self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.budgetRatio = budgetRatio
+        self.minBudget = minBudget
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = { "requests": 0, "retries": 0, "throttled": 0, "budgetExhausted": 0 }
+
+    def acquire(self) -> None:
+        self._countRequest()
+        time.sleep(self.bucket.reserve())
+
+    async def acquireAsync(self) -> None:
+        self._countRequest()
+        await asyncio.sleep(self.bucket.reserve())
+
+    def isRetryable(self, statusCode: int) -> bool:
+        return statusCode in self.RETRYABLE_STATUS_CODES
+
+    def retry(self, attempt: int, statusCode: Optional[int] = None, retryAfter: Optional[str] = None) -> bool:
+        """Wait before the next attempt and return True, or return False if the request must not be retried."""
+        delay = self._getRetryDelay(attempt, statusCode, retryAfter)
+        if delay is None:
+            return False
+
+        time.sleep(delay)
+        return True
+
+    async def retryAsync(self, attempt: int, statusCode: Optional[int] = None, retryAfter: Optional[str] = None) -> bool:
+        delay = self._getRetryDelay(attempt, statusCode, retryAfter)
+        if delay is None:
+            return False
+
+        await asyncio.sleep(delay)
+        return True
+
+    def getStats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.stats)
+
+    def _getRetryDelay(self, attempt: int, statusCode: Optional[int], retryAfter: Optional[str]) -> Optional[float]:
+
+        with self.lock:
+            if attempt >= self.maxRetries:
+                return None
+
+            if self.stats["retries"] >= self.minBudget + self.budgetRatio * self.stats["requests"]:
+                self.stats["budgetExhausted"] += 1
+                return None
+
+            self.stats["retries"] += 1
+            if statusCode == 429:
+                self.stats["throttled"] += 1
+
+            # Full jitter: spread the retries of concurrent requests instead of retrying in lockstep
+            delay = self.random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+        retryAfterSeconds = _parseRetryAfter(retryAfter)
+        if retryAfterSeconds is not None:
+            retryAfterSeconds = min(retryAfterSeconds, self.maxDelay)
+            self.bucket.pause(retryAfterSeconds)    # Every request to this provider waits, not only this one
+            delay = max(delay, retryAfterSeconds)
+
+        return delay
+
+    def _countRequest(self) -> None:
+        with self.lock:
+            self.stats["requests"] += 1
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulersLock = threading.Lock()
+
+def getScheduler(provider: str) -> RequestScheduler:
+    """Return the scheduler shared by all the clients of a provider in this process."""
+    with _schedulersLock:
+        if provider not in _schedulers:
+            _schedulers[provider] = RequestScheduler()
+        return _schedulers[provider]
+
+def _parseRetryAfter(retryAfter: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not retryAfter:
+        return None
+
+    try:
+        return max(0.0, float(retryAfter))
+    except ValueError:
+        pass
+
+    try:
+        retryAt = parsedate_to_datetime(retryAfter)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retryAt - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,164 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from enum import Enum
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+from configs.data import DataConfig
+from configs.path import PathConfig
+from errors.base_exception import BacktesterError
+
+
+class StorageFormat(str, Enum):
+    PARQUET = "parquet"
+    FEATHER = "feather"
+    CSV = "csv"
+
+
+class DatasetStore:
+    """
+    Read and write the datasets (tables indexed by datetime) of a directory.
+    The columnar formats keep a typed datetime64 index and the dtype of every column, and load an order of magnitude
+    faster than CSV. CSV remains available as a storage format and as an export.
+    """
+
+    def __init__(self, directory: Optional[str] = None, storageFormat: str = DataConfig.STORAGE_FORMAT):
+
+        if storageFormat not in StorageFormat._value2member_map_:
+            raise BacktesterError("data/invalid-storage-format")
+
+        self.directory = directory or PathConfig.RAW_DATA_DIR
+        self.storageFormat = StorageFormat(storageFormat)
+
+    def getPath(self, name: str, storageFormat: Optional[StorageFormat] = None) -> str:
+        storageFormat = StorageFormat(storageFormat or self.storageFormat)
+        return f"{self.directory}/{name}.{storageFormat.value}"
+
+    def findPath(self, name: str) -> Optional[str]:
+        """Path of the stored dataset, looking at the configured format first, then at the other ones."""
+        storageFormats = [self.storageFormat] + [fmt for fmt in StorageFormat if fmt != self.storageFormat]
+
+        for storageFormat in storageFormats:
+            path = self.getPath(name, storageFormat)
+            if os.path.exists(path):
+                return path
+
+        return None
+
+    def exists(self, name: str) -> bool:
+        return self.findPath(name) is not None
+
+    def getColumns(self, name: str) -> List[str]:
+        """Column names of a stored dataset, read from its schema or header only."""
+        path = self.findPath(name)
+
+        if path is None:
+            raise BacktesterError("feature/data-not-found", details=f"'{name}' does not exist in {self.directory}.")
+
+        if path.endswith(StorageFormat.PARQUET.value):
+            names = pq.read_schema(path).names
+        elif path.endswith(StorageFormat.FEATHER.value):
+            names = pa.ipc.open_file(path).schema.names
+        else:
+            names = list(pd.read_csv(path, nrows=0).columns)
+
+        return [name for name in names if name != "datetime"]
+
+    def save(self, data: pd.DataFrame, name: str, storageFormat: Optional[StorageFormat] = None) -> str:
+        """Write the dataset atomically, so concurrent readers never see a partial file."""
+        storageFormat = StorageFormat(storageFormat or self.storageFormat)
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self.getPath(name, storageFormat)
+        tempPath = f"{path}.{os.getpid()}.tmp"
+        data = data.rename_axis("datetime")
+
+        if storageFormat == StorageFormat.PARQUET:
+            data.to_parquet(tempPath, engine="pyarrow", row_group_size=DataConfig.PARQUET_ROW_GROUP_SIZE)
+        elif storageFormat == StorageFormat.FEATHER:
+            data.reset_index().to_feather(tempPath)
+        else:
+            data.to_csv(tempPath)
+
+        os.replace(tempPath, path)
+        return path
+
+    def load(
+            self,
+            name: str,
+            columns: Optional[List[str]] = None,
+            start: Union[date, datetime, str, None] = None,
+            end: Union[date, datetime, str, None] = None) -> pd.DataFrame:
+        """
+        Load a dataset with a DatetimeIndex named 'datetime', in whichever format it is stored.
+        Only `columns` and the rows between `start` and `end` (inclusive, a date includes the whole day) are returned.
+        With Parquet, both are pushed down to the reader: the other columns and the row groups outside the range are not read.
+        """
+        path = self.findPath(name)
+
+        if path is None:
+            raise BacktesterError("feature/data-not-found", details=f"'{name}' does not exist in {self.directory}.")
+
+        startTime, endTime = _getTimeBounds(start, end)
+
+        try:
+            if path.endswith(StorageFormat.PARQUET.value):
+                filters = []
+                if startTime is not None:
+                    filters.append(("datetime", ">=", startTime))
+                if endTime is not None:
+                    filters.append(("datetime", "<", endTime))
+
+                data = pd.read_parquet(path, engine="pyarrow", columns=columns, filters=filters or None)
+
+            elif path.endswith(StorageFormat.FEATHER.value):
+                data = pd.read_feather(path, columns=None if columns is None else ["datetime"] + columns)
+                data.set_index("datetime", inplace=True)
+
+            else:
+                data = pd.read_csv(path, usecols=None if columns is None else ["datetime"] + columns, float_precision="round_trip")
+                data["datetime"] = pd.to_datetime(data["datetime"])
+                data.set_index("datetime", inplace=True)
+
+        except (OSError, ValueError, KeyError) as e:
+            raise BacktesterError("feature/fail-to-load-data", details=f"Error while reading {path}: {e}")
+
+        # Feather and CSV have no predicate pushdown, slice after reading
+        if startTime is not None:
+            data = data.loc[data.index >= startTime]
+        if endTime is not None:
+            data = data.loc[data.index < endTime]
+
+        return data
+
+    def loadColumn(
+            self,
+            names: Dict[str, str],
+            column: str,
+            start: Union[date, datetime, str, None] = None,
+            end: Union[date, datetime, str, None] = None) -> pd.DataFrame:
+        """
+        One column of several datasets side by side, e.g. the close of every asset: a column per key of `names`
+        (key -> dataset name), on the union of their datetimes. Only that column of every dataset is read.
+        """
+        return pd.DataFrame({ key: self.load(name, columns=[column], start=start, end=end)[column] for key, name in names.items() })
+
+    def export(self, name: str, outputPath: Optional[str] = None) -> str:
+        """Export a stored dataset to CSV."""
+        outputPath = outputPath or self.getPath(name, StorageFormat.CSV)
+        self.load(name).to_csv(outputPath)
+        return outputPath
+
+
+def _getTimeBounds(start: Union[date, datetime, str, None], end: Union[date, datetime, str, None]) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """Inclusive start and exclusive end timestamps. An end given as a date covers that whole day."""
+    startTime = pd.Timestamp(start) if start is not None else None
+    endTime = None
+
+    if end is not None:
+        isDateOnly = (isinstance(end, date) and not isinstance(end, datetime)) or (isinstance(end, str) and len(end) <= 10)
+        endTime = pd.Timestamp(end) + (timedelta(days=1) if isDateOnly else pd.Timedelta(1, "ns"))
+
+    return startTime, endTime
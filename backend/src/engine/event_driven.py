@@ -0,0 +1,482 @@
+from typing import Callable, Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+
+from errors.base_exception import BacktesterError
+from metrics.performance import getCurves, getPerformanceMetrics
+from schemas.backtest import BacktestResponseModel, PerformanceMetricsModel
+from schemas.order import Order, OrderSide, OrderStatus, OrderType
+from schemas.position import Position
+from schemas.trade import TradePortfolio
+
+BUY, SELL = 1, -1
+
+
+class OrderRecord:
+    """Working state of an order inside the engine, converted to the `Order` model only at the API boundary."""
+
+    __slots__ = (
+        "id", "bar", "side", "orderType", "quantity", "price", "stopPrice", "status", "triggered",
+        "fillBar", "fillPrice", "commission", "ocoGroup", "isProtective", "cancelReason"
+    )
+
+    def __init__(self, id: int, bar: int, side: int, orderType: OrderType, quantity: float, price: Optional[float], stopPrice: Optional[float], ocoGroup: int = -1):
+        self.id = id
+        self.bar = bar                      # Bar of the submission, the order is matched from the next bar
+        self.side = side                    # BUY = 1, SELL = -1
+        self.orderType = orderType
+        self.quantity = quantity
+        self.price = price                  # Limit price of LIMIT, STOP_LIMIT and TAKE_PROFIT orders
+        self.stopPrice = stopPrice          # Trigger price of STOP and STOP_LIMIT orders
+        self.status = OrderStatus.PENDING
+        self.triggered = False              # STOP_LIMIT orders turn into limit orders once triggered
+        self.fillBar = -1
+        self.fillPrice = np.nan
+        self.commission = 0.0
+        self.ocoGroup = ocoGroup            # Orders of the same group cancel each other once one is filled
+        self.isProtective = False           # Stop-loss or take-profit placed by the engine, not by the strategy
+        self.cancelReason: Optional[str] = None
+
+
+class PositionRecord:
+    """Position of the traded asset inside the engine."""
+
+    __slots__ = ("quantity", "avgEntryPrice", "realizedPnl")
+
+    def __init__(self):
+        self.quantity = 0.0
+        self.avgEntryPrice = 0.0
+        self.realizedPnl = 0.0
+
+
+class TradeLog:
+    """Fills of the simulation in preallocated arrays, doubled when full."""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.bars = np.empty(capacity, dtype=np.int64)
+        self.orderIds = np.empty(capacity, dtype=np.int64)
+        self.sides = np.empty(capacity, dtype=np.int8)
+        self.quantities = np.empty(capacity)
+        self.prices = np.empty(capacity)
+        self.commissions = np.empty(capacity)
+
+    def append(self, bar: int, orderId: int, side: int, quantity: float, price: float, commission: float) -> None:
+        if self.size == len(self.bars):
+            self._grow()
+
+        index = self.size
+        self.bars[index] = bar
+        self.orderIds[index] = orderId
+        self.sides[index] = side
+        self.quantities[index] = quantity
+        self.prices[index] = price
+        self.commissions[index] = commission
+        self.size += 1
+
+    def toFrame(self, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        bars = self.bars[:self.size]
+        return pd.DataFrame({
+            "timestamp": index[bars] if index is not None else bars,
+            "orderId": self.orderIds[:self.size],
+            "side": self.sides[:self.size],
+            "quantity": self.quantities[:self.size],
+            "price": self.prices[:self.size],
+            "commission": self.commissions[:self.size]
+        })
+
+    def _grow(self) -> None:
+        for name in ("bars", "orderIds", "sides", "quantities", "prices", "commissions"):
+            array = getattr(self, name)
+            grown = np.empty(2 * len(array), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+class EventBacktestResult:
+    """Curves, orders and fills of an event-driven simulation."""
+
+    def __init__(self, index: Optional[pd.Index], initialCapital: float, equity: np.ndarray, cash: np.ndarray, positions: np.ndarray, orders: List[OrderRecord], trades: TradeLog, position: PositionRecord, lastPrice: float):
+        self.index = index
+        self.initialCapital = initialCapital
+        self.equity = equity
+        self.cash = cash
+        self.positions = positions
+        self.orders = orders
+        self.trades = trades
+        self.position = position
+        self.lastPrice = lastPrice
+
+    @property
+    def finalEquity(self) -> float:
+        return float(self.equity[-1]) if len(self.equity) else self.initialCapital
+
+    @property
+    def numberOfTrades(self) -> int:
+        """Number of round trips: the entries into a position."""
+        if self.trades.size == 0:
+            return 0
+        return int(np.count_nonzero(np.diff(self.positions > 0, prepend=False) & (self.positions > 0)))
+
+    def getMetrics(self) -> Dict[str, float]:
+        """
+        Performance metrics of the simulation (see `getPerformanceMetrics`). A trade is a round trip from flat to flat,
+        its profit the change of the equity from the bar before its entry to its exit, commissions included.
+        """
+        changes = np.diff((self.positions > 0).astype(np.int8), prepend=0)
+        entryBars, exitBars = np.flatnonzero(changes == 1), np.flatnonzero(changes == -1)
+        tradeReturns = self.equity[exitBars] - np.concatenate([[self.initialCapital], self.equity])[entryBars[:len(exitBars)]]
+
+        bars = self.trades.bars[:self.trades.size]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            turnover = self.trades.quantities[:self.trades.size] * self.trades.prices[:self.trades.size] / self.equity[bars]
+            exposure = 1 - self.cash / self.equity
+
+        return getPerformanceMetrics(self.equity, self.initialCapital, tradeReturns, exposure, turnover)
+
+    def toResponseModel(self) -> BacktestResponseModel:
+        metrics = self.getMetrics()
+        equityCurve, drawdownCurve = getCurves(self.equity, self.index)
+
+        return BacktestResponseModel(
+            backtestResult=self.finalEquity / self.initialCapital,
+            initialCapital=self.initialCapital,
+            finalEquity=self.finalEquity,
+            totalReturn=self.finalEquity / self.initialCapital - 1,
+            totalCommission=float(self.trades.commissions[:self.trades.size].sum()),
+            numberOfTrades=self.numberOfTrades,
+            metrics=PerformanceMetricsModel(**{
+                name: float(value) if np.isfinite(value) else None for name, value in metrics.items() if name in PerformanceMetricsModel.model_fields
+            }),
+            portfolio=TradePortfolio(
+                initialCapital=self.initialCapital,
+                finalEquity=self.finalEquity,
+                equityCurve=equityCurve,
+                drawdownCurve=drawdownCurve
+            )
+        )
+
+    def toOrders(self, asset: str = "btc") -> List[Order]:
+        """The orders as `Order` models."""
+        orders = []
+        for order in self.orders:
+            timestamp = self.index[order.bar] if self.index is not None else pd.Timestamp(order.bar)
+            filled = order.status == OrderStatus.COMPLETED
+            orders.append(Order(
+                timestamp=timestamp,
+                asset=asset,
+                orderType=order.orderType,
+                orderSide=OrderSide.BUY if order.side == BUY else OrderSide.SELL,
+                status=order.status,
+                quantity=order.quantity,
+                price=order.price if order.price is not None else order.stopPrice,
+                executionPrice=order.fillPrice if filled else None,
+                executionTimestamp=(self.index[order.fillBar] if self.index is not None else None) if filled else None,
+                commissionFee=order.commission,
+                cancelReason=order.cancelReason
+            ))
+        return orders
+
+    def toPosition(self, asset: str = "btc") -> Position:
+        """The final position as a `Position` model."""
+        position = Position(
+            asset=asset,
+            quantity=self.position.quantity,
+            avgEntryPrice=self.position.avgEntryPrice,
+            currentPrice=self.lastPrice,
+            realizedPnl=self.position.realizedPnl
+        )
+        position.updateUnrealizedPnl()
+        return position
+
+
+class EventDrivenBacktester:
+    """
+    Long-only, bar by bar simulation for path-dependent strategies: limit, stop and stop-limit orders, and the
+    stop-loss and take-profit attached to every entry.
+    Every bar, the working orders are matched against its open, high and low in the order of their submission, the
+    equity is marked at its close, then the strategy is called with the bar and submits or cancels orders, which are
+    matched from the next bar. A price gap through the order price fills at the open.
+    The orders, the position and the fills live in `__slots__` records and preallocated arrays, the pydantic models
+    are only built from the result.
+    """
+
+    def __init__(
+            self,
+            initialCapital: float = 100000.0,
+            commissionRate: float = 0.0006,
+            minCommission: float = 0.0,
+            stopLoss: Optional[float] = None,
+            takeProfit: Optional[float] = None):
+        self.initialCapital = initialCapital
+        self.commissionRate = commissionRate
+        self.minCommission = minCommission
+        self.stopLoss = stopLoss            # Fraction of the entry price below it
+        self.takeProfit = takeProfit        # Fraction of the entry price above it
+        self._reset()
+
+    def _reset(self) -> None:
+        self.bar = -1
+        self.cash = self.initialCapital
+        self.position = PositionRecord()
+        self.orders: List[OrderRecord] = []
+        self.workingOrders: List[OrderRecord] = []
+        self.trades = TradeLog()
+        self.close = np.nan
+
+    def submitOrder(
+            self,
+            side: Union[OrderSide, int],
+            quantity: float,
+            orderType: OrderType = OrderType.MARKET,
+            price: Optional[float] = None,
+            stopPrice: Optional[float] = None,
+            ocoGroup: int = -1) -> int:
+        """Submit an order at the current bar, matched from the next one. Return the id of the order."""
+        side = (BUY if side == OrderSide.BUY else SELL) if isinstance(side, OrderSide) else side
+
+        if quantity <= 0:
+            raise BacktesterError("trade/invalid-order-quantity")
+
+        if orderType in (OrderType.LIMIT, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT) and (price is None or price <= 0):
+            raise BacktesterError("trade/invalid-order-price", details=f"A {orderType.value} order needs a limit price.")
+
+        if orderType in (OrderType.STOP, OrderType.STOP_LIMIT) and (stopPrice is None or stopPrice <= 0):
+            raise BacktesterError("trade/invalid-order-price", details=f"A {orderType.value} order needs a stop price.")
+
+        order = OrderRecord(len(self.orders), self.bar, side, orderType, quantity, price, stopPrice, ocoGroup)
+        self.orders.append(order)
+        self.workingOrders.append(order)
+        return order.id
+
+    def cancelOrder(self, orderId: int, reason: Optional[str] = None) -> None:
+        order = self.orders[orderId]
+        if order.status == OrderStatus.PENDING:
+            order.status = OrderStatus.CANCELLED
+            order.cancelReason = reason
+            self.workingOrders.remove(order)
+
+    def buyFraction(self, fraction: float, orderType: OrderType = OrderType.MARKET, price: Optional[float] = None, stopPrice: Optional[float] = None) -> Optional[int]:
+        """Buy with a fraction of the cash, valued at the close of the current bar and commissions included."""
+        reference = price if price is not None else (stopPrice if stopPrice is not None else self.close)
+        quantity = fraction * self.cash / (reference * (1 + self.commissionRate))
+        return self.submitOrder(BUY, quantity, orderType, price, stopPrice) if quantity > 0 else None
+
+    def sellAll(self, orderType: OrderType = OrderType.MARKET, price: Optional[float] = None, stopPrice: Optional[float] = None) -> Optional[int]:
+        """Sell the whole position."""
+        if self.position.quantity <= 0:
+            return None
+        return self.submitOrder(SELL, self.position.quantity, orderType, price, stopPrice)
+
+    def run(self, data: pd.DataFrame, onBar: Callable[["EventDrivenBacktester", int], None]) -> EventBacktestResult:
+        """Simulate the bars of `data` (open, high, low and close columns), calling `onBar(engine, bar)` after each bar."""
+        missingColumns = [column for column in ("open", "high", "low", "close") if column not in data.columns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} are required to run the backtest.")
+
+        prices = data[["open", "high", "low", "close"]].to_numpy(dtype=np.float64)
+        if not np.all(np.isfinite(prices) & (prices > 0)):
+            raise BacktesterError("backtest/invalid-market-data", details="The prices should be positive and not missing.")
+
+        self._reset()
+        bars = len(prices)
+        equity = np.empty(bars)
+        cash = np.empty(bars)
+        positions = np.empty(bars)
+
+        # Python floats are much faster than NumPy scalars for the per-bar logic
+        opens, highs, lows, closes = (prices[:, column].tolist() for column in range(4))
+
+        for bar in range(bars):
+            self.bar = bar
+            self.close = closes[bar]
+
+            if self.workingOrders:
+                self._matchOrders(opens[bar], highs[bar], lows[bar])
+
+            cash[bar] = self.cash
+            positions[bar] = self.position.quantity
+            equity[bar] = self.cash + self.position.quantity * self.close
+
+            onBar(self, bar)
+
+        return EventBacktestResult(
+            index=data.index,
+            initialCapital=self.initialCapital,
+            equity=equity,
+            cash=cash,
+            positions=positions,
+            orders=self.orders,
+            trades=self.trades,
+            position=self.position,
+            lastPrice=closes[-1] if bars else np.nan
+        )
+
+    def runSignals(
+            self,
+            data: pd.DataFrame,
+            signals: Union[pd.Series, np.ndarray],
+            fractions: Union[pd.Series, np.ndarray, float] = 1.0,
+            orderType: OrderType = OrderType.MARKET,
+            offset: float = 0.0) -> EventBacktestResult:
+        """
+        Simulate the signals of a strategy (BUY = 1, SELL = -1, HOLD = 0) while flat, respectively long.
+        With LIMIT orders, a BUY is placed `offset` below the close of the signal and a SELL `offset` above it, and an
+        unfilled order is replaced by the next signal.
+        """
+        if isinstance(signals, pd.Series):
+            signals = signals.reindex(data.index).fillna(0).to_numpy()
+        if isinstance(fractions, pd.Series):
+            fractions = fractions.reindex(data.index).ffill().fillna(0).to_numpy()
+        signals = np.nan_to_num(np.asarray(signals, dtype=np.float64)).tolist()
+        fractions = np.broadcast_to(np.asarray(fractions, dtype=np.float64), (len(data),)).tolist()
+
+        isLimit = orderType == OrderType.LIMIT
+        pending: List[int] = []
+
+        def onBar(engine: "EventDrivenBacktester", bar: int) -> None:
+            signal = signals[bar]
+            if signal == 0:
+                return
+
+            for orderId in pending:
+                engine.cancelOrder(orderId, reason="Replaced by a new signal.")
+            pending.clear()
+
+            if signal > 0 and engine.position.quantity <= 0:
+                price = engine.close * (1 - offset) if isLimit else None
+                orderId = engine.buyFraction(fractions[bar], orderType, price=price)
+            elif signal < 0 and engine.position.quantity > 0:
+                price = engine.close * (1 + offset) if isLimit else None
+                orderId = engine.sellAll(orderType, price=price)
+            else:
+                orderId = None
+
+            if orderId is not None:
+                pending.append(orderId)
+
+        return self.run(data, onBar)
+
+    def _matchOrders(self, openPrice: float, highPrice: float, lowPrice: float) -> None:
+        for order in list(self.workingOrders):
+            if order.status != OrderStatus.PENDING or order.bar >= self.bar:
+                continue
+
+            price = self._getFillPrice(order, openPrice, highPrice, lowPrice)
+            if price is not None:
+                self._fill(order, price)
+
+    def _getFillPrice(self, order: OrderRecord, openPrice: float, highPrice: float, lowPrice: float) -> Optional[float]:
+        """Price at which the order fills during the bar, None if it does not."""
+        orderType, side = order.orderType, order.side
+
+        if orderType == OrderType.MARKET:
+            return openPrice
+
+        if orderType == OrderType.STOP_LIMIT and not order.triggered:
+            if side == BUY and highPrice >= order.stopPrice:
+                triggerPrice = max(openPrice, order.stopPrice)
+            elif side == SELL and lowPrice <= order.stopPrice:
+                triggerPrice = min(openPrice, order.stopPrice)
+            else:
+                return None
+
+            # Fills at the trigger if the limit allows it, else rests as a limit order from the next bar
+            order.triggered = True
+            if (side == BUY and triggerPrice <= order.price) or (side == SELL and triggerPrice >= order.price):
+                return triggerPrice
+            return None
+
+        if orderType == OrderType.STOP:
+            if side == BUY:
+                return max(openPrice, order.stopPrice) if highPrice >= order.stopPrice else None
+            return min(openPrice, order.stopPrice) if lowPrice <= order.stopPrice else None
+
+        # Limit orders: LIMIT, TAKE_PROFIT and triggered STOP_LIMIT
+        if side == BUY:
+            return min(openPrice, order.price) if lowPrice <= order.price else None
+        return max(openPrice, order.price) if highPrice >= order.price else None
+
+    def _fill(self, order: OrderRecord, price: float) -> None:
+        position, rate, minCommission = self.position, self.commissionRate, self.minCommission
+        quantity = order.quantity
+
+        if order.side == BUY:
+            # A gap can make the order more expensive than the cash left: buy what the cash affords
+            commission = max(quantity * price * rate, minCommission)
+            if quantity * price + commission > self.cash:
+                notional = self.cash / (1 + rate)
+                if notional * rate < minCommission:
+                    notional = self.cash - minCommission
+                quantity = notional / price
+                commission = max(notional * rate, minCommission)
+
+            if quantity <= 0:
+                self._reject(order, "Insufficient cash.")
+                return
+
+            totalQuantity = position.quantity + quantity
+            position.avgEntryPrice = (position.avgEntryPrice * position.quantity + quantity * price) / totalQuantity
+            position.quantity = totalQuantity
+            self.cash -= quantity * price + commission
+
+        else:
+            quantity = min(quantity, position.quantity)
+            if quantity <= 0:
+                self._reject(order, "Insufficient quantity.")
+                return
+
+            commission = max(quantity * price * rate, minCommission)
+            position.realizedPnl += (price - position.avgEntryPrice) * quantity - commission
+            position.quantity -= quantity
+            if position.quantity <= 1e-12 * quantity:
+                position.quantity = 0.0
+                position.avgEntryPrice = 0.0
+            self.cash += quantity * price - commission
+
+        order.quantity = quantity
+        order.status = OrderStatus.COMPLETED
+        order.fillBar = self.bar
+        order.fillPrice = price
+        order.commission = commission
+        self.workingOrders.remove(order)
+        self.trades.append(self.bar, order.id, order.side, quantity, price, commission)
+
+        if order.ocoGroup >= 0:
+            for other in list(self.workingOrders):
+                if other.ocoGroup == order.ocoGroup:
+                    self.cancelOrder(other.id, reason="The other order of the group was filled.")
+
+        self._updateProtectiveOrders()
+
+    def _updateProtectiveOrders(self) -> None:
+        """
+        Replace the stop-loss and take-profit of the position after a fill, or cancel them once flat.
+        They are marked as protective and only replaced by the engine, so they never touch the orders of the strategy,
+        whatever their OCO group. Filling one changes the position, which cancels the other.
+        """
+        if self.stopLoss is None and self.takeProfit is None:
+            return
+
+        for order in list(self.workingOrders):
+            if order.isProtective:
+                self.cancelOrder(order.id, reason="Position changed.")
+
+        if self.position.quantity <= 0:
+            return
+
+        # The stop is submitted first, so it is matched first on a bar reaching both levels
+        entryPrice, quantity = self.position.avgEntryPrice, self.position.quantity
+        if self.stopLoss is not None:
+            self._submitProtectiveOrder(quantity, OrderType.STOP, stopPrice=entryPrice * (1 - self.stopLoss))
+        if self.takeProfit is not None:
+            self._submitProtectiveOrder(quantity, OrderType.TAKE_PROFIT, price=entryPrice * (1 + self.takeProfit))
+
+    def _submitProtectiveOrder(self, quantity: float, orderType: OrderType, price: Optional[float] = None, stopPrice: Optional[float] = None) -> None:
+        orderId = self.submitOrder(SELL, quantity, orderType, price=price, stopPrice=stopPrice)
+        self.orders[orderId].isProtective = True
+
+    def _reject(self, order: OrderRecord, reason: str) -> None:
+        order.status = OrderStatus.REJECTED
+        order.cancelReason = reason
+        self.workingOrders.remove(order)
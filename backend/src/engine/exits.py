@@ -0,0 +1,139 @@
+from enum import Enum
+from typing import Optional, Tuple, Union
+import numpy as np
+
+from configs.backtest import BacktestConfig
+from errors.base_exception import BacktesterError
+
+
+class ExitTieBreak(str, Enum):
+    STOP_FIRST = "stop-first"                 # Pessimistic: the stop-loss is hit first
+    TARGET_FIRST = "target-first"             # Optimistic: the take-profit is hit first
+    NEAREST_TO_OPEN = "nearest-to-open"       # The level closer to the open of the bar is hit first
+
+
+class ExitReason:
+    OPEN = -1           # Still open at the last bar
+    SIGNAL = 0
+    STOP_LOSS = 1
+    TAKE_PROFIT = 2
+
+
+def resolveExits(
+        entryBars: np.ndarray,
+        exitBars: np.ndarray,
+        entryPrices: np.ndarray,
+        exitPrices: np.ndarray,
+        openPrices: np.ndarray,
+        highPrices: np.ndarray,
+        lowPrices: np.ndarray,
+        stopLoss: Union[float, np.ndarray, None] = None,
+        takeProfit: Union[float, np.ndarray, None] = None,
+        tieBreak: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Move the exit of every trade to the first bar after its entry where the low reaches the stop-loss or the high
+    reaches the take-profit (fractions of the entry price), if that comes before or on its exit bar (-1 while open).
+    The stop fills at its level, or at the open when the bar gaps through it, and so does the take-profit. A bar
+    reaching both levels is resolved by the gap if any, else by `tieBreak` (default: BacktestConfig.EXIT_TIE_BREAK).
+
+    `stopLoss` and `takeProfit` can be arrays of several values (NaN for none), broadcast together: every value is
+    resolved at once along a first axis of the outputs. The bars are only scanned once, whatever the number of values,
+    so a parameter sweep costs a binary search per trade and value.
+    Return the exit bars, exit prices and exit reasons (ExitReason) of every trade.
+    """
+    tieBreak = tieBreak or BacktestConfig.EXIT_TIE_BREAK
+    if tieBreak not in ExitTieBreak._value2member_map_:
+        raise BacktesterError("backtest/invalid-exit-tie-break")
+
+    stopLoss = np.nan if stopLoss is None else stopLoss
+    takeProfit = np.nan if takeProfit is None else takeProfit
+    isScalar = np.ndim(stopLoss) == 0 and np.ndim(takeProfit) == 0
+    stopLoss, takeProfit = np.broadcast_arrays(np.atleast_1d(np.asarray(stopLoss, dtype=np.float64)), np.atleast_1d(np.asarray(takeProfit, dtype=np.float64)))
+
+    bars, trades, runs = len(highPrices), len(entryBars), len(stopLoss)
+    reasons = np.where(exitBars >= 0, ExitReason.SIGNAL, ExitReason.OPEN)
+    resultBars = np.tile(exitBars, (runs, 1))
+    resultPrices = np.tile(exitPrices, (runs, 1))
+    resultReasons = np.tile(reasons, (runs, 1))
+
+    if trades > 0 and bars > 0:
+        # The bars where every trade can hit a level, from the bar after the entry to the exit, concatenated
+        endBars = np.where(exitBars >= 0, exitBars, bars - 1)
+        lengths = np.maximum(endBars - entryBars, 0)
+        offsets = np.zeros(trades + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        tradeIds = np.repeat(np.arange(trades), lengths)
+        segmentBars = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths) + np.repeat(entryBars + 1, lengths)
+        total = len(segmentBars)
+
+        # The lowest low (negated) and highest high since the entry: a level is reached at the first bar they reach it
+        negatedLowestLows = _segmentedAccumulate(-lowPrices[segmentBars], tradeIds, np.maximum)
+        highestHighs = _segmentedAccumulate(highPrices[segmentBars], tradeIds, np.maximum)
+
+        stopLevels = entryPrices * (1 - stopLoss[:, None])         # (runs, trades), NaN is never reached
+        targetLevels = entryPrices * (1 + takeProfit[:, None])
+        firstStop = _firstReached(negatedLowestLows, -stopLevels, tradeIds, offsets)
+        firstTarget = _firstReached(highestHighs, targetLevels, tradeIds, offsets)
+
+        hitBars = segmentBars[np.minimum(np.minimum(firstStop, firstTarget), max(total - 1, 0))] if total else np.zeros_like(firstStop)
+        opens = openPrices[hitBars]
+        isStop = firstStop < firstTarget
+        ties = (firstStop == firstTarget) & (firstStop < total)
+        if tieBreak == ExitTieBreak.STOP_FIRST:
+            tieIsStop = np.ones_like(ties)
+        elif tieBreak == ExitTieBreak.TARGET_FIRST:
+            tieIsStop = np.zeros_like(ties)
+        else:
+            tieIsStop = opens - stopLevels <= targetLevels - opens
+        # A gap through a level at the open decides the tie whatever the rule
+        tieIsStop = np.where(opens <= stopLevels, True, np.where(opens >= targetLevels, False, tieIsStop))
+        isStop |= ties & tieIsStop
+        isTarget = (firstTarget < total) & ~isStop
+
+        resultBars = np.where(isStop | isTarget, hitBars, resultBars)
+        resultPrices = np.where(isStop, np.minimum(opens, stopLevels), np.where(isTarget, np.maximum(opens, targetLevels), resultPrices))
+        resultReasons = np.where(isStop, ExitReason.STOP_LOSS, np.where(isTarget, ExitReason.TAKE_PROFIT, resultReasons))
+
+    if isScalar:
+        return resultBars[0], resultPrices[0], resultReasons[0]
+    return resultBars, resultPrices, resultReasons
+
+
+def _segmentedAccumulate(values: np.ndarray, tradeIds: np.ndarray, function: np.ufunc) -> np.ndarray:
+    """Running `function` (e.g. maximum) of the values of every trade, restarting at every trade, in log2(bars) passes."""
+    result = values.copy()
+    shift = 1
+    while shift < len(result):
+        sameTrade = tradeIds[shift:] == tradeIds[:-shift]
+        if not sameTrade.any():
+            break
+        result[shift:] = np.where(sameTrade, function(result[shift:], result[:-shift]), result[shift:])
+        shift *= 2
+    return result
+
+
+def _firstReached(extremes: np.ndarray, levels: np.ndarray, tradeIds: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Position (in the concatenated bars) of the first bar where the running extreme of every trade reaches its level
+    of every run, the number of bars if it never does.
+    The extremes never decrease within a trade, so the first bar is found by binary search. The extremes are replaced
+    by their integer rank among all of them, which keeps the comparisons exact, and offset by the trade, so that a
+    single search over all the bars answers every (run, trade) pair.
+    """
+    total = len(extremes)
+    trades = len(offsets) - 1
+
+    if len(levels) == 1:
+        # A single run: the first reached bar of every trade among all the reached bars, without sorting
+        reached = np.flatnonzero(extremes >= levels[0][tradeIds])
+        first = np.searchsorted(reached, offsets[:-1], side="left")
+        first = np.append(reached, total)[first][None]
+        return np.where(first < offsets[1:], first, total)
+
+    sortedExtremes = np.sort(extremes)
+
+    keys = tradeIds * (total + 1) + np.searchsorted(sortedExtremes, extremes, side="left")
+    queries = np.arange(trades) * (total + 1) + np.searchsorted(sortedExtremes, levels, side="left")
+    first = np.searchsorted(keys, queries, side="left")
+
+    return np.where(first < offsets[1:], first, total)
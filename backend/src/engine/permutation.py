@@ -0,0 +1,207 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Union
+import numpy as np
+
+from configs.backtest import BacktestConfig
+from engine.vectorized import VectorizedBacktester
+from errors.base_exception import BacktesterError
+from metrics.performance import PERFORMANCE_METRICS
+from schemas.backtest import PermutationTestModel
+
+
+class PermutationMethod(str, Enum):
+    SHUFFLE = "shuffle"         # The bars in a random order
+    BLOCK = "block"             # Random blocks of consecutive bars, drawn with replacement, keeps the volatility clusters
+
+
+# Metrics which can be tested, and whether a higher value is better
+PERMUTATION_METRICS = PERFORMANCE_METRICS
+# Rows of the shared block of arrays
+PERMUTATION_ARRAYS = ["prices", "openPrices", "highPrices", "lowPrices", "signals", "fractions"]
+
+
+class PermutationResult:
+    """Metric of the strategy on the real prices, its distribution on the permuted prices, and the empirical p-value."""
+
+    def __init__(self, metric: str, method: str, observed: float, distribution: np.ndarray, pValue: Optional[float]):
+        self.metric = metric
+        self.method = method
+        self.observed = observed
+        self.distribution = distribution    # One value per permutation, in the order of their seeds
+        self.pValue = pValue                # None if the observed metric has no value
+
+    def toResponseModel(self) -> PermutationTestModel:
+        return PermutationTestModel(
+            metric=self.metric,
+            method=self.method,
+            permutations=len(self.distribution),
+            observed=None if np.isnan(self.observed) else self.observed,
+            pValue=self.pValue,
+            distribution=[None if np.isnan(value) else value for value in self.distribution.tolist()]
+        )
+
+
+class PermutationTask:
+    """Seeds of a chunk of permutations, and the shared memory block holding the arrays, sent to a worker process."""
+
+    def __init__(
+            self,
+            backtester: VectorizedBacktester,
+            seeds: List[np.random.SeedSequence],
+            metric: str,
+            method: str,
+            blockSize: int,
+            sharedName: Optional[str] = None,
+            shape: Optional[tuple] = None,
+            block: Optional[np.ndarray] = None):
+        self.backtester = backtester
+        self.seeds = seeds
+        self.metric = metric
+        self.method = method
+        self.blockSize = blockSize
+        self.sharedName = sharedName        # Name of the shared memory block, None to use `block` directly
+        self.shape = shape
+        self.block = block
+
+
+def runPermutationTest(
+        backtester: VectorizedBacktester,
+        arrays: Dict[str, Union[np.ndarray, float]],
+        metric: Optional[str] = None,
+        permutations: Optional[int] = None,
+        method: Optional[str] = None,
+        blockSize: Optional[int] = None,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None) -> PermutationResult:
+    """
+    Monte Carlo permutation test of a strategy: simulate its signals and position fractions (see
+    `VectorizedBacktester.getArrays`) on `permutations` price paths made of the bars of the real prices in a random
+    order, and return the fraction of them doing at least as well as the real prices on `metric` (the p-value).
+    The signals stay on their bars, so the test asks whether their timing beats the same exposure to the same bar
+    returns in a random order. A permutation without value for the metric never counts as doing as well.
+
+    Every permutation draws from its own stream of `np.random.SeedSequence(seed).spawn`, so the results only depend
+    on the seed, whatever the number of workers. The arrays are copied once into shared memory, and the chunks of
+    permutations are simulated by a process pool, whose workers read the arrays from it.
+    The defaults come from BacktestConfig.
+    """
+    metric = metric or BacktestConfig.PERMUTATION_METRIC
+    permutations = permutations if permutations is not None else BacktestConfig.PERMUTATIONS
+    method = method or BacktestConfig.PERMUTATION_METHOD
+    blockSize = blockSize or BacktestConfig.PERMUTATION_BLOCK_SIZE
+    seed = seed if seed is not None else BacktestConfig.PERMUTATION_SEED
+    workers = max(workers or BacktestConfig.PERMUTATION_WORKERS, 1)
+
+    if metric not in PERMUTATION_METRICS:
+        raise BacktesterError("backtest/invalid-permutation-test", details=f"The supported metrics are {list(PERMUTATION_METRICS)}.")
+    if method not in PermutationMethod._value2member_map_:
+        raise BacktesterError("backtest/invalid-permutation-test", details=f"The supported methods are {list(PermutationMethod._value2member_map_)}.")
+    if permutations < 1 or permutations > BacktestConfig.PERMUTATION_MAX_COUNT:
+        raise BacktesterError("backtest/invalid-permutation-test", details=f"The number of permutations should be between 1 and {BacktestConfig.PERMUTATION_MAX_COUNT}.")
+    if blockSize < 1:
+        raise BacktesterError("backtest/invalid-permutation-test", details="The block size should be at least 1 bar.")
+
+    observed = float(_getMetric(backtester, arrays, metric))
+    block = _getBlock(arrays)
+
+    seeds = np.random.SeedSequence(seed).spawn(permutations)
+    chunks = min(workers * 4, permutations) if workers > 1 else 1
+    seedChunks = [list(chunk) for chunk in np.array_split(np.array(seeds, dtype=object), chunks)]
+
+    if workers > 1 and chunks > 1:
+        shared = SharedMemory(create=True, size=block.nbytes)
+        try:
+            np.ndarray(block.shape, dtype=block.dtype, buffer=shared.buf)[:] = block
+            tasks = [PermutationTask(backtester, chunk, metric, method, blockSize, sharedName=shared.name, shape=block.shape) for chunk in seedChunks]
+            with ProcessPoolExecutor(max_workers=min(workers, chunks)) as executor:
+                distribution = np.concatenate(list(executor.map(_simulateTask, tasks)))
+        finally:
+            shared.close()
+            shared.unlink()
+    else:
+        distribution = _simulateTask(PermutationTask(backtester, seeds, metric, method, blockSize, block=block))
+
+    if np.isnan(observed):
+        pValue = None
+    else:
+        better = distribution >= observed if PERMUTATION_METRICS[metric] else distribution <= observed
+        pValue = float((1 + np.count_nonzero(better)) / (1 + permutations))
+
+    return PermutationResult(metric, method, observed, distribution, pValue)
+
+
+def permuteBars(block: np.ndarray, rng: np.random.Generator, method: str, blockSize: int) -> np.ndarray:
+    """
+    Copy of the arrays (rows of PERMUTATION_ARRAYS) whose bars after the first are reordered: every bar keeps its
+    gap from the previous close and its high, low and close relative to its open, and the prices are rebuilt from
+    the first close. The signals and fractions are kept in place.
+    """
+    closes, opens, highs, lows = np.log(block[:4])
+    bars = block.shape[1]
+    if bars < 3:
+        return block.copy()
+
+    gaps = opens[1:] - closes[:-1]
+    relatives = np.stack([closes[1:], highs[1:], lows[1:]]) - opens[1:]
+
+    if method == PermutationMethod.BLOCK:
+        starts = rng.integers(0, bars - 1, size=-(-(bars - 1) // blockSize))
+        order = ((starts[:, None] + np.arange(blockSize)) % (bars - 1)).ravel()[:bars - 1]
+    else:
+        order = rng.permutation(bars - 1)
+
+    gaps, relatives = gaps[order], relatives[:, order]
+    permuted = block.copy()
+    newCloses = closes[0] + np.cumsum(gaps + relatives[0])
+    newOpens = np.concatenate([closes[:1], newCloses[:-1]]) + gaps
+    permuted[:4, 1:] = np.exp(np.stack([newCloses, newOpens, newOpens + relatives[1], newOpens + relatives[2]]))
+    return permuted
+
+
+def _getBlock(arrays: Dict[str, Union[np.ndarray, float]]) -> np.ndarray:
+    """
+    Arrays stacked as rows of PERMUTATION_ARRAYS. Without opens, the previous close is the open, as in the engine, and
+    without highs and lows the bars span their open and close (the real prices already checked the stop-loss needs).
+    """
+    prices = np.asarray(arrays["prices"], dtype=np.float64)
+    opens, highs, lows = (arrays.get(name) for name in ("openPrices", "highPrices", "lowPrices"))
+    opens = np.concatenate([prices[:1], prices[:-1]]) if opens is None else opens
+
+    rows = {
+        "prices": prices,
+        "openPrices": opens,
+        "highPrices": np.maximum(prices, opens) if highs is None else highs,
+        "lowPrices": np.minimum(prices, opens) if lows is None else lows,
+        "signals": np.nan_to_num(np.asarray(arrays["signals"], dtype=np.float64)),
+        "fractions": np.broadcast_to(np.asarray(arrays.get("fractions", 1.0), dtype=np.float64), prices.shape)
+    }
+    return np.stack([np.asarray(rows[name], dtype=np.float64) for name in PERMUTATION_ARRAYS])
+
+
+def _getPath(block: np.ndarray) -> Dict[str, np.ndarray]:
+    return dict(zip(PERMUTATION_ARRAYS, block))
+
+
+def _getMetric(backtester: VectorizedBacktester, arrays: Dict[str, Union[np.ndarray, float]], metric: str) -> float:
+    return backtester.run(**arrays).getMetrics()[metric]
+
+
+def _simulateTask(task: PermutationTask) -> np.ndarray:
+    if task.sharedName is None:
+        return _simulatePermutations(task, task.block)
+
+    shared = SharedMemory(name=task.sharedName)
+    try:
+        return _simulatePermutations(task, np.ndarray(task.shape, dtype=np.float64, buffer=shared.buf))
+    finally:
+        shared.close()
+
+
+def _simulatePermutations(task: PermutationTask, block: np.ndarray) -> np.ndarray:
+    distribution = np.empty(len(task.seeds))
+    for position, seed in enumerate(task.seeds):
+        permuted = permuteBars(block, np.random.default_rng(seed), task.method, task.blockSize)
+        distribution[position] = _getMetric(task.backtester, _getPath(permuted), task.metric)
+    return distribution
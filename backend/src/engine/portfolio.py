@@ -0,0 +1,238 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+
+from configs.backtest import BacktestConfig
+from configs.path import PathConfig
+from data.data_loader import getDatasetName
+from data.storage import DatasetStore
+from errors.base_exception import BacktesterError
+from schemas.backtest import PortfolioResponseModel
+from schemas.position import Position, Positions
+
+
+class PortfolioResult:
+    """
+    Curves of a multi-asset simulation (one value per bar) and its rebalances (one row per rebalance, one column per
+    asset). The positions are constant between two rebalances, so they are only expanded to every bar on demand.
+    """
+
+    def __init__(
+            self,
+            index: Optional[pd.Index],
+            assets: List[str],
+            initialCapital: float,
+            equity: np.ndarray,
+            exposure: np.ndarray,
+            rebalanceBars: np.ndarray,
+            weights: np.ndarray,
+            quantities: np.ndarray,
+            rebalancePrices: np.ndarray,
+            turnover: np.ndarray,
+            commissions: np.ndarray,
+            lastPrices: np.ndarray):
+        self.index = index
+        self.assets = assets
+        self.initialCapital = initialCapital
+        self.equity = equity                    # Cash plus the marked-to-market positions, at every bar
+        self.exposure = exposure                # Value of the positions over the equity, at every bar
+        self.rebalanceBars = rebalanceBars      # Bar of every rebalance
+        self.weights = weights                  # Target weights of every rebalance
+        self.quantities = quantities            # Quantities held from every rebalance to the next
+        self.rebalancePrices = rebalancePrices  # Prices of every rebalance
+        self.turnover = turnover                # Sum of the weight changes of every rebalance
+        self.commissions = commissions          # Commissions of every rebalance
+        self.lastPrices = lastPrices
+
+    @property
+    def finalEquity(self) -> float:
+        return float(self.equity[-1]) if len(self.equity) else self.initialCapital
+
+    @property
+    def numberOfRebalances(self) -> int:
+        return len(self.rebalanceBars)
+
+    def getPositions(self) -> pd.DataFrame:
+        """Quantity of every asset (columns) held at every bar (rows)."""
+        rebalances = np.searchsorted(self.rebalanceBars, np.arange(len(self.equity)), side="right") - 1
+        quantities = np.vstack([np.zeros((1, len(self.assets))), self.quantities])[rebalances + 1]
+        return pd.DataFrame(quantities, index=self.index, columns=self.assets)
+
+    def toPositions(self) -> Positions:
+        """Positions held at the last bar, with the average entry price of the buys since each position was opened."""
+        averagePrices = np.zeros(len(self.assets))
+        held = np.zeros(len(self.assets))
+
+        for quantities, prices in zip(self.quantities, self.rebalancePrices):
+            bought = np.maximum(quantities - held, 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                averagePrices = np.where(quantities > 0, np.where(bought > 0, (averagePrices * held + prices * bought) / (held + bought), averagePrices), 0.0)
+            held = quantities
+
+        positions = Positions()
+        for asset, quantity, averagePrice, price in zip(self.assets, held, averagePrices, self.lastPrices):
+            position = Position(asset=asset, quantity=float(quantity), avgEntryPrice=float(averagePrice), currentPrice=float(price))
+            position.updateUnrealizedPnl()
+            positions.positions[asset] = position
+
+        return positions
+
+    def toResponseModel(self) -> PortfolioResponseModel:
+        return PortfolioResponseModel(
+            assets=self.assets,
+            initialCapital=self.initialCapital,
+            finalEquity=self.finalEquity,
+            totalReturn=self.finalEquity / self.initialCapital - 1,
+            totalCommission=float(self.commissions.sum()),
+            totalTurnover=float(self.turnover.sum()),
+            averageExposure=float(self.exposure.mean()) if len(self.exposure) else 0.0,
+            numberOfRebalances=self.numberOfRebalances,
+            positions=self.toPositions()
+        )
+
+
+class PortfolioBacktester:
+    """
+    Long-only simulation of target weights over a (bars x assets) price matrix. The weights decided on bar t are
+    reached at the prices of bar t + 1, like the signals of the VectorizedBacktester, and the rest of the equity is
+    held in cash. A rebalance happens when the target weights change, and every `rebalancePeriod` bars in between to
+    bring the drifted weights back to their targets.
+    A rebalance pays the commission rate of every asset on its weight change, from the weights drifted since the
+    previous rebalance, at the equity before the rebalance, and the remaining equity is invested at the target weights.
+    The drifted weights only depend on the price changes, so the equity of every rebalance is a cumulative product
+    over the rebalances, and the curves of every bar are built a chunk of bars at a time. The memory is the price
+    matrix (20 assets over 5 years of hourly bars is 7 MB) plus the rows of the rebalances.
+    """
+
+    def __init__(self, initialCapital: float = 100000.0, commissionRate: Union[float, Sequence[float]] = 0.0006, rebalancePeriod: Optional[int] = None):
+        self.initialCapital = initialCapital
+        self.commissionRate = commissionRate    # A rate for all the assets, or one per asset
+        self.rebalancePeriod = rebalancePeriod  # Bars between two rebalances to the same weights, None or 0 for never
+
+    def run(self, prices: np.ndarray, weights: np.ndarray, index: Optional[pd.Index] = None, assets: Optional[List[str]] = None) -> PortfolioResult:
+        """
+        Simulate the target weights (in [0, 1], at most 1 in total) of every bar and asset, NaN to keep the previous
+        target, against the prices of every bar and asset. The missing prices are carried forward, and the weight of
+        an asset without price yet stays in cash.
+        """
+        prices = _forwardFill(np.array(prices, dtype=np.float64, ndmin=2))
+        bars, assetCount = prices.shape
+        targets = np.nan_to_num(_forwardFill(np.broadcast_to(np.asarray(weights, dtype=np.float64), prices.shape)))
+        assets = assets if assets is not None else [str(column) for column in range(assetCount)]
+        rates = np.broadcast_to(np.asarray(self.commissionRate, dtype=np.float64), (assetCount,))
+
+        if np.any(targets < 0) or np.any(targets.sum(axis=1) > 1 + 1e-9):
+            raise BacktesterError("backtest/invalid-portfolio-weights", details="The weights should be positive and sum to at most 1 at every bar.")
+        if np.any(~(prices > 0) & ~np.isnan(prices)):
+            raise BacktesterError("backtest/invalid-market-data", details="The prices should be positive.")
+
+        # The weights decided on a bar are reached on the next one, which needs a price
+        listed = np.zeros(prices.shape, dtype=bool)
+        listed[:-1] = ~np.isnan(prices[1:])
+        targets = np.where(listed, targets, 0.0)
+
+        rebalanceBars = self._getRebalanceBars(targets)
+        rebalanceWeights = targets[rebalanceBars - 1]
+        rebalancePrices = prices[rebalanceBars]
+
+        # Weights drifted by the prices from a rebalance to the next, as fractions of the equity before the next one
+        with np.errstate(invalid="ignore", divide="ignore"):
+            held = np.where(rebalanceWeights[:-1] > 0, rebalanceWeights[:-1] * rebalancePrices[1:] / rebalancePrices[:-1], 0.0)
+        growth = np.ones(len(rebalanceBars))
+        growth[1:] = 1 - rebalanceWeights[:-1].sum(axis=1) + held.sum(axis=1)
+        drifted = np.zeros(rebalanceWeights.shape)
+        drifted[1:] = held / growth[1:, None]
+
+        changes = np.abs(rebalanceWeights - drifted)
+        costs = (changes * rates).sum(axis=1)
+        equity = self.initialCapital * np.cumprod(growth * (1 - costs))       # After every rebalance
+        with np.errstate(invalid="ignore", divide="ignore"):
+            quantities = np.where(rebalanceWeights > 0, equity[:, None] * rebalanceWeights / rebalancePrices, 0.0)
+        cash = equity * (1 - rebalanceWeights.sum(axis=1))
+
+        equityCurve, exposure = self._getCurves(prices, rebalanceBars, quantities, cash)
+
+        return PortfolioResult(
+            index=index,
+            assets=assets,
+            initialCapital=self.initialCapital,
+            equity=equityCurve,
+            exposure=exposure,
+            rebalanceBars=rebalanceBars,
+            weights=rebalanceWeights,
+            quantities=quantities,
+            rebalancePrices=rebalancePrices,
+            turnover=changes.sum(axis=1),
+            commissions=equity / (1 - costs) * costs,
+            lastPrices=prices[-1] if bars else np.zeros(assetCount)
+        )
+
+    def runFrame(self, prices: pd.DataFrame, weights: Union[pd.DataFrame, Dict[str, float]]) -> PortfolioResult:
+        """Same as `run` on a frame of prices (a column per asset), and a frame of weights or fixed weights per asset."""
+        if isinstance(weights, dict):
+            unknownAssets = [asset for asset in weights if asset not in prices.columns]
+            if unknownAssets:
+                raise BacktesterError("backtest/invalid-portfolio-weights", details=f"{unknownAssets} are not in the assets {list(prices.columns)}.")
+            weights = np.array([weights.get(asset, 0.0) for asset in prices.columns], dtype=np.float64)
+        else:
+            weights = weights.reindex(index=prices.index, columns=prices.columns).to_numpy(dtype=np.float64)
+
+        return self.run(prices.to_numpy(dtype=np.float64), weights, index=prices.index, assets=[str(column) for column in prices.columns])
+
+    def _getRebalanceBars(self, targets: np.ndarray) -> np.ndarray:
+        """Bars where the targets of the bar before are reached: on every change, and every `rebalancePeriod` bars."""
+        decisions = np.zeros(len(targets), dtype=bool)
+        if len(targets):
+            decisions[0] = targets[0].any()
+            decisions[1:] = np.any(targets[1:] != targets[:-1], axis=1)
+
+        if self.rebalancePeriod:
+            lastDecision = np.maximum.accumulate(np.where(decisions, np.arange(len(targets)), 0))
+            decisions |= ((np.arange(len(targets)) - lastDecision) % self.rebalancePeriod == 0) & targets.any(axis=1)
+
+        # The decisions of the last bar are never filled
+        return np.flatnonzero(decisions[:-1]) + 1
+
+    def _getCurves(self, prices: np.ndarray, rebalanceBars: np.ndarray, quantities: np.ndarray, cash: np.ndarray) -> tuple:
+        """Equity and exposure of every bar, from the quantities and cash of the last rebalance, a chunk of bars at a time."""
+        bars, assetCount = prices.shape
+        equity, exposure = np.empty(bars), np.empty(bars)
+        quantities = np.vstack([np.zeros((1, assetCount)), quantities])
+        cash = np.concatenate([[self.initialCapital], cash])
+
+        chunk = max(BacktestConfig.BATCH_CHUNK_SIZE // max(assetCount, 1), 1)
+        for start in range(0, bars, chunk):
+            rows = slice(start, start + chunk)
+            rebalances = np.searchsorted(rebalanceBars, np.arange(start, min(start + chunk, bars)), side="right")
+            held = quantities[rebalances]
+            values = np.where(held > 0, held * prices[rows], 0.0).sum(axis=1)
+            equity[rows] = cash[rebalances] + values
+            with np.errstate(invalid="ignore", divide="ignore"):
+                exposure[rows] = values / equity[rows]
+
+        return equity, exposure
+
+
+def loadPriceMatrix(
+        assets: List[str],
+        startDate: Union[date, datetime, str, None] = None,
+        endDate: Union[date, datetime, str, None] = None,
+        column: str = "close",
+        provider: str = "cryptoquant") -> pd.DataFrame:
+    """
+    Prices of the assets (columns) at every bar (rows), read from the market data of every asset (see
+    `DataLoader.runAssets`). Only the price column of every dataset is read.
+    """
+    store = DatasetStore(directory=PathConfig.RAW_DATA_DIR)
+    names = { asset: getDatasetName("market-data", provider, asset) for asset in dict.fromkeys(assets) }
+    return store.loadColumn(names, column, start=startDate, end=endDate).sort_index()
+
+
+def _forwardFill(values: np.ndarray) -> np.ndarray:
+    """Carry the last value of every column forward over the NaN, the NaN before the first value stay."""
+    if values.size == 0:
+        return values.copy()
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(values, rows, axis=0)
@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from configs.backtest import BacktestConfig
+from engine.vectorized import VectorizedBacktester
+from errors.base_exception import BacktesterError
+from metrics.performance import PERFORMANCE_METRICS
+
+# Parameters simulated together along the run axis of the vectorized engine
+SCALAR_PARAMETERS = ["maxPositionSize", "stopLoss", "takeProfit", "commissionRate"]
+# Parameters changing the signals or the position fractions, simulated by separate tasks
+GROUP_PARAMETERS = ["strategyName", "positionSizingMode", "entryExitMode"]
+# Metrics which rank the runs, and whether a higher value is better
+SWEEP_METRICS = {
+    **PERFORMANCE_METRICS,
+    "totalCommission": False,
+    "numberOfTrades": True
+}
+
+
+class SweepTask:
+    """Arrays and scalar parameter values of the runs of one group, sent to a worker process."""
+
+    def __init__(self, group: Dict[str, Any], backtester: VectorizedBacktester, arrays: Dict[str, Any], scalars: Dict[str, np.ndarray]):
+        self.group = group
+        self.backtester = backtester
+        self.arrays = arrays            # prices, signals, fractions and the open, high and low prices
+        self.scalars = scalars          # One value per run of every scalar parameter
+
+
+def expandGrid(grid: Dict[str, List[Any]], defaults: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, np.ndarray]]:
+    """
+    Split the grid into the combinations of the group parameters, and the combinations of the scalar parameters as
+    one array per parameter (None is NaN). The parameters not in the grid take their default value.
+    """
+    invalidNames = [name for name in grid if name not in SCALAR_PARAMETERS + GROUP_PARAMETERS]
+    if invalidNames:
+        raise BacktesterError("backtest/invalid-sweep-parameter", details=f"{invalidNames} cannot be swept. The supported parameters are {SCALAR_PARAMETERS + GROUP_PARAMETERS}.")
+
+    emptyNames = [name for name, values in grid.items() if not values]
+    if emptyNames:
+        raise BacktesterError("backtest/invalid-sweep-parameter", details=f"{emptyNames} have no value.")
+
+    for name in SCALAR_PARAMETERS:
+        values = [value for value in grid.get(name, []) if value is not None]
+        upper = np.inf if name == "commissionRate" else 1.0
+        if any(isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or value > upper for value in values):
+            raise BacktesterError("backtest/invalid-sweep-parameter", details=f"The values of {name} should be numbers between 0 and {upper}.")
+
+    runs = int(np.prod([len(values) for values in grid.values()]))
+    if runs > BacktestConfig.SWEEP_MAX_RUNS:
+        raise BacktesterError("backtest/invalid-sweep-parameter", details=f"{runs} runs exceed the limit of {BacktestConfig.SWEEP_MAX_RUNS}.")
+
+    groupNames = [name for name in GROUP_PARAMETERS if name in grid]
+    groups = [dict(zip(groupNames, values)) for values in product(*(grid[name] for name in groupNames))]
+
+    scalarValues = [grid.get(name, [defaults.get(name)]) for name in SCALAR_PARAMETERS]
+    combinations = np.array(list(product(*scalarValues)), dtype=np.float64).reshape(-1, len(SCALAR_PARAMETERS))
+    scalars = { name: combinations[:, column] for column, name in enumerate(SCALAR_PARAMETERS) }
+
+    return groups, scalars
+
+
+def runSweep(tasks: List[SweepTask], workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Simulate every task and return one row per run: the group and scalar parameters, then the metrics.
+    The tasks are spread over a process pool if there are several. Each task is a single vectorized batch.
+    """
+    workers = max(workers or BacktestConfig.SWEEP_WORKERS, 1)
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_simulateTask, tasks))
+    else:
+        results = [_simulateTask(task) for task in tasks]
+
+    tables = []
+    for task, metrics in zip(tasks, results):
+        table = pd.DataFrame({ **task.scalars, **metrics })
+        for column, (name, value) in enumerate(task.group.items()):
+            table.insert(column, name, value)
+        tables.append(table)
+
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def rankResults(table: pd.DataFrame, metric: str, top: Optional[int] = None) -> pd.DataFrame:
+    """
+    Sort the runs from the best to the worst value of the metric, the runs without value last. An infinite value ranks
+    as the best or the worst one, e.g. the infinite profit factor of a run without losses first.
+    """
+    if metric not in SWEEP_METRICS:
+        raise BacktesterError("backtest/invalid-sweep-metric", details=f"The supported metrics are {list(SWEEP_METRICS)}.")
+
+    ranked = table.sort_values(metric, ascending=not SWEEP_METRICS[metric], na_position="last", kind="stable")
+    return ranked.head(top) if top is not None else ranked
+
+
+def toRows(table: pd.DataFrame) -> List[List[Any]]:
+    """
+    Rows of the table for the response. The values which JSON can't hold, a missing value or an infinite one (e.g. the
+    profit factor of a run without losses), are None. Rank the table before, on its raw values.
+    """
+    table = table.replace([np.inf, -np.inf], np.nan)
+    return table.astype(object).where(table.notna(), None).values.tolist()
+
+
+def _simulateTask(task: SweepTask) -> Dict[str, np.ndarray]:
+    arrays, scalars = task.arrays, task.scalars
+    maxFractions = np.where(np.isnan(scalars["maxPositionSize"]), 1.0, scalars["maxPositionSize"])
+
+    return task.backtester.runBatch(
+        arrays["prices"], arrays["signals"], arrays["fractions"],
+        commissionRates=scalars["commissionRate"],
+        maxFractions=maxFractions,
+        stopLoss=scalars["stopLoss"],
+        takeProfit=scalars["takeProfit"],
+        openPrices=arrays.get("openPrices"),
+        highPrices=arrays.get("highPrices"),
+        lowPrices=arrays.get("lowPrices"))
@@ -0,0 +1,420 @@
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+from configs.backtest import BacktestConfig
+from engine.exits import ExitReason, resolveExits
+from errors.base_exception import BacktesterError
+from metrics.performance import getCurves, getPerformanceMetrics
+from schemas.backtest import BacktestResponseModel, PerformanceMetricsModel
+from schemas.trade import TradePortfolio
+
+
+class BacktestResult:
+    """Arrays of a simulation: one value per bar for the curves, one value per trade for the fills."""
+
+    def __init__(
+            self,
+            index: Optional[pd.Index],
+            initialCapital: float,
+            equity: np.ndarray,
+            cash: np.ndarray,
+            positions: np.ndarray,
+            entryBars: np.ndarray,
+            exitBars: np.ndarray,
+            entryPrices: np.ndarray,
+            exitPrices: np.ndarray,
+            quantities: np.ndarray,
+            commissions: np.ndarray,
+            exitReasons: np.ndarray):
+        self.index = index
+        self.initialCapital = initialCapital
+        self.equity = equity                # Cash plus the marked-to-market position, at every bar
+        self.cash = cash
+        self.positions = positions          # Quantity held at every bar
+        self.entryBars = entryBars          # Bar of the entry fill of every trade
+        self.exitBars = exitBars            # Bar of the exit fill of every trade, -1 while the trade is open
+        self.entryPrices = entryPrices
+        self.exitPrices = exitPrices        # NaN while the trade is open
+        self.quantities = quantities        # 0 for the entries which could not pay the minimum commission
+        self.commissions = commissions      # Entry plus exit commissions of every trade
+        self.exitReasons = exitReasons      # ExitReason of every trade
+
+    @property
+    def finalEquity(self) -> float:
+        return float(self.equity[-1]) if len(self.equity) else self.initialCapital
+
+    @property
+    def numberOfTrades(self) -> int:
+        return int(np.count_nonzero(self.quantities))
+
+    def getMetrics(self) -> Dict[str, float]:
+        """Performance metrics of the simulation (see `getPerformanceMetrics`)."""
+        metrics = _getBacktestMetrics(self.initialCapital, self.equity, self.cash, self.entryBars, self.exitBars, self.quantities, self.entryPrices, self.exitPrices, self.commissions)
+        return { name: float(values[0]) for name, values in metrics.items() }
+
+    def toResponseModel(self) -> BacktestResponseModel:
+        metrics = self.getMetrics()
+        equityCurve, drawdownCurve = getCurves(self.equity, self.index)
+
+        return BacktestResponseModel(
+            backtestResult=self.finalEquity / self.initialCapital,
+            initialCapital=self.initialCapital,
+            finalEquity=self.finalEquity,
+            totalReturn=self.finalEquity / self.initialCapital - 1,
+            totalCommission=float(self.commissions.sum()),
+            numberOfTrades=self.numberOfTrades,
+            metrics=PerformanceMetricsModel(**{
+                name: value if np.isfinite(value) else None for name, value in metrics.items() if name in PerformanceMetricsModel.model_fields
+            }),
+            portfolio=TradePortfolio(
+                initialCapital=self.initialCapital,
+                finalEquity=self.finalEquity,
+                equityCurve=equityCurve,
+                drawdownCurve=drawdownCurve
+            )
+        )
+
+
+class VectorizedBacktester:
+    """
+    Long-only simulation of a strategy over whole arrays of bars.
+    The signals (BUY = 1, SELL = -1, HOLD = 0) are turned into a target position by carrying the last BUY or SELL
+    forward, and a signal of bar t is filled at the price of bar t + 1. A BUY invests the position fraction of bar t
+    of the cash, commissions included, and a SELL closes the whole position.
+    With a stop-loss and/or a take-profit, the exit of every trade is moved to the first bar reaching one of them
+    (see `resolveExits`). The position then stays flat until the signals enter again, after their next SELL.
+    Only the cash carried from one trade to the next is sequential: it is a cumulative product of the growth of the
+    trades, or, with a minimum commission, a loop over the trades (never over the bars). The positions, cash and
+    equity of every bar are then cumulative sums of the fills.
+    `runBatch` simulates many values of the scalar parameters at once, along a first axis of the same arrays.
+    """
+
+    def __init__(
+            self,
+            initialCapital: float = 100000.0,
+            commissionRate: float = 0.0006,
+            minCommission: float = 0.0,
+            stopLoss: Optional[float] = None,
+            takeProfit: Optional[float] = None,
+            exitTieBreak: Optional[str] = None):
+        self.initialCapital = initialCapital
+        self.commissionRate = commissionRate
+        self.minCommission = minCommission
+        self.stopLoss = stopLoss            # Fraction of the entry price below it
+        self.takeProfit = takeProfit        # Fraction of the entry price above it
+        self.exitTieBreak = exitTieBreak
+
+    def run(
+            self,
+            prices: np.ndarray,
+            signals: np.ndarray,
+            fractions: Union[np.ndarray, float] = 1.0,
+            index: Optional[pd.Index] = None,
+            openPrices: Optional[np.ndarray] = None,
+            highPrices: Optional[np.ndarray] = None,
+            lowPrices: Optional[np.ndarray] = None) -> BacktestResult:
+        """
+        Simulate the signals and position fractions (in [0, 1]) of every bar against the prices of the bars.
+        The stop-loss and take-profit need the highs and lows of the bars. Without the opens, the gaps are measured
+        from the previous price.
+        """
+        prices, signals, fractions = self._checkArrays(prices, signals, fractions)
+        entryBars, exitBars = self._getFills(signals)
+
+        trades = self._simulateTrades(
+            prices, entryBars, exitBars, fractions[entryBars - 1],
+            commissionRates=np.array([self.commissionRate]),
+            stopLoss=np.array([np.nan if self.stopLoss is None else self.stopLoss]),
+            takeProfit=np.array([np.nan if self.takeProfit is None else self.takeProfit]),
+            ohlc=(openPrices, highPrices, lowPrices))
+        cash, positions = self._getCurves(len(prices), entryBars, *trades[:5])
+        exitBars, _, _, quantities, commissions, exitReasons, exitPrices = (values[0] for values in trades)
+
+        return BacktestResult(
+            index=index,
+            initialCapital=self.initialCapital,
+            equity=cash[0] + positions[0] * prices,
+            cash=cash[0],
+            positions=positions[0],
+            entryBars=entryBars,
+            exitBars=exitBars,
+            entryPrices=prices[entryBars],
+            exitPrices=exitPrices,
+            quantities=quantities,
+            commissions=commissions,
+            exitReasons=exitReasons
+        )
+
+    def runBatch(
+            self,
+            prices: np.ndarray,
+            signals: np.ndarray,
+            fractions: Union[np.ndarray, float] = 1.0,
+            commissionRates: Union[np.ndarray, float, None] = None,
+            maxFractions: Union[np.ndarray, float, None] = None,
+            stopLoss: Union[np.ndarray, float, None] = None,
+            takeProfit: Union[np.ndarray, float, None] = None,
+            openPrices: Optional[np.ndarray] = None,
+            highPrices: Optional[np.ndarray] = None,
+            lowPrices: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Simulate the same signals for every combination of the scalar parameters, given as arrays broadcast together
+        (NaN for no stop-loss or take-profit). The fraction of every entry is capped by `maxFractions`.
+        The fills of all the runs are computed at once. The curves are only built a chunk of runs at a time, to
+        compute the metrics of every run, so the memory stays bounded whatever the number of runs.
+        """
+        prices, signals, fractions = self._checkArrays(prices, signals, fractions)
+        commissionRates, maxFractions, stopLoss, takeProfit = np.broadcast_arrays(*(
+            np.atleast_1d(np.asarray(default if values is None else values, dtype=np.float64))
+            for values, default in (
+                (commissionRates, self.commissionRate),
+                (maxFractions, 1.0),
+                (stopLoss, np.nan if self.stopLoss is None else self.stopLoss),
+                (takeProfit, np.nan if self.takeProfit is None else self.takeProfit)
+            )
+        ))
+
+        if np.any((maxFractions < 0) | (maxFractions > 1)):
+            raise BacktesterError("backtest/invalid-position-size")
+
+        entryBars, exitBars = self._getFills(signals)
+        entryFractions = np.minimum(fractions[entryBars - 1], maxFractions[:, None])
+
+        trades = self._simulateTrades(prices, entryBars, exitBars, entryFractions, commissionRates, stopLoss, takeProfit, (openPrices, highPrices, lowPrices))
+        runs, bars = len(commissionRates), len(prices)
+        metrics = {}
+
+        chunk = max(BacktestConfig.BATCH_CHUNK_SIZE // max(bars, 1), 1)
+        for start in range(0, runs, chunk):
+            rows = slice(start, start + chunk)
+            exitBars, _, _, quantities, commissions, _, exitPrices = (values[rows] for values in trades)
+            cash, positions = self._getCurves(bars, entryBars, *(values[rows] for values in trades[:5]))
+            chunkMetrics = _getBacktestMetrics(self.initialCapital, cash + positions * prices, cash, entryBars, exitBars, quantities, prices[entryBars], exitPrices, commissions)
+            for name, values in chunkMetrics.items():
+                metrics.setdefault(name, np.empty(runs))[rows] = values
+
+        quantities, commissions = trades[3], trades[4]
+        return {
+            **metrics,
+            "numberOfTrades": np.count_nonzero(quantities, axis=1),
+            "totalCommission": commissions.sum(axis=1)
+        }
+
+    def runFrame(self, prices: pd.Series, signals: pd.Series, fractions: Union[pd.Series, float] = 1.0, marketData: Optional[pd.DataFrame] = None) -> BacktestResult:
+        """Same as `run` on series (see `getArrays`)."""
+        return self.run(**self.getArrays(prices, signals, fractions, marketData), index=prices.index)
+
+    def getArrays(self, prices: pd.Series, signals: pd.Series, fractions: Union[pd.Series, float] = 1.0, marketData: Optional[pd.DataFrame] = None) -> Dict[str, Union[np.ndarray, float]]:
+        """
+        Arguments of `run` and `runBatch` from series: the signals and fractions are aligned on the bars of the prices,
+        and the open, high and low prices are read from `marketData` (see `FeatureLoader.loadMarketData`) if given.
+        """
+        signals = signals.reindex(prices.index).fillna(0)
+        if isinstance(fractions, pd.Series):
+            fractions = fractions.reindex(prices.index).ffill().fillna(0).to_numpy(dtype=np.float64)
+
+        arrays = {
+            "prices": prices.to_numpy(dtype=np.float64),
+            "signals": signals.to_numpy(dtype=np.float64),
+            "fractions": fractions
+        }
+
+        if marketData is not None:
+            marketData = marketData.reindex(prices.index).ffill()
+            arrays.update({
+                f"{column}Prices": marketData[column].to_numpy(dtype=np.float64)
+                for column in ("open", "high", "low") if column in marketData.columns
+            })
+
+        return arrays
+
+    def _checkArrays(self, prices: np.ndarray, signals: np.ndarray, fractions: Union[np.ndarray, float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        prices = np.asarray(prices, dtype=np.float64)
+        signals = np.nan_to_num(np.asarray(signals, dtype=np.float64))
+        fractions = np.broadcast_to(np.asarray(fractions, dtype=np.float64), prices.shape)
+
+        if signals.shape != prices.shape:
+            raise BacktesterError("backtest/invalid-market-data", details="The signals and the prices are not aligned.")
+
+        if not np.all(np.isfinite(prices) & (prices > 0)):
+            raise BacktesterError("backtest/invalid-market-data", details="The prices should be positive and not missing.")
+
+        if np.any((fractions < 0) | (fractions > 1)):
+            raise BacktesterError("backtest/invalid-position-size")
+
+        return prices, signals, fractions
+
+    def _simulateTrades(
+            self,
+            prices: np.ndarray,
+            entryBars: np.ndarray,
+            exitBars: np.ndarray,
+            entryFractions: np.ndarray,
+            commissionRates: np.ndarray,
+            stopLoss: np.ndarray,
+            takeProfit: np.ndarray,
+            ohlc: Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]) -> Tuple[np.ndarray, ...]:
+        """
+        Fills of every trade (columns) of every run (rows): exit bars, notionals, entry commissions, quantities,
+        commissions, exit reasons and the exit prices, proceeds and exit commissions.
+        """
+        runs = len(commissionRates)
+        entryPrices = prices[entryBars]
+        exitPrices = np.tile(np.where(exitBars >= 0, prices[exitBars], np.nan), (runs, 1))
+        exitReasons = np.tile(np.where(exitBars >= 0, ExitReason.SIGNAL, ExitReason.OPEN), (runs, 1))
+        exitBars = np.tile(exitBars, (runs, 1))
+        entryFractions = np.broadcast_to(entryFractions, exitBars.shape)
+
+        if not (np.all(np.isnan(stopLoss)) and np.all(np.isnan(takeProfit))):
+            openPrices, highPrices, lowPrices = ohlc
+            if highPrices is None or lowPrices is None:
+                raise BacktesterError("feature/missing-columns", details="The high and low prices are required by the stop-loss and take-profit.")
+            if openPrices is None:
+                openPrices = np.concatenate([prices[:1], prices[:-1]])
+
+            exitBars, exitPrices, exitReasons = resolveExits(
+                entryBars, exitBars[0], entryPrices, exitPrices[0],
+                np.asarray(openPrices, dtype=np.float64), np.asarray(highPrices, dtype=np.float64), np.asarray(lowPrices, dtype=np.float64),
+                stopLoss=stopLoss, takeProfit=takeProfit, tieBreak=self.exitTieBreak)
+
+        rates = commissionRates[:, None]
+        if self.minCommission > 0:
+            entryCash = self._getEntryCashLoop(entryPrices, exitPrices, entryFractions, rates)
+        else:
+            entryCash = self._getEntryCash(entryPrices, exitPrices, entryFractions, rates)
+
+        notionals = self._getNotionals(entryFractions * entryCash, rates)
+        quantities = notionals / entryPrices
+        entryCommissions = np.where(quantities > 0, np.maximum(notionals * rates, self.minCommission), 0.0)
+        closed = exitBars >= 0
+        proceeds = np.where(closed, quantities * exitPrices, 0.0)
+        exitCommissions = np.where(closed & (quantities > 0), np.maximum(proceeds * rates, self.minCommission), 0.0)
+
+        return exitBars, notionals + entryCommissions, proceeds - exitCommissions, quantities, entryCommissions + exitCommissions, exitReasons, exitPrices
+
+    def _getCurves(self, bars: int, entryBars: np.ndarray, exitBars: np.ndarray, entryCosts: np.ndarray, exitCredits: np.ndarray, quantities: np.ndarray, commissions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cash and position of every run (rows) at every bar: every fill moves its bar and all the later bars."""
+        runs = len(exitBars)
+        rowOffsets = (np.arange(runs) * bars)[:, None]
+        closed = exitBars >= 0
+        entryIndices = np.broadcast_to(rowOffsets + entryBars, exitBars.shape)
+        exitIndices = (rowOffsets + exitBars)[closed]
+
+        cashFlows = np.bincount(entryIndices.ravel(), weights=-entryCosts.ravel(), minlength=runs * bars)
+        cashFlows += np.bincount(exitIndices, weights=exitCredits[closed], minlength=runs * bars)
+        positionFlows = np.bincount(entryIndices.ravel(), weights=quantities.ravel(), minlength=runs * bars)
+        positionFlows -= np.bincount(exitIndices, weights=quantities[closed], minlength=runs * bars)
+
+        cash = self.initialCapital + np.cumsum(cashFlows.reshape(runs, bars), axis=1)
+        positions = np.cumsum(positionFlows.reshape(runs, bars), axis=1)
+        return cash, positions
+
+    def _getFills(self, signals: np.ndarray):
+        """Bars of the entry and exit fills of every trade, -1 for the exit of a trade still open at the end."""
+        positions = np.arange(len(signals))
+
+        # Target position after every bar: 1 after a BUY, 0 after a SELL, unchanged after a HOLD
+        lastOrder = np.maximum.accumulate(np.where(signals != 0, positions, -1))
+        target = np.where(lastOrder >= 0, signals[np.maximum(lastOrder, 0)] > 0, False)
+
+        # The target of bar t is held from bar t + 1, the target of the last bar is never filled
+        held = np.zeros(len(signals), dtype=np.int8)
+        held[1:] = target[:-1]
+        changes = np.diff(held, prepend=0)
+
+        entryBars = np.flatnonzero(changes > 0)
+        exitBars = np.flatnonzero(changes < 0)
+
+        # Every exit closes the entry before it
+        exits = np.full(len(entryBars), -1, dtype=np.int64)
+        exits[:len(exitBars)] = exitBars
+        return entryBars, exits
+
+    def _getNotionals(self, budgets: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """Value bought with every budget once the entry commission is paid out of it, 0 if it does not cover it."""
+        notionals = budgets / (1 + rates)
+        notionals = np.where(notionals * rates < self.minCommission, budgets - self.minCommission, notionals)
+        return np.maximum(notionals, 0.0)
+
+    def _getEntryCash(self, entryPrices: np.ndarray, exitPrices: np.ndarray, fractions: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """Cash before every entry. Without minimum commission, every trade multiplies the cash by a fixed growth."""
+        growth = 1 - fractions + fractions * (1 - rates) / (1 + rates) * exitPrices / entryPrices
+
+        # Only the last trade can still be open, nothing is entered after it
+        cash = np.empty(growth.shape)
+        cash[:, :1] = self.initialCapital
+        cash[:, 1:] = self.initialCapital * np.cumprod(growth[:, :-1], axis=1)
+        return cash
+
+    def _getEntryCashLoop(self, entryPrices: np.ndarray, exitPrices: np.ndarray, fractions: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """
+        Cash before every entry, trade by trade, as the minimum commission makes the growth depend on the cash. Every
+        step updates all the runs at once.
+        """
+        minCommission = self.minCommission
+        cash = np.empty(fractions.shape)
+
+        if len(fractions) == 1:
+            # A single run: Python floats are much faster than NumPy scalars
+            cash[0] = self._getRunEntryCash(entryPrices.tolist(), exitPrices[0].tolist(), fractions[0].tolist(), float(rates[0, 0]))
+            return cash
+
+        available = np.full(len(fractions), self.initialCapital)
+        rates = np.broadcast_to(rates[:, 0], available.shape)
+
+        for trade in range(fractions.shape[1]):
+            cash[:, trade] = available
+            notional = self._getNotionals(fractions[:, trade] * available, rates)
+            proceeds = notional / entryPrices[trade] * exitPrices[:, trade]
+            change = proceeds - np.maximum(proceeds * rates, minCommission) - notional - np.maximum(notional * rates, minCommission)
+            available = np.where(notional > 0, available + change, available)
+
+        return cash
+
+    def _getRunEntryCash(self, entryPrices: List[float], exitPrices: List[float], fractions: List[float], rate: float) -> List[float]:
+        minCommission = self.minCommission
+        cash = []
+        available = self.initialCapital
+
+        for entryPrice, exitPrice, fraction in zip(entryPrices, exitPrices, fractions):
+            cash.append(available)
+            budget = fraction * available
+            notional = budget / (1 + rate)
+            if notional * rate < minCommission:
+                notional = budget - minCommission
+            if notional <= 0:
+                continue
+
+            proceeds = notional / entryPrice * exitPrice
+            available += proceeds - max(proceeds * rate, minCommission) - notional - max(notional * rate, minCommission)
+
+        return cash
+
+
+def _getBacktestMetrics(
+        initialCapital: float,
+        equity: np.ndarray,
+        cash: np.ndarray,
+        entryBars: np.ndarray,
+        exitBars: np.ndarray,
+        quantities: np.ndarray,
+        entryPrices: np.ndarray,
+        exitPrices: np.ndarray,
+        commissions: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Performance metrics of every run (rows of the curves and of the trades): the profit of every closed trade, net of
+    its commissions, the entry and exit values over the equity of their bars, and the position value over the equity.
+    """
+    equity, cash = np.atleast_2d(equity), np.atleast_2d(cash)
+    exitBars, quantities, exitPrices, commissions = (np.atleast_2d(values) for values in (exitBars, quantities, exitPrices, commissions))
+    rows = np.arange(len(equity))[:, None]
+    closed = (exitBars >= 0) & (quantities > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tradeReturns = np.where(closed, quantities * (exitPrices - entryPrices) - commissions, np.nan)
+        turnover = quantities * entryPrices / equity[rows, entryBars]
+        turnover += np.where(closed, quantities * exitPrices / equity[rows, np.maximum(exitBars, 0)], 0.0)
+        exposure = 1 - cash / equity
+
+    return getPerformanceMetrics(equity, initialCapital, tradeReturns, exposure, turnover)
@@ -0,0 +1,265 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from algorithms.hmm import HMMRegimeModel
+from algorithms.xgboost import XGBModel
+from configs.backtest import BacktestConfig
+from configs.path import PathConfig
+from engine.vectorized import BacktestResult, VectorizedBacktester
+from errors.base_exception import BacktesterError
+from schemas.backtest import WalkForwardFoldModel, WalkForwardModel
+from strategies.position_sizer.hmm_position_sizer import getRegimeFractions, rankRegimes
+
+
+class WalkForwardMode(str, Enum):
+    ROLLING = "rolling"         # Every fold trains on the same length of bars before its test bars
+    EXPANDING = "expanding"     # Every fold trains on all the bars from the start before its test bars
+
+
+class WalkForwardFold:
+    """First and last bars (inclusive) of the train and test windows of a fold."""
+
+    def __init__(self, number: int, trainStart: pd.Timestamp, trainEnd: pd.Timestamp, testStart: pd.Timestamp, testEnd: pd.Timestamp):
+        self.number = number
+        self.trainStart = trainStart
+        self.trainEnd = trainEnd
+        self.testStart = testStart
+        self.testEnd = testEnd
+
+
+class FoldTask:
+    """Train and test rows of one model of one fold, sent to a worker process."""
+
+    def __init__(
+            self,
+            fold: WalkForwardFold,
+            modelName: str,
+            modelPath: str,
+            trainFeatures: pd.DataFrame,
+            trainLabels: Optional[pd.Series],
+            testFeatures: pd.DataFrame,
+            optimize: bool):
+        self.fold = fold
+        self.modelName = modelName          # 'hmm' or 'xgb'
+        self.modelPath = modelPath          # Cache of the fitted model, loaded instead of training if it exists
+        self.trainFeatures = trainFeatures
+        self.trainLabels = trainLabels
+        self.testFeatures = testFeatures
+        self.optimize = optimize
+
+
+class WalkForwardResult:
+    """Simulation of the stitched out-of-sample bars of every fold, and the return of every fold."""
+
+    def __init__(self, mode: str, folds: List[WalkForwardFold], foldReturns: List[float], cachedFolds: List[bool], result: BacktestResult):
+        self.mode = mode
+        self.folds = folds
+        self.foldReturns = foldReturns
+        self.cachedFolds = cachedFolds      # Whether all the models of every fold were loaded from the cache
+        self.result = result
+
+    def toResponseModel(self) -> WalkForwardModel:
+        response = self.result.toResponseModel()
+        return WalkForwardModel(
+            mode=self.mode,
+            initialCapital=response.initialCapital,
+            finalEquity=response.finalEquity,
+            totalReturn=response.totalReturn,
+            totalCommission=response.totalCommission,
+            numberOfTrades=response.numberOfTrades,
+            folds=[
+                WalkForwardFoldModel(
+                    number=fold.number,
+                    trainStart=fold.trainStart,
+                    trainEnd=fold.trainEnd,
+                    testStart=fold.testStart,
+                    testEnd=fold.testEnd,
+                    totalReturn=foldReturn,
+                    cached=cached)
+                for fold, foldReturn, cached in zip(self.folds, self.foldReturns, self.cachedFolds)
+            ],
+            equityCurve=list(zip(self.result.index.strftime("%Y-%m-%dT%H:%M:%S"), self.result.equity.tolist()))
+        )
+
+
+def getFolds(
+        index: pd.DatetimeIndex,
+        testStart: Union[date, datetime, str, None],
+        testEnd: Union[date, datetime, str, None],
+        trainStart: Union[date, datetime, str, None] = None,
+        mode: Optional[str] = None,
+        trainPeriod: Optional[pd.Timedelta] = None,
+        testPeriod: Optional[pd.Timedelta] = None) -> List[WalkForwardFold]:
+    """
+    Split the bars from `testStart` to `testEnd` into consecutive test windows of `testPeriod`, each trained on the
+    bars before it: the last `trainPeriod` in rolling mode, all the bars from `trainStart` in expanding mode. The
+    windows without bars are skipped. The defaults come from BacktestConfig.
+    """
+    mode = mode or BacktestConfig.WALK_FORWARD_MODE
+    trainPeriod = trainPeriod if trainPeriod is not None else pd.Timedelta(days=BacktestConfig.WALK_FORWARD_TRAIN_DAYS)
+    testPeriod = testPeriod if testPeriod is not None else pd.Timedelta(days=BacktestConfig.WALK_FORWARD_TEST_DAYS)
+
+    if mode not in WalkForwardMode._value2member_map_:
+        raise BacktesterError("backtest/invalid-walk-forward", details=f"The supported modes are {list(WalkForwardMode._value2member_map_)}.")
+    if testStart is None or testEnd is None:
+        raise BacktesterError("backtest/invalid-date-interval", details="The forward test needs a forward start date and a forward end date.")
+    if pd.Timestamp(testEnd) <= pd.Timestamp(testStart):
+        raise BacktesterError("backtest/invalid-date-interval", details="Forward end date must be after forward start date.")
+    if trainPeriod <= pd.Timedelta(0) or testPeriod <= pd.Timedelta(0):
+        raise BacktesterError("backtest/invalid-walk-forward", details="The train and test periods should be positive.")
+
+    trainStart = pd.Timestamp(trainStart) if trainStart is not None else index[0]
+    starts = pd.date_range(pd.Timestamp(testStart), pd.Timestamp(testEnd), freq=testPeriod)
+    ends = list(starts[1:]) + [pd.Timestamp(testEnd)]
+
+    folds = []
+    for position, (start, end) in enumerate(zip(starts, ends)):
+        # The test windows are half-open, except the last one which ends on `testEnd` like a `.loc` slice
+        isLast = position == len(starts) - 1
+        testBars = index[(index >= start) & ((index <= end) if isLast else (index < end))]
+        trainFrom = start - trainPeriod if mode == WalkForwardMode.ROLLING else trainStart
+        trainBars = index[(index >= trainFrom) & (index < start)]
+
+        if len(testBars) == 0:
+            continue
+        if len(trainBars) < BacktestConfig.WALK_FORWARD_MIN_TRAIN_BARS:
+            raise BacktesterError("backtest/invalid-walk-forward", details=f"The fold starting on {start} has {len(trainBars)} bars to train on, at least {BacktestConfig.WALK_FORWARD_MIN_TRAIN_BARS} are required.")
+
+        folds.append(WalkForwardFold(len(folds) + 1, trainBars[0], trainBars[-1], testBars[0], testBars[-1]))
+
+    if not folds:
+        raise BacktesterError("backtest/invalid-walk-forward", details="There are no bars between the forward start date and the forward end date.")
+
+    return folds
+
+
+def getFoldModelPath(modelName: str, fold: WalkForwardFold, params: Dict[str, Any], *data: Optional[Union[pd.DataFrame, pd.Series]]) -> str:
+    """Cache path of a model fitted on the train window of a fold, keyed by the window, the parameters and the data."""
+    digest = hashlib.sha1(json.dumps({
+        "model": modelName,
+        "train": [fold.trainStart.isoformat(), fold.trainEnd.isoformat()],
+        "params": params
+    }, sort_keys=True, default=str).encode())
+
+    for values in data:
+        if values is not None:
+            columns = values.columns if isinstance(values, pd.DataFrame) else [values.name]
+            digest.update(json.dumps([str(column) for column in columns]).encode())
+            digest.update(pd.util.hash_pandas_object(values, index=True).to_numpy().tobytes())
+
+    return os.path.join(PathConfig.MODELS_DIR, "walk_forward", f"{modelName}_{digest.hexdigest()[:24]}.joblib")
+
+
+def runWalkForward(
+        backtester: VectorizedBacktester,
+        prices: pd.Series,
+        signals: pd.Series,
+        fractions: Union[pd.Series, float],
+        folds: List[WalkForwardFold],
+        marketData: Optional[pd.DataFrame] = None,
+        regimeFeatures: Optional[pd.DataFrame] = None,
+        signalFeatures: Optional[pd.DataFrame] = None,
+        signalLabels: Optional[pd.Series] = None,
+        labelHorizon: Optional[int] = None,
+        mode: Optional[str] = None,
+        optimize: Optional[bool] = None,
+        workers: Optional[int] = None) -> WalkForwardResult:
+    """
+    Walk-forward test: fit the models on the train window of every fold, predict its test window, and simulate the
+    predictions of all the test windows together.
+    - With `regimeFeatures`, an HMMRegimeModel per fold predicts the regimes, whose fractions replace `fractions`.
+      The regimes are ranked by the mean `daily_return` (else first column) of their train bars in every fold, and
+      the fractions follow the ranks, so a regime keeps its fraction whatever the state numbers of the fit.
+    - With `signalFeatures` and `signalLabels`, an XGBModel per fold predicts the classes, which replace `signals`.
+      The labels of the last `labelHorizon` bars before the test window look into it and are purged from the train
+      window (default: BacktestConfig.WALK_FORWARD_LABEL_HORIZON).
+    The models of all the folds are fitted by a process pool. A fitted model is saved under PathConfig.MODELS_DIR,
+    keyed by its train window, parameters and data, so a rerun loads it instead of training it again.
+    The test windows are simulated as one out-of-sample curve, so the cash and the open position carry from a fold
+    to the next without a forced exit.
+    """
+    mode = mode or BacktestConfig.WALK_FORWARD_MODE
+    optimize = BacktestConfig.WALK_FORWARD_OPTIMIZE if optimize is None else optimize
+    workers = max(workers or BacktestConfig.WALK_FORWARD_WORKERS, 1)
+    labelHorizon = BacktestConfig.WALK_FORWARD_LABEL_HORIZON if labelHorizon is None else labelHorizon
+
+    if labelHorizon < 0:
+        raise BacktesterError("backtest/invalid-walk-forward", details="The label horizon should be at least 0 bars.")
+
+    tasks = []
+    for fold in folds:
+        if regimeFeatures is not None:
+            trainFeatures = regimeFeatures.loc[fold.trainStart:fold.trainEnd]
+            modelPath = getFoldModelPath("hmm", fold, { "optimize": optimize }, trainFeatures)
+            tasks.append(FoldTask(fold, "hmm", modelPath, trainFeatures, None, regimeFeatures.loc[fold.testStart:fold.testEnd], optimize))
+
+        if signalFeatures is not None and signalLabels is not None:
+            # Purge the labels whose horizon reaches the test window
+            purgeStart = prices.index[max(prices.index.searchsorted(fold.testStart) - labelHorizon, 0)]
+            trainLabels = signalLabels.loc[fold.trainStart:fold.trainEnd]
+            trainLabels = trainLabels[trainLabels.index < purgeStart].dropna()
+            trainFeatures = signalFeatures.reindex(trainLabels.index)
+            modelPath = getFoldModelPath("xgb", fold, { "optimize": optimize }, trainFeatures, trainLabels)
+            tasks.append(FoldTask(fold, "xgb", modelPath, trainFeatures, trainLabels, signalFeatures.loc[fold.testStart:fold.testEnd], optimize))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            predictions = list(executor.map(_fitTask, tasks))
+    else:
+        predictions = [_fitTask(task) for task in tasks]
+
+    cachedTasks = sum(cached for _, cached in predictions)
+    if tasks:
+        print(f"[INFO] Walk-forward: {cachedTasks} of {len(tasks)} fold models loaded from the cache.")
+
+    testIndex = prices.index[(prices.index >= folds[0].testStart) & (prices.index <= folds[-1].testEnd)]
+    regimeFractions = [pd.Series(getRegimeFractions(values), index=task.testFeatures.index) for task, (values, _) in zip(tasks, predictions) if task.modelName == "hmm"]
+    modelSignals = [pd.Series(np.asarray(values, dtype=np.float64) - 1, index=task.testFeatures.index) for task, (values, _) in zip(tasks, predictions) if task.modelName == "xgb"]
+
+    # The bars without prediction (no features yet) take the most defensive fraction and no signal
+    if regimeFractions:
+        fractions = pd.concat(regimeFractions).reindex(testIndex, method="ffill").fillna(0.05)
+    if modelSignals:
+        signals = pd.concat(modelSignals).reindex(testIndex).fillna(0)
+
+    result = backtester.runFrame(prices.loc[testIndex], signals, fractions, marketData=marketData)
+
+    # Return of every fold, from the equity before its first bar to its last bar
+    ends = testIndex.searchsorted([fold.testEnd for fold in folds], side="right") - 1
+    foldEquity = result.equity[ends]
+    foldReturns = (foldEquity / np.concatenate([[backtester.initialCapital], foldEquity[:-1]]) - 1).tolist()
+    foldCaches = {}
+    for task, (_, cached) in zip(tasks, predictions):
+        foldCaches.setdefault(task.fold.number, []).append(cached)
+    cachedFolds = [bool(foldCaches.get(fold.number)) and all(foldCaches[fold.number]) for fold in folds]
+
+    return WalkForwardResult(mode, folds, foldReturns, cachedFolds, result)
+
+
+def _fitTask(task: FoldTask) -> Tuple[np.ndarray, bool]:
+    """Predictions of the model of a fold on its test rows, and whether the fitted model came from the cache."""
+    if task.modelName == "hmm":
+        model = HMMRegimeModel(modelPath=task.modelPath)
+        cached = model.isFitted
+        if not cached:
+            model.fit(task.trainFeatures, optimize=task.optimize)
+    else:
+        model = XGBModel(model_path=task.modelPath)
+        cached = model.is_fitted
+        if not cached:
+            model.fit(task.trainFeatures, task.trainLabels, optimize=task.optimize)
+
+    predictions = model.predict(task.testFeatures) if len(task.testFeatures) else np.empty(0)
+
+    if task.modelName == "hmm" and len(predictions):
+        returns = task.trainFeatures["daily_return"] if "daily_return" in task.trainFeatures else task.trainFeatures.iloc[:, 0]
+        predictions = rankRegimes(predictions, model.predict(task.trainFeatures), returns.to_numpy())
+
+    return np.asarray(predictions), cached
@@ -32,6 +32,42 @@ ERROR_REGISTRY: Dict[str, Dict] = {
     "backtest/invalid-position-size": {
         "message": "Invalid position size. The position size should be greater than 0.0 and not greater than 1.0."
     },
+    "backtest/invalid-exit-tie-break": {
+        "message": "Invalid exit tie-break rule. The supported rules are 'stop-first', 'target-first' or 'nearest-to-open' only.",
+        "statusCode": 400
+    },
+    "backtest/invalid-market-data": {
+        "message": "Invalid market data to run the backtest. Please check the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-strategy": {
+        "message": "Invalid strategy. Please check the available strategies.",
+        "statusCode": 400
+    },
+    "backtest/invalid-permutation-test": {
+        "message": "Invalid permutation test settings. Please look at the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-sweep-metric": {
+        "message": "Invalid metric to rank the parameter sweep. Please look at the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-sweep-parameter": {
+        "message": "Invalid parameter grid. Please look at the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-bootstrap": {
+        "message": "Invalid bootstrap settings. Please look at the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-walk-forward": {
+        "message": "Invalid walk-forward test settings. Please look at the error details.",
+        "statusCode": 400
+    },
+    "backtest/invalid-portfolio-weights": {
+        "message": "Invalid portfolio weights. Please look at the error details.",
+        "statusCode": 400
+    },
     "backtest/invalid-range": {
         "message": "The valid range is between 0 to 1.",
         "statusCode": 400,
@@ -48,6 +84,18 @@ ERROR_REGISTRY: Dict[str, Dict] = {
         "message": "Invalid provider. The supported providers are 'cryptoquant', 'glassnode' or 'coinbase' only.",
         "statusCode": 400
     },
+    "data/invalid-category": {
+        "message": "Invalid category. Please check the available endpoints of the provider.",
+        "statusCode": 400
+    },
+    "data/invalid-storage-format": {
+        "message": "Invalid storage format. The supported formats are 'parquet', 'feather' or 'csv' only.",
+        "statusCode": 400
+    },
+    "data/invalid-alignment-policy": {
+        "message": "Invalid alignment policy. The supported policies are 'asof' or 'exact' only.",
+        "statusCode": 400
+    },
     "data/invalid-endpoint": {
         "message": "Invalid endpoint. Please check the documentation.",
         "statusCode": 400
@@ -56,10 +104,18 @@ ERROR_REGISTRY: Dict[str, Dict] = {
         "message": "The data does not exist. Please run the DataLoader first.",
         "statusCode": 400
     },
+    "feature/duplicate-columns": {
+        "message": "The same column exists in more than one dataset to merge.",
+        "statusCode": 500
+    },
     "feature/fail-to-load-data": {
-        "message": "Error while reading CSV files.",
+        "message": "Error while reading the data files.",
         "statusCode": 500
     },
+    "feature/invalid-transform": {
+        "message": "Invalid indicator transform. Please check the documentation.",
+        "statusCode": 400
+    },
     "feature/missing-columns": {
         "message": "Missing columns required to calculate the features.",
         "statusCode": 400
@@ -68,6 +124,18 @@ ERROR_REGISTRY: Dict[str, Dict] = {
         "message": "Please provide the features to load.",
         "statusCode": 400
     },
+    "trade/insufficient-quantity": {
+        "message": "The quantity to sell is greater than the quantity held.",
+        "statusCode": 400
+    },
+    "trade/invalid-order-price": {
+        "message": "Invalid order price. The prices should be greater than 0.",
+        "statusCode": 400
+    },
+    "trade/invalid-order-quantity": {
+        "message": "Invalid order quantity. The quantity should be greater than 0.",
+        "statusCode": 400
+    },
     "strategy/data-not-loaded": {
         "message": "Failed to load the data to run strategy.",
         "statusCode": 400
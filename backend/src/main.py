@@ -44,6 +44,8 @@ if __name__ == "__main__":
     # dataLoader.run(category="miner-flows")
     # dataLoader.run(category="market-data")
     # dataLoader.run(category="network-data")
+    # dataLoader.runAll(maxConcurrency=8)  # Fetch all categories concurrently
+    # dataLoader.runAll(incremental=True)  # Fetch only the rows newer than the stored data
 
 
     featureLoader = FeatureLoader("2023-12-31")
@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import Dict, List, Optional
+import numpy as np
+
+from configs.backtest import BacktestConfig
+from errors.base_exception import BacktesterError
+from metrics.performance import getPerformanceMetrics
+from schemas.backtest import BootstrapModel, ConfidenceIntervalModel
+
+
+class BootstrapMethod(str, Enum):
+    STATIONARY = "stationary"   # Blocks of random lengths (geometric, of mean the block size), Politis and Romano
+    BLOCK = "block"             # Blocks of the block size, drawn with replacement (circular)
+
+
+# Metrics of the equity curve given a confidence interval
+BOOTSTRAP_METRICS = ["totalReturn", "annualizedReturn", "volatility", "sharpeRatio", "sortinoRatio", "calmarRatio", "maxDrawdown"]
+
+
+class BootstrapResult:
+    """Metrics of the backtest and the bounds of their confidence intervals over the resampled equity curves."""
+
+    def __init__(self, method: str, resamples: int, blockSize: int, confidenceLevel: float, estimates: Dict[str, float], lower: Dict[str, float], upper: Dict[str, float]):
+        self.method = method
+        self.resamples = resamples
+        self.blockSize = blockSize
+        self.confidenceLevel = confidenceLevel
+        self.estimates = estimates
+        self.lower = lower
+        self.upper = upper
+
+    def toResponseModel(self) -> BootstrapModel:
+        def toValue(value: float) -> Optional[float]:
+            return float(value) if np.isfinite(value) else None
+
+        return BootstrapModel(
+            method=self.method,
+            resamples=self.resamples,
+            blockSize=self.blockSize,
+            confidenceLevel=self.confidenceLevel,
+            intervals={
+                name: ConfidenceIntervalModel(estimate=toValue(self.estimates[name]), lower=toValue(self.lower[name]), upper=toValue(self.upper[name]))
+                for name in BOOTSTRAP_METRICS
+            }
+        )
+
+
+class BootstrapTask:
+    """Bar growth factors of the equity curve and the seeds of a batch of resamples, sent to a worker process."""
+
+    def __init__(self, growth: np.ndarray, startEquity: float, initialCapital: float, seeds: List[np.random.SeedSequence], method: str, blockSize: int):
+        self.growth = growth
+        self.startEquity = startEquity
+        self.initialCapital = initialCapital
+        self.seeds = seeds
+        self.method = method
+        self.blockSize = blockSize
+
+
+def runBootstrap(
+        equity: np.ndarray,
+        initialCapital: float,
+        resamples: Optional[int] = None,
+        method: Optional[str] = None,
+        blockSize: Optional[int] = None,
+        confidenceLevel: Optional[float] = None,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None) -> BootstrapResult:
+    """
+    Bootstrap confidence intervals of the metrics (BOOTSTRAP_METRICS) of an equity curve: its bar returns are
+    resampled in blocks, which keeps their short-term dependence (volatility clusters), `resamples` times, and the
+    bounds are the percentiles of the metrics of the rebuilt curves around `confidenceLevel` of them.
+
+    Every resample draws from its own stream of `np.random.SeedSequence(seed).spawn`, so the results only depend on
+    the seed, whatever the number of workers and batches. The curves of a batch of resamples are rebuilt at once and
+    their metrics computed by `getPerformanceMetrics` along the rows, a batch holding at most
+    BacktestConfig.BOOTSTRAP_BATCH_SIZE elements. The batches are computed in-process by default (a process pool is
+    only started with several workers).
+    The defaults come from BacktestConfig.
+    """
+    resamples = resamples if resamples is not None else BacktestConfig.BOOTSTRAP_RESAMPLES
+    method = method or BacktestConfig.BOOTSTRAP_METHOD
+    blockSize = blockSize or BacktestConfig.BOOTSTRAP_BLOCK_SIZE
+    confidenceLevel = confidenceLevel if confidenceLevel is not None else BacktestConfig.BOOTSTRAP_CONFIDENCE_LEVEL
+    seed = seed if seed is not None else BacktestConfig.BOOTSTRAP_SEED
+    workers = max(workers or BacktestConfig.BOOTSTRAP_WORKERS, 1)
+
+    if method not in BootstrapMethod._value2member_map_:
+        raise BacktesterError("backtest/invalid-bootstrap", details=f"The supported methods are {list(BootstrapMethod._value2member_map_)}.")
+    if resamples < 1 or resamples > BacktestConfig.BOOTSTRAP_MAX_RESAMPLES:
+        raise BacktesterError("backtest/invalid-bootstrap", details=f"The number of resamples should be between 1 and {BacktestConfig.BOOTSTRAP_MAX_RESAMPLES}.")
+    if blockSize < 1:
+        raise BacktesterError("backtest/invalid-bootstrap", details="The block size should be at least 1 bar.")
+    if not 0 < confidenceLevel < 1:
+        raise BacktesterError("backtest/invalid-bootstrap", details="The confidence level should be between 0 and 1.")
+
+    equity = np.asarray(equity, dtype=np.float64)
+    estimates = getPerformanceMetrics(equity, initialCapital)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth = equity[1:] / equity[:-1]
+
+    if len(growth) < 2:
+        nan = { name: np.nan for name in BOOTSTRAP_METRICS }
+        return BootstrapResult(method, resamples, blockSize, confidenceLevel, estimates, nan, dict(nan))
+
+    # One batch per worker at least, and at most BOOTSTRAP_BATCH_SIZE elements of curves per batch
+    batchSize = max(min(BacktestConfig.BOOTSTRAP_BATCH_SIZE // len(equity), -(-resamples // workers)), 1)
+    seeds = np.random.SeedSequence(seed).spawn(resamples)
+    tasks = [BootstrapTask(growth, equity[0], initialCapital, seeds[start:start + batchSize], method, blockSize) for start in range(0, resamples, batchSize)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            batches = list(executor.map(_resampleTask, tasks))
+    else:
+        batches = [_resampleTask(task) for task in tasks]
+
+    lowerPercentile, upperPercentile = 50 * (1 - confidenceLevel), 50 * (1 + confidenceLevel)
+    lower, upper = {}, {}
+    for name in BOOTSTRAP_METRICS:
+        values = np.concatenate([batch[name] for batch in batches])
+        values = values[np.isfinite(values)]
+        lower[name], upper[name] = np.percentile(values, [lowerPercentile, upperPercentile]) if len(values) else (np.nan, np.nan)
+
+    return BootstrapResult(method, resamples, blockSize, confidenceLevel, estimates, lower, upper)
+
+
+def resampleBars(bars: int, rng: np.random.Generator, method: str, blockSize: int) -> np.ndarray:
+    """Positions of `bars` bars drawn in blocks of consecutive bars, wrapping around at the end."""
+    if method == BootstrapMethod.STATIONARY:
+        # A new block starts at every bar with probability 1 / blockSize
+        newBlocks = rng.random(bars) < 1 / blockSize
+        newBlocks[0] = True
+        blockStarts = np.flatnonzero(newBlocks)
+        blocks = np.cumsum(newBlocks) - 1
+        starts = rng.integers(0, bars, len(blockStarts))
+        return (starts[blocks] + np.arange(bars) - blockStarts[blocks]) % bars
+
+    starts = rng.integers(0, bars, -(-bars // blockSize))
+    return ((starts[:, None] + np.arange(blockSize)) % bars).ravel()[:bars]
+
+
+def _resampleTask(task: BootstrapTask) -> Dict[str, np.ndarray]:
+    """Metrics of the curves rebuilt from a batch of resamples of the growth factors."""
+    bars = len(task.growth)
+    equity = np.empty((len(task.seeds), bars + 1))
+    equity[:, 0] = task.startEquity
+    for row, seed in enumerate(task.seeds):
+        equity[row, 1:] = task.growth[resampleBars(bars, np.random.default_rng(seed), task.method, task.blockSize)]
+    np.cumprod(equity, axis=1, out=equity)
+
+    metrics = getPerformanceMetrics(equity, task.initialCapital)
+    return { name: metrics[name] for name in BOOTSTRAP_METRICS }
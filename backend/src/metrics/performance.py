@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+from configs.backtest import BacktestConfig
+
+# Metrics of getPerformanceMetrics, and whether a higher value is better
+PERFORMANCE_METRICS = {
+    "finalEquity": True,
+    "totalReturn": True,
+    "annualizedReturn": True,
+    "volatility": False,
+    "sharpeRatio": True,
+    "sortinoRatio": True,
+    "calmarRatio": True,
+    "maxDrawdown": False,
+    "maxDrawdownDuration": False,
+    "winRate": True,
+    "profitFactor": True,
+    "turnover": False,
+    "exposure": False
+}
+
+
+def getPerformanceMetrics(
+        equity: np.ndarray,
+        initialCapital: Union[float, np.ndarray, None] = None,
+        tradeReturns: Optional[np.ndarray] = None,
+        exposure: Optional[np.ndarray] = None,
+        turnover: Optional[np.ndarray] = None,
+        barsPerYear: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Metrics (PERFORMANCE_METRICS) of an equity curve, or of every row of a (runs x bars) array of curves. The bar
+    returns, the running peaks and the drawdowns are computed once and every metric is a reduction of them along the
+    bars, so a whole batch of runs costs a few passes over the array.
+    - The returns and ratios are annualized with `barsPerYear` (default: BacktestConfig.BARS_PER_YEAR), the total
+      return is measured from `initialCapital` (default: the first equity).
+    - The drawdown duration is the longest number of bars spent below a previous peak.
+    - The win rate and profit factor are those of the `tradeReturns` (profit of every trade, NaN for none), else of the
+      bars with a non-zero return.
+    - The turnover is the sum of the values traded at every bar over the equity, and the exposure the average value
+      of the positions over the equity, NaN if not given.
+    Return an array per metric, one value per run, or a value per metric for a single curve.
+    """
+    isSingle = np.ndim(equity) == 1
+    equity = np.atleast_2d(np.asarray(equity, dtype=np.float64))
+    runs, bars = equity.shape
+    barsPerYear = barsPerYear or BacktestConfig.BARS_PER_YEAR
+    initialCapital = equity[:, 0] if initialCapital is None else np.broadcast_to(np.asarray(initialCapital, dtype=np.float64), (runs,))
+    barPositions = np.arange(bars)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = equity[:, 1:] / equity[:, :-1] - 1
+        meanReturns = returns.mean(axis=1) if bars > 1 else np.full(runs, np.nan)
+        volatility = returns.std(axis=1, ddof=1) if bars > 2 else np.full(runs, np.nan)
+        downsideDeviation = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=1)) if bars > 1 else np.full(runs, np.nan)
+
+        peaks = np.maximum.accumulate(equity, axis=1)
+        drawdowns = 1 - equity / peaks
+        lastPeaks = np.maximum.accumulate(np.where(equity >= peaks, barPositions, 0), axis=1)
+
+        growth = equity[:, -1] / initialCapital
+        annualizedReturn = np.where(growth > 0, np.abs(growth) ** (barsPerYear / max(bars - 1, 1)) - 1, np.where(np.isnan(growth), np.nan, -1.0))
+        maxDrawdown = drawdowns.max(axis=1)
+
+        outcomes = np.where(returns != 0, returns, np.nan) if tradeReturns is None else np.atleast_2d(np.asarray(tradeReturns, dtype=np.float64))
+        outcomeCount = np.count_nonzero(~np.isnan(outcomes), axis=1)
+        gains = np.where(outcomes > 0, outcomes, 0.0).sum(axis=1)
+        losses = np.where(outcomes < 0, -outcomes, 0.0).sum(axis=1)     # +0.0 without losses, so no loss is an infinite profit factor
+
+        metrics = {
+            "finalEquity": equity[:, -1],
+            "totalReturn": growth - 1,
+            "annualizedReturn": annualizedReturn,
+            "volatility": volatility * np.sqrt(barsPerYear),
+            "sharpeRatio": meanReturns / volatility * np.sqrt(barsPerYear),
+            "sortinoRatio": meanReturns / downsideDeviation * np.sqrt(barsPerYear),
+            "calmarRatio": annualizedReturn / maxDrawdown,
+            "maxDrawdown": maxDrawdown,
+            "maxDrawdownDuration": (barPositions - lastPeaks).max(axis=1).astype(np.float64),
+            "winRate": np.where(outcomeCount > 0, np.count_nonzero(outcomes > 0, axis=1) / np.maximum(outcomeCount, 1), np.nan),
+            "profitFactor": np.where(outcomeCount > 0, gains / losses, np.nan),
+            "turnover": np.full(runs, np.nan) if turnover is None else np.atleast_2d(turnover).sum(axis=1),
+            "exposure": np.full(runs, np.nan) if exposure is None else np.atleast_2d(exposure).mean(axis=1)
+        }
+
+    if isSingle:
+        return { name: values[0] for name, values in metrics.items() }
+    return metrics
+
+
+def getCurves(equity: np.ndarray, index: Optional[pd.Index] = None) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    """Equity and drawdown (fraction below the running peak) of every bar, keyed by the time of the bar (or its number)."""
+    equity = np.asarray(equity, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdowns = 1 - equity / np.maximum.accumulate(equity)
+
+    keys = index.strftime("%Y-%m-%dT%H:%M:%S") if isinstance(index, pd.DatetimeIndex) else [str(key) for key in (index if index is not None else range(len(equity)))]
+    return list(zip(keys, equity.tolist())), list(zip(keys, drawdowns.tolist()))
@@ -0,0 +1,156 @@
+import os
+import hashlib
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from configs.data import DataConfig
+
+
+class CachedDataset:
+
+    def __init__(self, data: pd.DataFrame, signature: Tuple, hashes: Dict[str, str], version: str):
+        self.data = data
+        self.signature = signature
+        self.version = version
+        self.hashes = hashes
+        self.hits = 0
+        self.memoryBytes = int(data.memory_usage(index=True, deep=True).sum())
+
+
+class DatasetCache:
+    """
+    Process-wide cache of the loaded datasets, shared by every FeatureLoader (and so by every request).
+    An entry is identified by a key and the files it was built from. It is reloaded automatically when one of these
+    files changes, detected by mtime and size or, with `validation='hash'`, by the content hash of the files whose
+    mtime changed. The cached arrays are read-only and callers receive shallow views of them, so a request can never
+    modify the data seen by another one.
+    The cache holds at most `maxEntries` datasets and `maxBytes` bytes, the least recently used datasets are evicted
+    first. The dataset just loaded is always kept, even when it is larger than `maxBytes` on its own.
+    """
+
+    def __init__(
+            self,
+            validation: str = DataConfig.DATASET_CACHE_VALIDATION,
+            maxEntries: int = DataConfig.DATASET_CACHE_MAX_ENTRIES,
+            maxBytes: int = DataConfig.DATASET_CACHE_MAX_BYTES):
+        self.validation = validation
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries: "OrderedDict[str, CachedDataset]" = OrderedDict()
+        self.lock = threading.RLock()
+        self.stats: Dict[str, int] = { "hits": 0, "misses": 0, "invalidations": 0, "evictions": 0 }
+
+    def get(self, key: str, paths: List[str], loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return a read-only view of the dataset `key`, calling `loader` if it is not cached or its files changed."""
+        return self.getVersioned(key, paths, loader)[0]
+
+    def getVersioned(self, key: str, paths: List[str], loader: Callable[[], pd.DataFrame]) -> Tuple[pd.DataFrame, str]:
+        """
+        Same as `get`, with the version of the dataset: a hash of the key and of the files it was loaded from, which
+        identifies the data across processes without hashing it.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and self._isValid(entry, paths):
+                self.entries.move_to_end(key)
+                entry.hits += 1
+                self.stats["hits"] += 1
+                return entry.data.copy(deep=False), entry.version
+
+            if entry is not None:
+                del self.entries[key]
+                self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+
+            # Loading under the lock: concurrent requests wait for a single load instead of all reading the files
+            data = loader()
+            _freeze(data)
+
+            signature = self._getSignature(paths)
+            hashes = { path: _hashFile(path) for path in paths if os.path.exists(path) } if self.validation == "hash" else {}
+            version = hashlib.sha256(repr((key, signature)).encode()).hexdigest()
+            self.entries[key] = CachedDataset(data=data, signature=signature, hashes=hashes, version=version)
+            self._evict()
+
+            return data.copy(deep=False), version
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def getStats(self) -> Dict[str, Any]:
+        with self.lock:
+            datasets = {
+                key: {
+                    "rows": len(entry.data),
+                    "columns": entry.data.shape[1],
+                    "memoryBytes": entry.memoryBytes,
+                    "hits": entry.hits
+                }
+                for key, entry in self.entries.items()
+            }
+
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "memoryBytes": sum(dataset["memoryBytes"] for dataset in datasets.values()),
+                "datasets": datasets
+            }
+
+    def _evict(self) -> None:
+        """Drop the least recently used datasets until the cache is within its bounds, keeping the most recent one."""
+        memoryBytes = sum(entry.memoryBytes for entry in self.entries.values())
+
+        while len(self.entries) > 1 and (len(self.entries) > self.maxEntries or memoryBytes > self.maxBytes):
+            _, entry = self.entries.popitem(last=False)
+            memoryBytes -= entry.memoryBytes
+            self.stats["evictions"] += 1
+
+    def _isValid(self, entry: CachedDataset, paths: List[str]) -> bool:
+        signature = self._getSignature(paths)
+
+        if signature == entry.signature:
+            return True
+
+        if self.validation != "hash" or [path for path, *_ in signature] != [path for path, *_ in entry.signature]:
+            return False
+
+        # The files were touched, keep the entry if their content did not change
+        hashes = { path: _hashFile(path) for path in paths if os.path.exists(path) }
+        if hashes != entry.hashes:
+            return False
+
+        entry.signature = signature
+        return True
+
+    def _getSignature(self, paths: List[str]) -> Tuple:
+        signature = []
+        for path in paths:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+
+def _freeze(data: pd.DataFrame) -> None:
+    """Make the arrays backing the dataframe read-only, so in-place writes on a shared view raise instead of leaking."""
+    for block in data._mgr.blocks:
+        values = block.values
+        if hasattr(values, "flags"):
+            values.flags.writeable = False
+
+def _hashFile(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+datasetCache = DatasetCache()
@@ -0,0 +1,161 @@
+from typing import TYPE_CHECKING, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from configs.data import DataConfig
+from errors.base_exception import BacktesterError
+from pipeline.features import Feature
+
+if TYPE_CHECKING:
+    from pipeline.feature_store import FeatureStore
+
+
+class FeatureGraph:
+    """
+    Dependency graph of the requested features.
+    The features (and their dependencies) are deduplicated by key and computed once each in dependency order, every
+    node only producing its new columns. The requested columns are assembled at the end, so the memory scales with the
+    features requested instead of copying the whole dataset at every step.
+    With a FeatureStore, the columns of a node computed before on the same data are read from the store instead. The
+    data is identified by its `version` if given (see `DatasetCache.getVersioned`), else by the hash of its columns.
+    With more than one worker, the independent nodes of a level of the graph, and the column groups of the nodes which
+    can be split, are computed concurrently on a thread pool (NumPy and the pandas rolling kernels release the GIL).
+    The results are reassembled in the order of the graph, so they do not depend on the number of workers.
+    """
+
+    def __init__(self, features: List[Feature], store: Optional["FeatureStore"] = None, workers: Optional[int] = None):
+        self.features = features
+        self.store = store
+        self.workers = max(workers or DataConfig.FEATURE_WORKERS, 1)
+        self.nodes: List[Feature] = self._sortNodes(features)
+
+    @property
+    def requiredColumns(self) -> List[str]:
+        """Dataset columns read by the whole graph."""
+        columns = []
+        for node in self.nodes:
+            columns += [column for column in node.requiredColumns if column not in columns]
+        return columns
+
+    @property
+    def lookback(self) -> int:
+        return max([node.lookback for node in self.nodes], default=0)
+
+    @property
+    def outputs(self) -> List[str]:
+        """Columns produced by the requested features."""
+        columns = []
+        for feature in self.features:
+            columns += [column for column in feature.outputs if column not in columns]
+        return columns
+
+    def compute(self, data: pd.DataFrame, version: Optional[str] = None) -> Dict[str, pd.Series]:
+        """Compute every node of the graph and return the new columns by name."""
+        missingColumns = [column for column in self.requiredColumns if column not in data.columns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} are required to compute the features.")
+
+        values: Dict[str, pd.Series] = {}
+        storeKeys: Dict[str, str] = {}
+
+        if self.store is not None and version is None:
+            version = self.store.fingerprint(data, self.requiredColumns)     # Hashed once for all the nodes
+
+        for level in self._getLevels():
+            pending = []
+
+            for node in level:
+                if self.store is not None:
+                    storeKeys[node.key] = self.store.makeKey(node, version, [storeKeys[dependency.key] for dependency in node.dependencies])
+                    cached = self.store.get(storeKeys[node.key])
+                    if cached is not None:
+                        values.update(cached)
+                        continue
+
+                pending.append(node)
+
+            for node, outputs in zip(pending, self._computeNodes(pending, data, values)):
+                values.update(outputs)
+
+                if self.store is not None:
+                    self.store.put(storeKeys[node.key], outputs)
+
+        return values
+
+    def transform(self, data: pd.DataFrame, columns: Optional[List[str]] = None, version: Optional[str] = None) -> pd.DataFrame:
+        """
+        Return `columns`, taken from the computed features or from the dataset.
+        Without `columns`, return the dataset with the outputs of the requested features appended. The dataset columns
+        are shared, not copied.
+        """
+        values = self.compute(data, version=version)
+
+        if columns is None:
+            resultData = data.copy(deep=False)
+            for column in self.outputs:
+                resultData[column] = values[column]
+            return resultData
+
+        missingColumns = [column for column in columns if column not in values and column not in data.columns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} are not produced by the features.")
+
+        return pd.DataFrame({ column: values[column] if column in values else data[column] for column in columns }, index=data.index)
+
+    def _computeNodes(self, nodes: List[Feature], data: pd.DataFrame, values: Dict[str, pd.Series]) -> List[Dict[str, pd.Series]]:
+        """Compute independent nodes, split into column groups and spread over the workers if there are several."""
+        tasks = []
+        for index, node in enumerate(nodes):
+            tasks += [(index, shard) for shard in node.split()]
+
+        def run(shard: Feature) -> Dict[str, pd.Series]:
+            inputs = { column: data[column] for column in shard.requiredColumns }
+            for dependency in shard.dependencies:
+                inputs.update({ column: values[column] for column in dependency.outputs })
+            return shard.compute(inputs)
+
+        if self.workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                results = list(executor.map(run, [shard for _, shard in tasks]))
+        else:
+            results = [run(shard) for _, shard in tasks]
+
+        outputs: List[Dict[str, pd.Series]] = [{} for _ in nodes]
+        for (index, _), result in zip(tasks, results):
+            outputs[index].update(result)
+
+        # Same column order as an unsplit computation
+        return [
+            { name: columns[name] for name in node.outputs if name in columns } | columns
+            for node, columns in zip(nodes, outputs)
+        ]
+
+    def _getLevels(self) -> List[List[Feature]]:
+        """Group the nodes by depth in the graph. The nodes of a level only depend on the nodes of the previous levels."""
+        depths: Dict[str, int] = {}
+        levels: List[List[Feature]] = []
+
+        for node in self.nodes:
+            depth = max([depths[dependency.key] + 1 for dependency in node.dependencies], default=0)
+            depths[node.key] = depth
+            if depth == len(levels):
+                levels.append([])
+            levels[depth].append(node)
+
+        return levels
+
+    def _sortNodes(self, features: List[Feature]) -> List[Feature]:
+        """Deduplicate the features by key and sort them so that every feature comes after its dependencies."""
+        nodes: Dict[str, Feature] = {}
+
+        def visit(feature: Feature) -> None:
+            if feature.key in nodes:
+                return
+            for dependency in feature.dependencies:
+                visit(dependency)
+            nodes[feature.key] = feature
+
+        for feature in features:
+            visit(feature)
+
+        return list(nodes.values())
@@ -1,118 +1,189 @@
-from typing import List, Optional
+from typing import List, Optional, Union
+from datetime import date, datetime
 from pathlib import Path
 import os
 import pandas as pd
 
 from errors.base_exception import BacktesterError
+from configs.data import DataConfig
 from configs.path import PathConfig
+from data.storage import DatasetStore
+from pipeline.dataset_cache import datasetCache
+from pipeline.feature_graph import FeatureGraph
+from pipeline.feature_store import getFeatureStore
 from pipeline.features import Feature
+from pipeline.merge import AlignmentPolicy, mergeAligned
 
 
 class FeatureLoader:
 
-    def __init__(self, backtestDate: str):
-        """Initialize the feature loader."""
+    # Interval between two rows of the merged dataset
+    barInterval: pd.Timedelta = pd.Timedelta(hours=1)
+    # Columns of `loadMarketData`
+    marketColumns: List[str] = ["close", "open", "high", "low", "volume"]
+
+    def __init__(
+            self,
+            backtestDate: str,
+            columns: Optional[List[str]] = None,
+            startDate: Union[date, datetime, str, None] = None,
+            endDate: Union[date, datetime, str, None] = None,
+            features: Optional[List[Feature]] = None):
+        """
+        Initialize the feature loader.
+        By default the whole merged dataset is loaded. Pass `columns` and/or `features` to load only the columns they
+        need, and `startDate`/`endDate` to load only that window. The start is moved back by the largest lookback
+        declared by the features, so they are warmed up on `startDate`.
+        """
         self.backtestDate = backtestDate
+        self.columns = self._getRequiredColumns(columns, features)
+        self.startDate = self._getWarmUpStartDate(startDate, features)
+        self.endDate = endDate
         self.rawDataPath: str = PathConfig.RAW_DATA_DIR
         self.featurePath: str = PathConfig.FEATURES_DIR
 
-        self.exchangeFlowsPath = f"{self.rawDataPath}/cryptoquant_exchange_flows.csv"
-        self.minerFlowsPath = f"{self.rawDataPath}/cryptoquant_miner_flows.csv"
-        self.flowIndicatorPath = f"{self.rawDataPath}/cryptoquant_flow_indicator.csv"
-        self.marketIndicatorPath = f"{self.rawDataPath}/cryptoquant_market_indicator.csv"
-        self.networkIndicatorPath = f"{self.rawDataPath}/cryptoquant_network_indicator.csv"
-        self.marketDataPath = f"{self.rawDataPath}/cryptoquant_market_data.csv"
-        self.networkDataPath = f"{self.rawDataPath}/cryptoquant_network_data.csv" 
+        self.store = DatasetStore(directory=self.rawDataPath)
+
+        # The as-of merges are stored apart, so a merge built before the periods were delayed is never read back
+        self.mergedDataName = "cryptoquant_full_data" if DataConfig.MERGE_ALIGNMENT == AlignmentPolicy.EXACT else "cryptoquant_full_data_asof"
+        self.exchangeFlowsName = "cryptoquant_exchange_flows"
+        self.minerFlowsName = "cryptoquant_miner_flows"
+        self.flowIndicatorName = "cryptoquant_flow_indicator"
+        self.marketIndicatorName = "cryptoquant_market_indicator"
+        self.networkIndicatorName = "cryptoquant_network_indicator"
+        self.marketDataName = "cryptoquant_market_data"
+        self.networkDataName = "cryptoquant_network_data"
+        self.categoryNames = [
+            self.exchangeFlowsName,
+            self.minerFlowsName,
+            self.flowIndicatorName,
+            self.marketIndicatorName,
+            # self.networkIndicatorName,
+            self.marketDataName,
+            self.networkDataName
+        ]
         self.data: pd.DataFrame = pd.DataFrame()
+        self.dataVersion: Optional[str] = None
 
         self._loadAndMergeData()
-    
+
     def _loadAndMergeData(self):
         """
-        Read all the CSV raw data files and merge into a single dataframe for feature engineering.
-        The dataset will be sliced on the backtestDate, the data beyond this date will not be used.
-        Raise BacktesterError if the file path does not exist.
+        Load the merged dataset through the process-wide dataset cache, so it is read from disk only once per process
+        and again only after one of the raw or merged files changed. The returned dataframe is a read-only view.
         """
-        try:
-            filePath = f"{self.rawDataPath}/cryptoquant_full_data.csv"
-            self.data = pd.read_csv(filePath)
-            self.data.set_index("datetime", inplace=True)
-            self.data.sort_index(inplace=True)
-
-            print("Feature Loader is ready.")
-
-            return self.data
-
-        except Exception as e:
-            
-            dataFrames = []
-            filePaths = [
-                self.exchangeFlowsPath,
-                self.minerFlowsPath,
-                self.flowIndicatorPath,
-                self.marketIndicatorPath,
-                # self.networkIndicatorPath,
-                self.marketDataPath,
-                self.networkDataPath
-            ]
-
-            for filePath in filePaths:
-                if not os.path.exists(filePath):
-                    raise BacktesterError("feature/data-not-found")
-                
-                try:
-                    df = pd.read_csv(filePath)
-
-                    if "datetime" not in df.columns:
-                        raise BacktesterError(details="[BUG] the `datetime` column does not exist in the data file.")
-                    
-                    dataFrames.append(df)
-                except Exception as e:
-                    raise BacktesterError("feature/fail-to-load-data")
-
-            if dataFrames:
-                mergedData = dataFrames[0]
-                for df in dataFrames[1:]:
-                    mergedData = pd.merge(mergedData, df, on="datetime", how="outer")   
-
-                mergedData.set_index("datetime", inplace=True)
-                mergedData.sort_index(inplace=True)
-
-                # Save data
-                os.makedirs(self.rawDataPath, exist_ok=True)
-                outputPath = f"{self.rawDataPath}/cryptoquant_full_data.csv"
-
-                self.data = mergedData  # Slice the data
-                self.data.to_csv(outputPath)
-
-                print("Feature Loader is ready.")
-
-                return self.data
-        
-            else:
+        paths = [self.store.findPath(name) for name in [self.mergedDataName] + self.categoryNames]
+        paths = [path for path in paths if path is not None]
+
+        key = f"{self.rawDataPath}/{self.mergedDataName}"
+        if self.columns is not None or self.startDate is not None or self.endDate is not None:
+            key += f"|{self.columns}|{self.startDate}|{self.endDate}"
+
+        self.data, self.dataVersion = datasetCache.getVersioned(key=key, paths=paths, loader=self._readOrBuildMergedData)
+
+        print("Feature Loader is ready.")
+
+        return self.data
+
+    def _readOrBuildMergedData(self) -> pd.DataFrame:
+        """
+        Read all the raw category datasets and merge into a single dataframe for feature engineering.
+        The merged dataset is stored, so the next loads only read it back, until a raw dataset is refreshed.
+        A merged dataset stored in another format (e.g. a legacy CSV) is converted to the configured storage format once.
+        Raise BacktesterError if a raw dataset does not exist.
+        """
+        mergedDataPath = self.store.findPath(self.mergedDataName)
+
+        if mergedDataPath is not None and not self._isMergedDataStale(mergedDataPath):
+
+            if mergedDataPath != self.store.getPath(self.mergedDataName):
+                self.store.save(self.store.load(self.mergedDataName), self.mergedDataName)
+
+            self._checkColumns(self.store.getColumns(self.mergedDataName))
+
+            # Only the projected columns and date range are read from storage
+            data = self.store.load(self.mergedDataName, columns=self.columns, start=self.startDate, end=self.endDate)
+            data.sort_index(inplace=True)
+
+            return data
+
+        dataFrames = []
+
+        for datasetName in self.categoryNames:
+            if not self.store.exists(datasetName):
                 raise BacktesterError("feature/data-not-found")
 
+            dataFrames.append(self.store.load(datasetName))
 
-    def loadFeatures(self, data: Optional[pd.DataFrame] = None, features: List[Feature] = None) -> pd.DataFrame:
+        if dataFrames:
+            mergedData = mergeAligned(dataFrames, policy=DataConfig.MERGE_ALIGNMENT)
 
+            # Save data
+            self.store.save(mergedData, self.mergedDataName)
+
+            self._checkColumns(list(mergedData.columns))
+
+            if self.columns is not None:
+                mergedData = mergedData[self.columns]
+
+            return mergedData.loc[self.startDate:self.endDate]
+
+        else:
+            raise BacktesterError("feature/data-not-found")
+
+    def _checkColumns(self, availableColumns: List[str]) -> None:
+        if self.columns is None:
+            return
+
+        missingColumns = [column for column in self.columns if column not in availableColumns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} do not exist in the dataset.")
+
+    def _getRequiredColumns(self, columns: Optional[List[str]], features: Optional[List[Feature]]) -> Optional[List[str]]:
+        """Union of the requested columns and of the columns read by the features, None to load all the columns."""
+        if columns is None and features is None:
+            return None
+
+        requiredColumns = list(columns or [])
+        requiredColumns += [column for column in FeatureGraph(features or []).requiredColumns if column not in requiredColumns]
+
+        return requiredColumns
+
+    def _getWarmUpStartDate(self, startDate: Union[date, datetime, str, None], features: Optional[List[Feature]]) -> Optional[pd.Timestamp]:
+        if startDate is None:
+            return None
+
+        lookback = FeatureGraph(features or []).lookback
+        return pd.Timestamp(startDate) - lookback * self.barInterval
+
+    def _isMergedDataStale(self, mergedDataPath: str) -> bool:
+        """The merged dataset is stale if a raw category was refreshed after it was built."""
+        mergedTime = os.path.getmtime(mergedDataPath)
+        paths = [self.store.findPath(name) for name in self.categoryNames]
+        return any(path is not None and os.path.getmtime(path) > mergedTime for path in paths)
+
+    def loadFeatures(self, data: Optional[pd.DataFrame] = None, features: List[Feature] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Compute the features on the data through a FeatureGraph.
+        Return only `columns` (features or dataset columns) if given, else the data with the features appended.
+        The features already computed on the same data are served by the feature store when it is enabled. The loaded
+        data is identified in the store by its version, other data by the hash of its content.
+        """
+        version = self.dataVersion if data is None else None
         if data is None:
             data = self.data
         
-        if features is None or []:
+        if not features:
             raise BacktesterError("feature/missing-features")
-        
-        resultData = data.copy()
 
-        for feature in features:
-            resultData = feature.transform(resultData)
+        store = getFeatureStore() if DataConfig.FEATURE_STORE_ENABLED else None
 
-        return resultData
+        return FeatureGraph(features, store=store).transform(data, columns=columns, version=version)
     
     def loadMarketData(self):
 
-        marketPriceFeatures = ["close", "open", "high", "low", "volume"]
-
-        if marketPriceFeatures not in self.data.columns:
-            raise BacktesterError("feature/missing-features")
+        missingColumns = [column for column in self.marketColumns if column not in self.data.columns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} do not exist in the dataset.")
         
-        return self.data[marketPriceFeatures]
\ No newline at end of file
+        return self.data[self.marketColumns]
\ No newline at end of file
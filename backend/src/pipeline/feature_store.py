@@ -0,0 +1,196 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from configs.data import DataConfig
+from configs.path import PathConfig
+from data.storage import DatasetStore
+from pipeline.features import Feature
+
+
+class FeatureStore:
+    """
+    Cache of computed feature columns, in memory and on disk.
+    An entry is addressed by the hash of the feature key (class and parameters), the keys of its dependencies and the
+    version of the dataset, so the same feature on the same data is never recomputed, in this process or the next
+    ones. The least recently used entries are dropped from memory beyond `memoryEntries` and from disk once the stored
+    files exceed `maxBytes`.
+    """
+
+    filePrefix: str = "feature_"
+
+    def __init__(
+            self,
+            directory: str = PathConfig.FEATURES_DIR,
+            maxBytes: int = DataConfig.FEATURE_STORE_MAX_BYTES,
+            memoryEntries: int = DataConfig.FEATURE_STORE_MEMORY_ENTRIES):
+        self.store = DatasetStore(directory=directory)
+        self.maxBytes = maxBytes
+        self.memoryEntries = memoryEntries
+        self.entries: "OrderedDict[str, Dict[str, pd.Series]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = { "memoryHits": 0, "diskHits": 0, "misses": 0, "evictions": 0 }
+
+        os.makedirs(directory, exist_ok=True)
+
+    def makeKey(self, feature: Feature, version: str, dependencyKeys: List[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(feature.key.encode())
+        for dependencyKey in dependencyKeys:
+            digest.update(dependencyKey.encode())
+        digest.update(version.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def fingerprint(data: pd.DataFrame, columns: List[str]) -> str:
+        """Version of data without a dataset version: the hash of the index and of the values of `columns`."""
+        return _fingerprint(data, columns)
+
+    def get(self, key: str) -> Optional[Dict[str, pd.Series]]:
+        """Cached columns of the entry, from memory first, then from disk."""
+        with self.lock:
+            columns = self.entries.get(key)
+            if columns is not None:
+                self.entries.move_to_end(key)
+                self.stats["memoryHits"] += 1
+                return columns
+
+        name = self._getName(key)
+        if not self.store.exists(name):
+            self._record("misses")
+            return None
+
+        try:
+            data = self.store.load(name)
+        except Exception:
+            self._remove(key)   # Corrupted or partially evicted entry
+            self._record("misses")
+            return None
+
+        os.utime(self.store.findPath(name))     # Mark as recently used
+        columns = _freeze({ column: data[column] for column in data.columns }, copy=False)
+        self._keepInMemory(key, columns)
+        self._record("diskHits")
+
+        return columns
+
+    def put(self, key: str, columns: Dict[str, pd.Series]) -> None:
+        # The columns of the caller stay writable, the store shares a read-only copy
+        self._keepInMemory(key, _freeze(columns, copy=True))
+
+        if columns:
+            self.store.save(pd.DataFrame(columns), self._getName(key))
+            self._evict()
+
+    def getStats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memoryEntries"] = len(self.entries)
+
+        lookups = stats["memoryHits"] + stats["diskHits"] + stats["misses"]
+        stats["hitRate"] = (stats["memoryHits"] + stats["diskHits"]) / lookups if lookups else 0.0
+        stats["sizeBytes"] = sum(size for _, size, _ in self._listEntries())
+        return stats
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+        for path, _, _ in self._listEntries():
+            os.remove(path)
+
+    def _keepInMemory(self, key: str, columns: Dict[str, pd.Series]) -> None:
+        with self.lock:
+            self.entries[key] = columns
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.memoryEntries:
+                self.entries.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Remove the least recently used files until the store fits into `maxBytes`."""
+        entries = self._listEntries()
+        totalBytes = sum(size for _, size, _ in entries)
+
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
+            self._record("evictions")
+
+    def _listEntries(self) -> list:
+        """(path, size, last access time) of every stored entry."""
+        entries = []
+
+        for name in os.listdir(self.store.directory):
+            if not name.startswith(self.filePrefix) or name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(f"{self.store.directory}/{name}")
+            except FileNotFoundError:
+                continue    # Evicted by another process
+            entries.append((f"{self.store.directory}/{name}", stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _remove(self, key: str) -> None:
+        path = self.store.findPath(self._getName(key))
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _record(self, stat: str) -> None:
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _getName(self, key: str) -> str:
+        return f"{self.filePrefix}{key}"
+
+
+_featureStore: Optional[FeatureStore] = None
+_featureStoreLock = threading.Lock()
+
+
+def getFeatureStore() -> FeatureStore:
+    """Feature store shared by the whole process."""
+    global _featureStore
+
+    with _featureStoreLock:
+        if _featureStore is None:
+            _featureStore = FeatureStore()
+        return _featureStore
+
+
+def _freeze(columns: Dict[str, pd.Series], copy: bool) -> Dict[str, pd.Series]:
+    """Make the arrays of the columns read-only, as they are shared by every caller. With `copy`, freeze copies of them."""
+    frozen = {}
+    for name, series in columns.items():
+        series = series.copy(deep=True) if copy else series
+        if hasattr(series.values, "flags"):
+            series.values.flags.writeable = False
+        frozen[name] = series
+    return frozen
+
+def _fingerprint(data: pd.DataFrame, columns: List[str]) -> str:
+    """Hash of the index and of the values of `columns`."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data.index.asi8 if isinstance(data.index, pd.DatetimeIndex) else pd.util.hash_pandas_object(data.index)).tobytes())
+
+    for column in columns:
+        values = data[column]
+        digest.update(column.encode())
+        if pd.api.types.is_numeric_dtype(values):
+            digest.update(np.ascontiguousarray(values.to_numpy(dtype=np.float64, na_value=np.nan)).tobytes())
+        else:
+            digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Mapping
+import pandas as pd
+
+from errors.base_exception import BacktesterError
+from pipeline.feature_graph import FeatureGraph
+from pipeline.features import Feature
+
+
+class FeatureStream:
+    """
+    Incremental computation of the features, one bar at a time, for live trading.
+    Every node of the feature graph keeps its own compact state, so a new bar costs O(1) or O(window) per feature
+    instead of recomputing the rolling windows over the whole history. The outputs are the same as the batch
+    `FeatureGraph.transform` on the same bars.
+    """
+
+    def __init__(self, features: List[Feature]):
+        self.graph = FeatureGraph(features)
+        self.states: Dict[str, Dict[str, Any]] = { node.key: node.createState() for node in self.graph.nodes }
+
+    def warmUp(self, data: pd.DataFrame) -> None:
+        """Feed the history needed by the features: the last `lookback` bars of the data, plus the current one."""
+        for _, bar in data.iloc[-(self.graph.lookback + 1):].iterrows():
+            self.update(bar)
+
+    def update(self, bar: Mapping[str, float]) -> Dict[str, float]:
+        """Compute the outputs of the requested features for a new bar holding the required columns."""
+        missingColumns = [column for column in self.graph.requiredColumns if column not in bar]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} are required to compute the features.")
+
+        values: Dict[str, float] = {}
+
+        for node in self.graph.nodes:
+            inputs = { column: float(bar[column]) for column in node.requiredColumns }
+            for dependency in node.dependencies:
+                inputs.update({ column: values[column] for column in dependency.outputs })
+
+            values.update(node.update(self.states[node.key], inputs))
+
+        return { column: values[column] for column in self.graph.outputs }
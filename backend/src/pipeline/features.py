@@ -1,10 +1,73 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+from collections import deque
+from typing import Any, Dict, List
 
 import pandas as pd
 
 class Feature(ABC):
-    """Abstract base class for feature."""
+    """
+    Abstract base class for feature.
+    A feature declares the dataset columns it reads, the features it depends on and the columns it outputs, so that a
+    FeatureGraph computes every shared intermediate once and only materializes the new columns.
+    Features are also computed incrementally, one bar at a time, with `createState` and `update` (see FeatureStream).
+    """
+
+    # Columns of the dataset read by the feature
+    requiredColumns: List[str] = []
+
+    @property
+    def lookback(self) -> int:
+        """Number of past bars needed before the first valid value of the feature."""
+        return 0
+
+    @property
+    def dependencies(self) -> List["Feature"]:
+        """Features whose outputs are read by this feature."""
+        return []
+
+    @property
+    def outputs(self) -> List[str]:
+        """Columns produced by the feature."""
+        return []
+
+    @property
+    def key(self) -> str:
+        """Identify the feature by its class and parameters. Features with the same key compute the same columns."""
+        params = ", ".join(f"{name}={value!r}" for name, value in sorted(self.getParams().items()))
+        return f"{type(self).__name__}({params})"
+
+    def getParams(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def split(self) -> List["Feature"]:
+        """Split the feature into independent features over groups of its columns, to compute them concurrently."""
+        return [self]
+
+    def compute(self, columns: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+        """
+        Compute the output columns from the required dataset columns and the outputs of the dependencies.
+        The default implementation falls back on `transform` for the features which only implement it.
+        """
+        data = self.transform(pd.DataFrame(columns))
+        return { name: data[name] for name in data.columns if name not in columns or name in self.outputs }
+
+    def createState(self) -> Dict[str, Any]:
+        """State carried from one bar to the next by `update`."""
+        return { "bars": deque(maxlen=self.lookback + 1) }
+
+    def update(self, state: Dict[str, Any], inputs: Dict[str, float]) -> Dict[str, float]:
+        """
+        Compute the outputs of a new bar from its inputs (the required columns and the outputs of the dependencies).
+        The default implementation recomputes the feature over the last `lookback` bars, in O(lookback). Features
+        override it with a compact state to update in O(1) or O(window).
+        """
+        state["bars"].append(inputs)
+        columns = pd.DataFrame(list(state["bars"]))
+        outputs = self.compute({ name: columns[name] for name in columns.columns })
+        return { name: float(series.iloc[-1]) for name, series in outputs.items() }
 
     def transform(self, data: pd.DataFrame) -> pd.DataFrame:
         """Transform the data into the features."""
-        pass
+        from pipeline.feature_graph import FeatureGraph
+
+        return FeatureGraph([self]).transform(data)
@@ -0,0 +1,178 @@
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from errors.base_exception import BacktesterError
+from pipeline.rolling import rollingMeanStd
+
+
+class Transform(str, Enum):
+    EMA = "ema"                             # Exponential moving average, span = horizon
+    RSI = "rsi"                             # Wilder's relative strength index, in [0, 100]
+    ROC = "roc"                             # Rate of change over the horizon
+    ZSCORE = "zscore"                       # Rolling z-score
+    PERCENTILE_RANK = "percentile_rank"     # Rolling percentile rank of the current value, in (0, 1]
+    BOLLINGER_PB = "bollinger_pb"           # Bollinger %B, bands at 2 rolling deviations
+
+
+class IndicatorEngine:
+    """
+    Apply a declared set of transforms, each at several horizons, to a whole block of columns at once.
+    Every transform runs over the contiguous (rows x columns) array of the block, never column by column, and writes
+    into one preallocated matrix whose columns are named `{column}_{transform}_{horizon}`.
+    Missing values are forward-filled first (the leading ones stay missing), as in the merged dataset.
+    """
+
+    bollingerWidth: float = 2.0
+    emaBlockSize: int = 64
+
+    def __init__(self, transforms: Dict[str, List[int]], dtype: str = "float64"):
+
+        invalidTransforms = [
+            name for name, horizons in transforms.items()
+            if name not in Transform._value2member_map_ or any(horizon < 1 for horizon in horizons)
+        ]
+        if invalidTransforms:
+            raise BacktesterError("feature/invalid-transform", details=f"{invalidTransforms} are not supported or have a horizon below 1.")
+
+        self.transforms: List[Tuple[Transform, int]] = [
+            (Transform(name), horizon) for name, horizons in transforms.items() for horizon in horizons
+        ]
+        self.dtype = np.dtype(dtype)
+
+    def getColumnNames(self, columns: List[str]) -> List[str]:
+        return [f"{column}_{transform.value}_{horizon}" for transform, horizon in self.transforms for column in columns]
+
+    def apply(self, data: pd.DataFrame, columns: Optional[List[str]] = None) -> Tuple[np.ndarray, List[str]]:
+        """Return the (rows x columns * transforms) matrix of the indicators and its column names."""
+        columns = list(data.columns) if columns is None else columns
+
+        missingColumns = [column for column in columns if column not in data.columns]
+        if missingColumns:
+            raise BacktesterError("feature/missing-columns", details=f"{missingColumns} do not exist in the dataset.")
+
+        block = data[columns].ffill().to_numpy(dtype=np.float64, na_value=np.nan)
+        width = block.shape[1]
+        result = np.empty((len(block), width * len(self.transforms)), dtype=self.dtype)
+
+        # The horizons of the rolling statistics and of the ranks are computed together
+        statisticHorizons = sorted({ horizon for transform, horizon in self.transforms if transform in (Transform.ZSCORE, Transform.BOLLINGER_PB) })
+        statistics = rollingMeanStd(block, statisticHorizons) if statisticHorizons else {}
+        rankHorizons = sorted({ horizon for transform, horizon in self.transforms if transform == Transform.PERCENTILE_RANK })
+        ranks = _percentileRanks(block, rankHorizons) if rankHorizons else {}
+
+        for position, (transform, horizon) in enumerate(self.transforms):
+            output = result[:, position * width:(position + 1) * width]
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if transform == Transform.EMA:
+                    output[:] = _ema(block, alpha=2 / (horizon + 1), blockSize=self.emaBlockSize)
+                elif transform == Transform.RSI:
+                    output[:] = _rsi(block, horizon, blockSize=self.emaBlockSize)
+                elif transform == Transform.ROC:
+                    output[:horizon] = np.nan
+                    output[horizon:] = block[horizon:] / block[:-horizon] - 1
+                elif transform == Transform.ZSCORE:
+                    mean, std = statistics[horizon]
+                    output[:] = (block - mean) / std
+                elif transform == Transform.PERCENTILE_RANK:
+                    output[:] = ranks[horizon]
+                else:
+                    mean, std = statistics[horizon]
+                    lower = mean - self.bollingerWidth * std
+                    output[:] = (block - lower) / (2 * self.bollingerWidth * std)
+
+        return result, self.getColumnNames(columns)
+
+    def applyFrame(self, data: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Same as `apply`, wrapped into a dataframe without copying the matrix."""
+        result, names = self.apply(data, columns)
+        return pd.DataFrame(result, index=data.index, columns=names, copy=False)
+
+
+def _ema(block: np.ndarray, alpha: float, blockSize: int) -> np.ndarray:
+    """
+    Recursive EMA (pandas `ewm(alpha, adjust=False)`) of every column, starting at the first value of each column.
+    Within a block of rows, the recursion is a product with the lower-triangular matrix of the decay weights, so the
+    rows are processed a block at a time and only the last value of each block is carried to the next one.
+    """
+    rows, columns = block.shape
+    decay = 1 - alpha
+    started = np.maximum.accumulate(~np.isnan(block), axis=0)
+
+    # Leading missing values take the first value of their column, the EMA then starts at that value
+    firstValues = block[np.argmax(started, axis=0), np.arange(columns)]
+    values = np.where(started, block, np.nan_to_num(firstValues))
+
+    blockSize = min(blockSize, max(rows, 1))
+    blocks = -(-rows // blockSize)
+    padded = np.zeros((blocks * blockSize, columns))
+    padded[:rows] = values
+    padded = padded.reshape(blocks, blockSize, columns)
+
+    lags = np.subtract.outer(np.arange(blockSize), np.arange(blockSize))
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carryWeights = decay ** np.arange(1, blockSize + 1)
+
+    partial = weights @ padded   # (blocks, blockSize, columns) EMAs of each block started from 0
+    previous = np.nan_to_num(firstValues)
+    for index in range(blocks):
+        partial[index] += carryWeights[:, None] * previous
+        previous = partial[index, -1]
+
+    result = partial.reshape(-1, columns)[:rows]
+    result[~started] = np.nan
+    return result
+
+
+def _rsi(block: np.ndarray, horizon: int, blockSize: int) -> np.ndarray:
+    """Wilder's RSI: smoothed gains over smoothed gains and losses, with `alpha = 1 / horizon`."""
+    changes = np.full(block.shape, np.nan)
+    changes[1:] = block[1:] - block[:-1]
+
+    gains = _ema(np.where(changes > 0, changes, np.where(np.isnan(changes), np.nan, 0.0)), 1 / horizon, blockSize)
+    losses = _ema(np.where(changes < 0, -changes, np.where(np.isnan(changes), np.nan, 0.0)), 1 / horizon, blockSize)
+
+    return 100 * gains / (gains + losses)
+
+
+def _percentileRanks(block: np.ndarray, horizons: List[int]) -> Dict[int, np.ndarray]:
+    """
+    Percentile rank (pandas `rolling(horizon).rank(pct=True)`) of the last value of every window, ties averaged, for
+    every horizon. The current value is compared with the value `lag` rows before for every lag up to the largest
+    horizon, each comparison over the whole block, and the ranks of a horizon are read once its lags are counted.
+    """
+    rows = len(block)
+    ranks = {}
+
+    score = np.zeros(block.shape, dtype=np.int32)     # Number of values below minus number of values above
+    compared = np.empty(block.shape, dtype=bool)
+
+    missing = np.zeros((rows + 1, block.shape[1]), dtype=np.int64)
+    np.cumsum(np.isnan(block), axis=0, out=missing[1:])
+
+    if 1 in horizons:
+        ranks[1] = _rankFromScore(score, missing, 1)    # The value alone in its window, before any lag is counted
+
+    for lag in range(1, max(horizons)):
+        if lag < rows:
+            np.greater(block[lag:], block[:-lag], out=compared[lag:])
+            score[lag:] += compared[lag:]
+            np.less(block[lag:], block[:-lag], out=compared[lag:])
+            score[lag:] -= compared[lag:]
+
+        if lag + 1 in horizons:
+            ranks[lag + 1] = _rankFromScore(score, missing, lag + 1)
+
+    return ranks
+
+
+def _rankFromScore(score: np.ndarray, missing: np.ndarray, horizon: int) -> np.ndarray:
+    """Average rank of the current value among the `horizon` values, as a fraction. Windows with a missing value are NaN."""
+    rank = (score + horizon + 1) / (2 * horizon)
+    rank[:horizon - 1] = np.nan
+
+    start = np.maximum(np.arange(1, len(score) + 1) - horizon, 0)
+    rank[(missing[1:] - missing[start]) > 0] = np.nan
+    return rank
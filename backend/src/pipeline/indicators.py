@@ -1,56 +1,280 @@
 
-from typing import List, Union
+from typing import Any, Dict, List, Union
+from collections import deque
 import numpy as np
 import pandas as pd
 
+from configs.data import DataConfig
 from pipeline.features import Feature
+from pipeline.indicator_engine import IndicatorEngine, Transform
 from errors.base_exception import BacktesterError
 
 
+class Returns(Feature):
+    """
+    Simple return of the close price. Shared by the features computed from returns.
+    """
+    requiredColumns = ["close"]
+
+    @property
+    def lookback(self) -> int:
+        return 1
+
+    @property
+    def outputs(self) -> List[str]:
+        return ["daily_return"]
+
+    def compute(self, columns: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+        return { "daily_return": columns["close"].pct_change() }
+
+    def createState(self) -> Dict[str, Any]:
+        return { "lastClose": np.nan }
+
+    def update(self, state: Dict[str, Any], inputs: Dict[str, float]) -> Dict[str, float]:
+        # Same as pct_change: a missing close is padded with the last known one
+        close = inputs["close"] if not np.isnan(inputs["close"]) else state["lastClose"]
+        dailyReturn = close / state["lastClose"] - 1
+        state["lastClose"] = close
+
+        return { "daily_return": dailyReturn }
+
+
 class AdjustedReturnRate(Feature):
     """
     Adjusted return rate: The net return in percentage.
     """
+    requiredColumns = ["close"]
+
     def __init__(self, tradeFees: float = 0.0006):
         self.tradeFees = tradeFees
 
-    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+    @property
+    def lookback(self) -> int:
+        return 1
+
+    @property
+    def dependencies(self) -> List[Feature]:
+        return [Returns()]
+
+    @property
+    def outputs(self) -> List[str]:
+        return ["daily_return", "log_return"]
+
+    def compute(self, columns: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
         """Calculate adjusted return rate based on close price."""
-        resultData = data.copy()
+        if "close" not in columns:
+            raise BacktesterError(
+                "feature/missing-columns",
+                details=f"'close' is required to compute 'adjusted_return_rate'")
+
+        return {
+            "daily_return": columns["daily_return"],
+            "log_return": np.log(columns["close"] / columns["close"].shift(1))
+            # "adjusted_return_rate": columns["daily_return"] - self.tradeFees
+        }
 
-        if "close" not in resultData.columns:
+    def createState(self) -> Dict[str, Any]:
+        return { "lastClose": np.nan }
+
+    def update(self, state: Dict[str, Any], inputs: Dict[str, float]) -> Dict[str, float]:
+        if "close" not in inputs:
             raise BacktesterError(
-                "feature/missing-columns", 
+                "feature/missing-columns",
                 details=f"'close' is required to compute 'adjusted_return_rate'")
-        
-        resultData["daily_return"] = resultData["close"].pct_change()
-        resultData["log_return"] = np.log(resultData["close"] / resultData["close"].shift(1))
-        # resultData["adjusted_return_rate"] = resultData["daily_return"] - self.tradeFees
 
-        return resultData
-    
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logReturn = np.log(inputs["close"] / state["lastClose"])
+        state["lastClose"] = inputs["close"]
+
+        return { "daily_return": inputs["daily_return"], "log_return": float(logReturn) }
+
 class Volatility(Feature):
     """Calculate volatility based on rolling window standard deviation."""
+    requiredColumns = ["close"]
+
     def __init__(self, windowSize: Union[List[int], int]):
         self.windowSize = windowSize
 
-    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
-        """Calculate volatility based on close price."""
-        resultData = data.copy()
+    @property
+    def lookback(self) -> int:
+        windows = [self.windowSize] if type(self.windowSize) == int else self.windowSize
+        return max(windows) + 1     # One bar for the first return
+
+    @property
+    def dependencies(self) -> List[Feature]:
+        return [Returns()]
 
-        if "close" not in resultData.columns:
+    @property
+    def outputs(self) -> List[str]:
+        if type(self.windowSize) == int:
+            return ["volatility", "log_volatility"]
+
+        return [name for window in self.windowSize for name in (f"volatility_{window}", f"log_volatility_{window}")]
+
+    def compute(self, columns: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+        """Calculate volatility based on close price."""
+        if "close" not in columns:
             raise BacktesterError(
-                "feature/missing-columns", 
+                "feature/missing-columns",
                 details=f"'close' is required to compute 'volatility'")
-        
-        returns = resultData["close"].pct_change()
+
+        returns = columns["daily_return"]
+        resultColumns = {}
 
         if type(self.windowSize) == int:
-            resultData["volatility"] = returns.rolling(window=self.windowSize).std()
-            resultData[f"log_volatility"] = np.log(resultData[f"volatility"])
+            resultColumns["volatility"] = returns.rolling(window=self.windowSize).std()
+            resultColumns["log_volatility"] = np.log(resultColumns["volatility"])
         else:
             for window in self.windowSize:
-                resultData[f"volatility_{window}"] = returns.rolling(window=window).std()
-                resultData[f"log_volatility_{window}"] = np.log(resultData[f"volatility_{window}"])
+                resultColumns[f"volatility_{window}"] = returns.rolling(window=window).std()
+                resultColumns[f"log_volatility_{window}"] = np.log(resultColumns[f"volatility_{window}"])
+
+        return resultColumns
+
+    def createState(self) -> Dict[str, Any]:
+        windows = [self.windowSize] if type(self.windowSize) == int else self.windowSize
+        return { "returns": deque(maxlen=max(windows)) }
+
+    def update(self, state: Dict[str, Any], inputs: Dict[str, float]) -> Dict[str, float]:
+        """
+        Deviation of the last returns of every window, in O(window). It is computed in two passes over the window while
+        pandas updates running sums in `compute`: the two agree to a relative 1e-9.
+        """
+        if "close" not in inputs:
+            raise BacktesterError(
+                "feature/missing-columns",
+                details=f"'close' is required to compute 'volatility'")
+
+        state["returns"].append(inputs["daily_return"])
+        returns = np.fromiter(state["returns"], dtype=np.float64, count=len(state["returns"]))
+        resultColumns = {}
+
+        for window in ([self.windowSize] if type(self.windowSize) == int else self.windowSize):
+            suffix = "" if type(self.windowSize) == int else f"_{window}"
+            values = returns[-window:]
+
+            if len(values) < window or np.isnan(values).any():
+                volatility = np.nan
+            elif values.min() == values.max():
+                volatility = 0.0    # As in batch, a window of identical values has no deviation
+            else:
+                volatility = float(np.std(values, ddof=1))
+
+            with np.errstate(divide="ignore"):
+                resultColumns[f"volatility{suffix}"] = volatility
+                resultColumns[f"log_volatility{suffix}"] = float(np.log(volatility))
+
+        return resultColumns
+
+class IndicatorSet(Feature):
+    """
+    Standard transforms (EMA, RSI, rate of change, z-score, percentile rank, Bollinger %B) of many columns at several
+    horizons, e.g. `IndicatorSet(["exchange_reserve", "mvrv"], { "ema": [24, 168], "rsi": [14] })`.
+    All the columns are transformed at once by the IndicatorEngine.
+    """
+
+    # Columns per group when the set is split to be computed concurrently
+    columnGroupSize: int = DataConfig.FEATURE_COLUMN_GROUP_SIZE
+
+    def __init__(self, columns: List[str], transforms: Dict[str, List[int]], dtype: str = "float64"):
+        self.columns = columns
+        self.transforms = transforms
+        self.dtype = dtype
+
+    @property
+    def requiredColumns(self) -> List[str]:
+        return self.columns
+
+    @property
+    def lookback(self) -> int:
+        return max([horizon for horizons in self.transforms.values() for horizon in horizons], default=0)
+
+    @property
+    def outputs(self) -> List[str]:
+        return IndicatorEngine(self.transforms, self.dtype).getColumnNames(self.columns)
+
+    def split(self) -> List[Feature]:
+        """Groups of a fixed number of columns, so the results do not depend on how many workers compute them."""
+        return [
+            IndicatorSet(self.columns[start:start + self.columnGroupSize], self.transforms, self.dtype)
+            for start in range(0, len(self.columns), self.columnGroupSize)
+        ]
+
+    def compute(self, columns: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+        data = pd.DataFrame({ column: columns[column] for column in self.columns })
+        result = IndicatorEngine(self.transforms, self.dtype).applyFrame(data)
+
+        return { column: result[column] for column in result.columns }
+
+    def createState(self) -> Dict[str, Any]:
+        engine = IndicatorEngine(self.transforms, self.dtype)
+        return {
+            "lastValues": np.full(len(self.columns), np.nan),
+            "bars": deque(maxlen=self.lookback + 1),
+            "emas": { horizon: np.full(len(self.columns), np.nan) for transform, horizon in engine.transforms if transform == Transform.EMA },
+            "gains": { horizon: np.full(len(self.columns), np.nan) for transform, horizon in engine.transforms if transform == Transform.RSI },
+            "losses": { horizon: np.full(len(self.columns), np.nan) for transform, horizon in engine.transforms if transform == Transform.RSI }
+        }
+
+    def update(self, state: Dict[str, Any], inputs: Dict[str, float]) -> Dict[str, float]:
+        """
+        Transforms of the new bar for all the columns at once: O(1) for the EMA, RSI and rate of change, O(horizon) for
+        the rolling statistics and ranks. As in `compute`, the missing values are forward-filled first.
+        """
+        engine = IndicatorEngine(self.transforms, self.dtype)
+
+        values = np.array([inputs[column] for column in self.columns], dtype=np.float64)
+        values = np.where(np.isnan(values), state["lastValues"], values)
+        changes = values - state["lastValues"]
+        state["lastValues"] = values
+
+        state["bars"].append(values)
+        bars = np.array(state["bars"])      # (bars x columns), the last `lookback + 1` bars
+        result = []
+
+        for transform, horizon in engine.transforms:
+            window = bars[-horizon:] if len(bars) >= horizon else None
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if transform == Transform.EMA:
+                    state["emas"][horizon] = _updateEma(state["emas"][horizon], values, 2 / (horizon + 1))
+                    output = state["emas"][horizon]
+                elif transform == Transform.RSI:
+                    gains = np.where(changes > 0, changes, np.where(np.isnan(changes), np.nan, 0.0))
+                    losses = np.where(changes < 0, -changes, np.where(np.isnan(changes), np.nan, 0.0))
+                    state["gains"][horizon] = _updateEma(state["gains"][horizon], gains, 1 / horizon)
+                    state["losses"][horizon] = _updateEma(state["losses"][horizon], losses, 1 / horizon)
+                    output = 100 * state["gains"][horizon] / (state["gains"][horizon] + state["losses"][horizon])
+                elif transform == Transform.ROC:
+                    output = values / bars[-horizon - 1] - 1 if len(bars) > horizon else np.full(len(values), np.nan)
+                elif window is None:
+                    output = np.full(len(values), np.nan)
+                elif transform == Transform.PERCENTILE_RANK:
+                    score = (values > window[:-1]).sum(axis=0) - (values < window[:-1]).sum(axis=0)
+                    output = np.where(np.isnan(window).any(axis=0), np.nan, (score + horizon + 1) / (2 * horizon))
+                else:
+                    mean, std = _windowMeanStd(window, values)
+                    if transform == Transform.ZSCORE:
+                        output = (values - mean) / std
+                    else:
+                        lower = mean - engine.bollingerWidth * std
+                        output = (values - lower) / (2 * engine.bollingerWidth * std)
+
+            result.append(output.astype(engine.dtype))
+
+        names = engine.getColumnNames(self.columns)
+        return dict(zip(names, np.concatenate(result).tolist()))
+
+
+def _updateEma(ema: np.ndarray, values: np.ndarray, alpha: float) -> np.ndarray:
+    """One step of the recursive EMA, started at the first value of every column."""
+    return np.where(np.isnan(ema), values, alpha * values + (1 - alpha) * ema)
+
+def _windowMeanStd(window: np.ndarray, values: np.ndarray):
+    """Mean and deviation of every column of the window, with the conventions of `rollingMeanStd`."""
+    mean = window.mean(axis=0)
+    std = window.std(axis=0, ddof=1) if len(window) > 1 else np.full(len(values), np.nan)
 
-        return resultData
\ No newline at end of file
+    # Windows of identical values have the value itself as mean and no deviation
+    constant = (window.min(axis=0) == window.max(axis=0)) & (len(window) > 1)
+    return np.where(constant, values, mean), np.where(constant, 0.0, std)
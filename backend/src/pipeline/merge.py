@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from enum import Enum
+from typing import List
+
+from errors.base_exception import BacktesterError
+
+
+class AlignmentPolicy(str, Enum):
+    """
+    How the rows of series observed at different frequencies are aligned on the merged index.
+    ASOF: a value of a series coarser than the merged rows is stamped at the start of its period and only known once
+          the period has closed, so it is available from the first row at its timestamp plus its observation interval
+          (a daily value from 00:00 of the next day), until the next value of its column and at most for that
+          interval. The series at the frequency of the rows are kept at their timestamps, gaps are left as they are.
+    EXACT: the values are kept at their timestamps only, like an outer join.
+    """
+    ASOF = "asof"
+    EXACT = "exact"
+
+
+def mergeAligned(frames: List[pd.DataFrame], policy: str = AlignmentPolicy.ASOF) -> pd.DataFrame:
+    """
+    Merge dataframes indexed by datetime in a single pass.
+    The datetimes are parsed once per frame, the indexes are unioned once and the numeric columns are written straight
+    into one preallocated block, instead of copying the growing result at every pairwise merge.
+    """
+    if policy not in AlignmentPolicy._value2member_map_:
+        raise BacktesterError("data/invalid-alignment-policy")
+
+    frames = [_prepareFrame(frame) for frame in frames]
+
+    columns = [column for frame in frames for column in frame.columns]
+    duplicatedColumns = pd.Index(columns)[pd.Index(columns).duplicated()].unique().tolist()
+    if duplicatedColumns:
+        raise BacktesterError("feature/duplicate-columns", details=f"{duplicatedColumns} exist in more than one dataset.")
+
+    index = _unionIndex([frame.index for frame in frames])
+
+    numericColumns = [column for frame in frames for column in frame.columns if pd.api.types.is_numeric_dtype(frame[column])]
+    block = np.full((len(index), len(numericColumns)), np.nan)
+    otherColumns = {}
+
+    position = 0
+    for frame in frames:
+        rows = index.get_indexer(frame.index)
+        numeric = [column for column in frame.columns if pd.api.types.is_numeric_dtype(frame[column])]
+
+        block[rows, position:position + len(numeric)] = frame[numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        position += len(numeric)
+
+        for column in frame.columns.difference(numeric, sort=False):
+            values = np.full(len(index), None, dtype=object)
+            values[rows] = frame[column].to_numpy()
+            otherColumns[column] = values
+
+    if AlignmentPolicy(policy) == AlignmentPolicy.ASOF:
+        _forwardFillAsOf(block, index.asi8)
+
+    data = pd.DataFrame(block, index=index, columns=numericColumns, copy=False)
+    if otherColumns:
+        for column, values in otherColumns.items():
+            data[column] = values
+        data = data[columns]
+
+    return data
+
+
+def _prepareFrame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Datetime index (in ns) parsed once, sorted and without duplicated timestamps (the last row is kept)."""
+    if not isinstance(frame.index, pd.DatetimeIndex):
+        frame = frame.set_axis(pd.to_datetime(frame.index, format="ISO8601"), axis=0)
+
+    if frame.index.unit != "ns":
+        frame = frame.set_axis(frame.index.as_unit("ns"), axis=0)
+
+    if not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index()
+
+    if frame.index.has_duplicates:
+        frame = frame[~frame.index.duplicated(keep="last")]
+
+    return frame
+
+
+def _unionIndex(indexes: List[pd.DatetimeIndex]) -> pd.DatetimeIndex:
+    values = np.unique(np.concatenate([index.asi8 for index in indexes]))
+    index = pd.DatetimeIndex(values.view("datetime64[ns]"), name="datetime")
+    return index if indexes[0].tz is None else index.tz_localize("UTC").tz_convert(indexes[0].tz)
+
+
+def _forwardFillAsOf(block: np.ndarray, times: np.ndarray) -> None:
+    """
+    Delay every column of `block` coarser than the rows by its observation interval (the median spacing between its
+    observations), then forward-fill it in place with its last value, as long as it is younger than that interval.
+    """
+    positions = np.arange(len(times))
+    rowInterval = np.median(np.diff(times)) if len(times) > 1 else 0
+
+    for column in range(block.shape[1]):
+        values = block[:, column]
+        observed = ~np.isnan(values)
+
+        if observed.all():
+            continue
+
+        observedTimes = times[observed]
+        if len(observedTimes) < 2:
+            continue
+
+        interval = np.median(np.diff(observedTimes))
+
+        if interval > rowInterval:
+            # Move every value to the first row after the end of its period, the latest value wins on a shared row
+            availableRows = np.searchsorted(times, observedTimes + interval, side="left")
+            available = (availableRows < len(times)) & np.append(availableRows[1:] != availableRows[:-1], True)
+            observedValues = values[observed]
+            values[:] = np.nan
+            values[availableRows[available]] = observedValues[available]
+            observed = ~np.isnan(values)
+
+        lastObserved = np.maximum.accumulate(np.where(observed, positions, -1))
+        fill = ~observed & (lastObserved >= 0)
+        fill[fill] = (times[fill] - times[lastObserved[fill]]) < interval
+
+        values[fill] = values[lastObserved[fill]]
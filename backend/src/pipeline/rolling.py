@@ -0,0 +1,153 @@
+from typing import Dict, List, Optional, Tuple
+import warnings
+import numpy as np
+import pandas as pd
+
+
+def rollingMeanStd(
+        values: np.ndarray,
+        windows: List[int],
+        minPeriods: Optional[int] = None,
+        ddof: int = 1) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Rolling mean and standard deviation of every column of `values` (rows x columns) for every window.
+    Each window is computed for all the columns at once from prefix sums of the values and of their squares, instead
+    of a rolling pass per column and statistic. The observation counts and runs of identical values are shared by all
+    the windows.
+    Same conventions as `DataFrame.rolling(window, min_periods).mean()/.std(ddof)`: NaNs are skipped, windows with
+    fewer than `minPeriods` (default: the window) observations are NaN and windows of identical values have a std of
+    exactly 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    isVector = values.ndim == 1
+    if isVector:
+        values = values[:, None]
+
+    rows = len(values)
+    runs, lastValues = _sameValueRuns(values)
+    moments = _BlockMoments(values, max(windows, default=1))
+
+    results = {}
+
+    for window in windows:
+        minObservations = window if minPeriods is None else minPeriods
+        nobs, mean, variance = moments.get(window, ddof)
+        nobs, mean, variance = nobs[:rows], mean[:rows], variance[:rows]
+
+        # Windows of identical values, as pandas, return the value itself and a zero deviation
+        constant = (nobs > 0) & (runs >= nobs)
+        mean[constant] = lastValues[constant]
+        variance[constant] = 0.0
+
+        mean[(nobs < minObservations) | (nobs == 0)] = np.nan
+        std = np.sqrt(variance)
+        std[(nobs < minObservations) | (nobs <= ddof)] = np.nan
+
+        results[window] = (mean[:, 0], std[:, 0]) if isVector else (mean, std)
+
+    return results
+
+
+def rollingZScore(data: pd.DataFrame, window: int, minPeriods: Optional[int] = None) -> pd.DataFrame:
+    """Rolling z-score of every column, a zero deviation is replaced by 1."""
+    mean, std = rollingMeanStd(data.to_numpy(dtype=np.float64, na_value=np.nan), [window], minPeriods=minPeriods)[window]
+    std[std == 0] = 1
+
+    return pd.DataFrame((data.to_numpy(dtype=np.float64, na_value=np.nan) - mean) / std, index=data.index, columns=data.columns)
+
+
+class _BlockMoments:
+    """
+    Prefix counts, sums and sums of squares of the values, from which the moments of any window up to `maxWindow`
+    are two differences away.
+    The rows are split into blocks and the prefix sums restart at every block, over the block and the `maxWindow`
+    rows before it, centered on the local mean. They stay of the order of the local deviations, so the differences
+    are accurate whatever the length of the series or the trend of its level.
+    """
+
+    blockSize: int = 4096
+
+    def __init__(self, values: np.ndarray, maxWindow: int):
+        rows, columns = values.shape
+        self.maxWindow = maxWindow
+        self.blockSize = max(self.blockSize, maxWindow)
+        blocks = max(-(-rows // self.blockSize), 1)
+
+        padded = np.full((maxWindow + blocks * self.blockSize, columns), np.nan)
+        padded[maxWindow:maxWindow + rows] = values
+
+        # (blocks, maxWindow + blockSize, columns): every block preceded by the rows of its first windows
+        segments = np.lib.stride_tricks.sliding_window_view(padded, maxWindow + self.blockSize, axis=0)[::self.blockSize]
+        segments = np.ascontiguousarray(segments.transpose(0, 2, 1))
+        self.isComplete = not np.isnan(values).any()
+
+        if self.isComplete:
+            # Only the padding is missing: the counts are known and the padding does not contribute to the sums
+            self.center = segments[:, maxWindow:maxWindow + 1]
+            centered = np.nan_to_num(segments - self.center, copy=False)
+            self.counts = None
+        else:
+            observed = ~np.isnan(segments)
+            with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)     # Blocks without observation
+                self.center = np.nan_to_num(np.nanmean(segments, axis=1, keepdims=True))
+            centered = np.where(observed, segments - self.center, 0.0)
+            self.counts = self._prefixSum(observed.astype(np.int64))
+
+        self.sums = self._prefixSum(centered)
+        self.squares = self._prefixSum(np.square(centered, out=centered))
+
+    def get(self, window: int, ddof: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Number of observations, mean and variance of the windows ending at every row (padded to whole blocks)."""
+        # The window ending at row t of a block covers the segment rows (maxWindow + t - window, maxWindow + t]
+        end = slice(self.maxWindow + 1, self.maxWindow + 1 + self.blockSize)
+        start = slice(self.maxWindow + 1 - window, self.maxWindow + 1 - window + self.blockSize)
+
+        columns = self.sums.shape[2]
+        if self.isComplete:
+            nobs = np.minimum(np.arange(1, self.sums.shape[0] * self.blockSize + 1), window)[:, None]
+            nobs = np.broadcast_to(nobs, (len(nobs), columns))
+        else:
+            nobs = (self.counts[:, end] - self.counts[:, start]).reshape(-1, columns)
+        windowSums = (self.sums[:, end] - self.sums[:, start]).reshape(-1, columns)
+        windowSquares = (self.squares[:, end] - self.squares[:, start]).reshape(-1, columns)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = windowSums / nobs
+            variance = np.maximum((windowSquares - windowSums * mean) / (nobs - ddof), 0.0)
+
+        mean += np.repeat(self.center[:, 0], self.blockSize, axis=0)
+        return nobs, mean, variance
+
+    @staticmethod
+    def _prefixSum(values: np.ndarray) -> np.ndarray:
+        """Cumulative sum along the rows of every block, with a leading row of zeros."""
+        result = np.zeros((values.shape[0], values.shape[1] + 1, values.shape[2]), dtype=values.dtype)
+        np.cumsum(values, axis=1, out=result[:, 1:])
+        return result
+
+
+def _sameValueRuns(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every row and column, the number of consecutive identical observations ending at the last observation so
+    far (NaNs are skipped), and that last observed value.
+    """
+    rows, columns = values.shape
+    observed = ~np.isnan(values)
+    positions = np.arange(rows)[:, None]
+
+    if observed.all():
+        changes = np.vstack([np.ones((1, columns), dtype=bool), values[1:] != values[:-1]])
+        return positions + 1 - np.maximum.accumulate(np.where(changes, positions, 0), axis=0), values
+
+    counts = np.cumsum(observed, axis=0)
+    lastObserved = np.maximum.accumulate(np.where(observed, positions, -1), axis=0)
+    lastValues = np.take_along_axis(values, np.maximum(lastObserved, 0), axis=0)
+    lastValues[lastObserved < 0] = np.nan
+
+    # An observation starts a new run if it differs from the previous observation of its column
+    previousValues = np.vstack([np.full((1, columns), np.nan), lastValues[:-1]])
+    changes = observed & (values != previousValues)
+    runStarts = np.maximum.accumulate(np.where(changes, counts - 1, 0), axis=0)
+
+    return counts - runStarts, lastValues
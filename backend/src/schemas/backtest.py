@@ -1,9 +1,11 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel, ValidationInfo, field_validator
 from enum import Enum
 from datetime import date, datetime, timedelta
 
 from errors.base_exception import BacktesterError
+from schemas.position import Positions
+from schemas.trade import TradePortfolio
 
 class RuntimeMode(str, Enum):
     BACKTEST = "backtest"
@@ -28,6 +30,11 @@ class BacktestRequestModel(BaseModel):
     forwardStartDate: Union[date, datetime, None] = None
     forwardEndDate: Union[date, datetime, None] = None
     allowPermutation: bool = False
+    permutations: Optional[int] = None          # Number of permuted price paths, BacktestConfig.PERMUTATIONS by default
+    permutationMetric: Optional[str] = None     # Metric tested, BacktestConfig.PERMUTATION_METRIC by default
+    walkForwardMode: Optional[str] = None       # 'rolling' or 'expanding', BacktestConfig.WALK_FORWARD_MODE by default
+    allowBootstrap: bool = True
+    bootstrapResamples: Optional[int] = None    # Number of resampled return series, BacktestConfig.BOOTSTRAP_RESAMPLES by default
     assets: Optional[List[str]] = ["btc"]
     runtimeMode: Optional[str] = RuntimeMode.BACKTEST
     entryExitMode: Optional[str] = None
@@ -48,21 +55,21 @@ class BacktestRequestModel(BaseModel):
 
     @field_validator("runtimeMode")
     def checkRuntimeMode(cls, v) -> str:
-        if v is not None and v not in RuntimeMode:
+        if v is not None and v not in RuntimeMode._value2member_map_:
             raise BacktesterError("backtest/invalid-runtime-mode")
         
         return v
     
     @field_validator("entryExitMode")
     def checkEntryExitLogic(cls, v) -> Optional[str]:
-        if v is not None and v not in EntryExitStrategy:
+        if v is not None and v not in EntryExitStrategy._value2member_map_:
             raise BacktesterError("backtest/invalid-entry-exit-logic")
         
         return v
     
     @field_validator("positionSizingMode")
     def checkPositionSizingModel(cls, v) -> Optional[str]:
-        if v is not None and v not in PositionSizingMode:
+        if v is not None and v not in PositionSizingMode._value2member_map_:
             raise BacktesterError("backtest/invalid-position-sizing-model")
         
         return v
@@ -74,5 +81,96 @@ class BacktestRequestModel(BaseModel):
         
         return v
 
+class PerformanceMetricsModel(BaseModel):
+    # None when the metric has no finite value (e.g. a Sharpe ratio without any return)
+    totalReturn: Optional[float] = None
+    annualizedReturn: Optional[float] = None
+    volatility: Optional[float] = None
+    sharpeRatio: Optional[float] = None
+    sortinoRatio: Optional[float] = None
+    calmarRatio: Optional[float] = None
+    maxDrawdown: Optional[float] = None
+    maxDrawdownDuration: Optional[float] = None     # Bars
+    winRate: Optional[float] = None
+    profitFactor: Optional[float] = None
+    turnover: Optional[float] = None                # Value traded over the equity, summed over the bars
+    exposure: Optional[float] = None                # Average value of the position over the equity
+
+class PermutationTestModel(BaseModel):
+    metric: str
+    method: str
+    permutations: int
+    observed: Optional[float] = None            # Metric on the real prices
+    pValue: Optional[float] = None              # Fraction of the permutations doing at least as well
+    distribution: List[Optional[float]] = []    # Metric on every permuted price path
+
+class ConfidenceIntervalModel(BaseModel):
+    estimate: Optional[float] = None    # Metric of the backtest
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+
+class BootstrapModel(BaseModel):
+    method: str
+    resamples: int
+    blockSize: int
+    confidenceLevel: float
+    intervals: Dict[str, ConfidenceIntervalModel] = {}     # Per metric
+
+class WalkForwardFoldModel(BaseModel):
+    number: int
+    trainStart: datetime
+    trainEnd: datetime
+    testStart: datetime
+    testEnd: datetime
+    totalReturn: float
+    cached: bool = False        # Whether the fold models were loaded instead of trained
+
+class WalkForwardModel(BaseModel):
+    mode: str
+    initialCapital: float
+    finalEquity: float
+    totalReturn: float
+    totalCommission: float = 0.0
+    numberOfTrades: int = 0
+    folds: List[WalkForwardFoldModel] = []
+    equityCurve: List[Tuple[str, float]] = []   # Out-of-sample equity of every bar of the test windows
+
 class BacktestResponseModel(BaseModel):
-    backtestResult: float = 1.0
\ No newline at end of file
+    backtestResult: float = 1.0     # Final equity over the initial capital
+    initialCapital: Optional[float] = None
+    finalEquity: Optional[float] = None
+    totalReturn: Optional[float] = None
+    totalCommission: float = 0.0
+    numberOfTrades: int = 0
+    metrics: Optional[PerformanceMetricsModel] = None
+    portfolio: Optional[TradePortfolio] = None
+    bootstrap: Optional[BootstrapModel] = None
+    permutationTest: Optional[PermutationTestModel] = None
+    forwardTest: Optional[WalkForwardModel] = None
+
+class SweepRequestModel(BacktestRequestModel):
+    # Values of every swept parameter, e.g. {"stopLoss": [0.02, 0.05, None], "strategyName": [...]}
+    grid: Dict[str, List[Any]]
+    metric: str = "sharpeRatio"     # Metric ranking the runs
+    top: Optional[int] = None       # Number of best runs returned, all by default
+
+class SweepResponseModel(BaseModel):
+    metric: str
+    runs: int = 0
+    columns: List[str] = []
+    rows: List[List[Any]] = []      # One row per run, from the best to the worst
+
+class PortfolioRequestModel(BacktestRequestModel):
+    weights: Optional[Dict[str, float]] = None  # Target weight of every asset, equal weights by default
+    rebalancePeriod: Optional[int] = None       # Bars between two rebalances, BacktestConfig.PORTFOLIO_REBALANCE_PERIOD by default
+
+class PortfolioResponseModel(BaseModel):
+    assets: List[str]
+    initialCapital: float
+    finalEquity: float
+    totalReturn: float
+    totalCommission: float = 0.0
+    totalTurnover: float = 0.0      # Sum of the weight changes of all the rebalances
+    averageExposure: float = 0.0    # Average value of the positions over the equity
+    numberOfRebalances: int = 0
+    positions: Positions = Positions()
@@ -1,10 +1,10 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Union, List, Dict, Any, Optional
 from datetime import date, datetime
 from enum import Enum
 from uuid import UUID, uuid4
 
-from backend.src.errors.base_exception import BacktesterError
+from errors.base_exception import BacktesterError
 
 class OrderType(str, Enum):
     MARKET = "market"
@@ -24,7 +24,7 @@ class OrderStatus(str, Enum):
     CANCELLED = "cancelled"
 
 class Order(BaseModel):
-    id: UUID = uuid4()
+    id: UUID = Field(default_factory=uuid4)
     timestamp: Union[date, datetime]
     asset: str
     orderType: OrderType
@@ -6,7 +6,7 @@ from schemas.position import Position, Positions
 class TradePortfolio(BaseModel):
     initialCapital: float = None
     finalEquity: float = None
-    equityCurve: Tuple[str, float] = ()
-    drawdownCurve: Tuple[str, float] = ()
+    equityCurve: List[Tuple[str, float]] = []      # Equity of every bar
+    drawdownCurve: List[Tuple[str, float]] = []    # Fraction of the equity below its running peak at every bar
     positions: Positions = Positions()
 
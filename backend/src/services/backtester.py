@@ -1,26 +1,187 @@
+import asyncio
 from typing import Dict, List, Optional, Union, Any
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
 
+from configs.backtest import BacktestConfig
+from engine.permutation import runPermutationTest
+from engine.portfolio import PortfolioBacktester, loadPriceMatrix
+from engine.sweep import SweepTask, expandGrid, rankResults, runSweep, toRows
+from engine.vectorized import VectorizedBacktester
+from engine.walk_forward import WalkForwardResult, getFolds, runWalkForward
+from errors.base_exception import BacktesterError
+from metrics.bootstrap import runBootstrap
 from pipeline.feature_loader import FeatureLoader
 from strategies.position_sizer import BasePositionSizer, FixedProportionPositionSizer, HMMPositionSizer
 from strategies.strategy import BaseStrategy
-from schemas.backtest import BacktestRequestModel, BacktestResponseModel, PositionSizingMode
+from schemas.backtest import (
+    BacktestRequestModel,
+    BacktestResponseModel,
+    PortfolioRequestModel,
+    PortfolioResponseModel,
+    PositionSizingMode,
+    SweepRequestModel,
+    SweepResponseModel
+)
 
 
 class BacktesterService:
     """Backtester engine"""
 
+    # Bars of the volatility of the HMM position sizer
+    regimeLookBackPeriod: int = 30
+
     def __init__(self):
         pass
 
     async def run(self, settings: BacktestRequestModel) -> BacktestResponseModel:
-        
+        """
+        Backtest of the request, with its bootstrap, permutation and walk-forward tests. These are CPU-bound and run in
+        a worker thread, so the event loop keeps serving the other requests meanwhile.
+        """
+        return await asyncio.to_thread(self._run, settings)
+
+    def _run(self, settings: BacktestRequestModel) -> BacktestResponseModel:
+
         self.initializeBacktesterSettings(settings)
 
+        marketData = self.featureLoader.loadMarketData().loc[self.startDate:self.endDate]
+        prices = marketData["close"].ffill().dropna()
+
+        signals = self.strategy.generateSignals()
+        fractions = self.positionSizeModel.getPositionFractions(prices.index)
+
+        arrays = self.backtester.getArrays(prices, signals, fractions, marketData=marketData)
+        result = self.backtester.run(**arrays, index=prices.index)
+        response = result.toResponseModel()
+
+        if self.allowBootstrap:
+            bootstrap = runBootstrap(
+                result.equity, result.initialCapital,
+                resamples=settings.bootstrapResamples,
+                workers=BacktestConfig.BOOTSTRAP_WORKERS)
+            response.bootstrap = bootstrap.toResponseModel()
+
+        if self.allowPermutation:
+            permutationTest = runPermutationTest(
+                self.backtester, arrays,
+                metric=settings.permutationMetric,
+                permutations=settings.permutations,
+                workers=BacktestConfig.PERMUTATION_WORKERS)
+            response.permutationTest = permutationTest.toResponseModel()
+
         if self.allowForwardTest:
-            pass
+            response.forwardTest = self.runForwardTest(settings).toResponseModel()
+
+        return response
+
+    def runForwardTest(self, settings: BacktestRequestModel) -> WalkForwardResult:
+        """
+        Walk-forward test from the forward start date to the forward end date (see `runWalkForward`). The HMM position
+        sizer and a strategy with model data (see `BaseStrategy.getModelData`) are refitted on every fold. The
+        expanding train windows start on the start date, the rolling ones can start before it.
+        """
+        mode = settings.walkForwardMode or BacktestConfig.WALK_FORWARD_MODE
+        marketData = self.featureLoader.loadMarketData().loc[:self.forwardEndDate]
+        prices = marketData["close"].ffill().dropna()
+        folds = getFolds(prices.index, self.forwardStartDate, self.forwardEndDate, trainStart=self.startDate, mode=mode)
+
+        signalFeatures, signalLabels = self.strategy.getModelData() or (None, None)
+        if isinstance(self.positionSizeModel, HMMPositionSizer):
+            regimeFeatures, fractions = self.positionSizeModel.df, 0.05
+        else:
+            regimeFeatures, fractions = None, self.positionSizeModel.getPositionFractions(prices.index)
+
+        return runWalkForward(
+            self.backtester, prices, self.strategy.generateSignals(), fractions, folds,
+            marketData=marketData,
+            regimeFeatures=regimeFeatures,
+            signalFeatures=signalFeatures,
+            signalLabels=signalLabels,
+            labelHorizon=self.strategy.getLabelHorizon(),
+            mode=mode,
+            workers=BacktestConfig.WALK_FORWARD_WORKERS)
+
+    async def sweep(self, settings: SweepRequestModel) -> SweepResponseModel:
+        """
+        Run a backtest for every combination of the parameter grid, and rank the runs by `settings.metric`.
+        The data is loaded once. The signals and position fractions are computed once per combination of the group
+        parameters (strategy, position sizing, entry exit logic), whose runs over the scalar parameters (position size,
+        stop-loss, take-profit, commission rate) are simulated as one vectorized batch, a process per group.
+        The sweep runs in a worker thread, like `run`.
+        """
+        return await asyncio.to_thread(self._sweep, settings)
+
+    def _sweep(self, settings: SweepRequestModel) -> SweepResponseModel:
+        groups, scalars = expandGrid(settings.grid, defaults=settings.model_dump())
+
+        # The swept values go through the validators of the request, as if every group was requested on its own
+        try:
+            groupSettings = [SweepRequestModel.model_validate({ **settings.model_dump(), **group }) for group in groups]
+        except ValidationError as validationErr:
+            raise BacktesterError("backtest/invalid-sweep-parameter", details=str(validationErr))
+
+        featureLoader = self.createFeatureLoader(settings, positionSizingModes=[groupSetting.positionSizingMode for groupSetting in groupSettings])
+
+        marketData = featureLoader.loadMarketData().loc[settings.startDate:settings.endDate]
+        prices = marketData["close"].ffill().dropna()
+
+        tasks = []
+        for group, groupSetting in zip(groups, groupSettings):
+            self.initializeBacktesterSettings(groupSetting, featureLoader=featureLoader)
+            signals = self.strategy.generateSignals()
 
+            if isinstance(self.positionSizeModel, FixedProportionPositionSizer):
+                # The fixed position size is a scalar parameter of the batch, which caps the fractions
+                fractions, groupScalars = 1.0, scalars
+            else:
+                # As in `run`, the fractions of the position sizing model are not capped by the position size
+                fractions = self.positionSizeModel.getPositionFractions(prices.index)
+                groupScalars = { **scalars, "maxPositionSize": np.full_like(scalars["maxPositionSize"], np.nan) }
 
-    def initializeBacktesterSettings(self, settings: BacktestRequestModel):
+            arrays = self.backtester.getArrays(prices, signals, fractions, marketData=marketData)
+            tasks.append(SweepTask(group, self.backtester, arrays, groupScalars))
+
+        table = rankResults(runSweep(tasks, workers=BacktestConfig.SWEEP_WORKERS), settings.metric, settings.top)
+
+        return SweepResponseModel(
+            metric=settings.metric,
+            runs=len(groups) * len(scalars["stopLoss"]),
+            columns=list(table.columns),
+            rows=toRows(table)
+        )
+
+    async def runPortfolio(self, settings: PortfolioRequestModel) -> PortfolioResponseModel:
+        """
+        Multi-asset backtest of the close prices of `settings.assets`. The strategy can set the weights of every bar
+        (see `BaseStrategy.generateWeights`) when `settings.strategyName` names a registered strategy, else the portfolio
+        holds the weights of the request, equal by default. The backtest runs in a worker thread, like `run`.
+        """
+        return await asyncio.to_thread(self._runPortfolio, settings)
+
+    def _runPortfolio(self, settings: PortfolioRequestModel) -> PortfolioResponseModel:
+        assets = list(dict.fromkeys(settings.assets or []))
+        if not assets:
+            raise BacktesterError("backtest/invalid-portfolio-weights", details="The portfolio needs at least one asset.")
+
+        prices = loadPriceMatrix(assets, startDate=settings.startDate, endDate=settings.endDate)
+
+        weights = None
+        if settings.strategyName in { strategy.__name__ for strategy in BaseStrategy.__subclasses__() }:
+            weights = self.initializeStrategy(strategyName=settings.strategyName).generateWeights(prices)
+
+        if weights is None:
+            weights = settings.weights if settings.weights is not None else { asset: 1 / len(assets) for asset in assets }
+
+        backtester = PortfolioBacktester(
+            initialCapital=settings.initialCapital,
+            commissionRate=settings.commissionRate,
+            rebalancePeriod=settings.rebalancePeriod if settings.rebalancePeriod is not None else BacktestConfig.PORTFOLIO_REBALANCE_PERIOD)
+
+        return backtester.runFrame(prices, weights).toResponseModel()
+
+    def initializeBacktesterSettings(self, settings: BacktestRequestModel, featureLoader: Optional[FeatureLoader] = None):
         self.mode = settings.runtimeMode
         self.strategyName = settings.strategyName
         self.startDate = settings.startDate
@@ -29,10 +190,17 @@ class BacktesterService:
         self.forwardStartDate = settings.forwardStartDate
         self.forwardEndDate = settings.forwardEndDate
         self.allowPermutation = settings.allowPermutation
+        self.allowBootstrap = settings.allowBootstrap
         self.entryExitLogic = settings.entryExitMode
         self.positionSizingMode = settings.positionSizingMode
+        self.backtester = VectorizedBacktester(
+            initialCapital=settings.initialCapital,
+            commissionRate=settings.commissionRate,
+            minCommission=settings.minCommission,
+            stopLoss=settings.stopLoss,
+            takeProfit=settings.takeProfit)
 
-        self.featureLoader = FeatureLoader(backtestDate=self.endDate)
+        self.featureLoader = featureLoader if featureLoader is not None else self.createFeatureLoader(settings)
         self.strategy: Optional[BaseStrategy] = None
         self.positionSizeModel: Optional[BasePositionSizer] = None
 
@@ -42,22 +210,52 @@ class BacktesterService:
             positionSizeMode=self.positionSizingMode, 
             proportion=settings.maxPositionSize)
         
+    def createFeatureLoader(self, settings: BacktestRequestModel, positionSizingModes: Optional[List[str]] = None) -> FeatureLoader:
+        """
+        Feature loader reading from storage only the market data and the inputs of the HMM position sizer, up to the
+        last simulated date. The rows before the start date are only skipped with fixed position sizes and no
+        walk-forward test: the HMM position sizer is fitted on the whole history before the end date, and the rolling
+        train windows of a walk-forward test can start before the start date.
+        `positionSizingModes` are those of the groups of a sweep, the mode of the request by default.
+        """
+        positionSizingModes = positionSizingModes or [settings.positionSizingMode]
+        isRegimeSized = any(mode == PositionSizingMode.AUTO for mode in positionSizingModes)
+        isWindowed = not isRegimeSized and not settings.allowForwardTest
+
+        endDates = [settings.endDate] + ([settings.forwardEndDate] if settings.allowForwardTest and settings.forwardEndDate is not None else [])
+
+        return FeatureLoader(
+            backtestDate=settings.endDate,
+            columns=FeatureLoader.marketColumns,
+            startDate=settings.startDate if isWindowed else None,
+            endDate=max(endDates, key=pd.Timestamp),
+            features=HMMPositionSizer.getFeatures(lookBackPeriod=self.regimeLookBackPeriod) if isRegimeSized else None)
+
     def initializeStrategy(self, strategyName: str) -> BaseStrategy:
-        pass
-        
+        """Instantiate the strategy class named `strategyName` and load its data."""
+        strategies = { strategy.__name__: strategy for strategy in BaseStrategy.__subclasses__() }
+
+        if strategyName not in strategies:
+            raise BacktesterError("backtest/invalid-strategy", details=f"Available strategies: {list(strategies)}.")
+
+        self.strategy = strategies[strategyName]()
+        self.strategy.initializeStrategy()
+
+        return self.strategy
+
 
     def initializePositionSizingModel(self, positionSizeMode: PositionSizingMode, proportion: Optional[float] = None) -> BasePositionSizer:
 
         if positionSizeMode == PositionSizingMode.FIXED:
-            self.positionSizeModel = FixedProportionPositionSizer(proportion=proportion)
+            self.positionSizeModel = FixedProportionPositionSizer(proportion=proportion if proportion is not None else 1.0)
 
         elif positionSizeMode == PositionSizingMode.AUTO:
             self.positionSizeModel = HMMPositionSizer(
                 backtestDate=self.endDate, 
                 loader=self.featureLoader,
-                lookBackPeriod=30)
+                lookBackPeriod=self.regimeLookBackPeriod)
         
         else:
-            raise BacktesterService("backtest/invalid-position-sizing-model")
+            raise BacktesterError("backtest/invalid-position-sizing-model")
         
         return self.positionSizeModel
\ No newline at end of file
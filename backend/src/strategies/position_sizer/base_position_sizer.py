@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import pandas as pd
 
 class BasePositionSizer(ABC):
     """Base class for position sizing strategies."""
@@ -6,4 +7,8 @@ class BasePositionSizer(ABC):
     @abstractmethod
     def calculatePositionSize(self, availableCash: float) -> float:
         """Calculate the position size in cash amount."""
-        pass
\ No newline at end of file
+        pass
+
+    def getPositionFractions(self, index: pd.Index) -> pd.Series:
+        """Fraction of the available cash invested by an order at every bar of the index, for the vectorized backtest."""
+        return pd.Series(self.calculatePositionSize(availableCash=1.0), index=index, dtype=float)
@@ -4,13 +4,39 @@ import pandas as pd
 
 from algorithms.algorithm import Algorithm
 from algorithms.hmm import HMMRegimeModel
-from configs.path import PathConfig
 from errors.base_exception import BacktesterError
 from pipeline.feature_loader import FeatureLoader
 from pipeline.indicators import AdjustedReturnRate, Volatility
 from pipeline.features import Feature
 from strategies.position_sizer.base_position_sizer import BasePositionSizer
 
+def getRegimeFractions(regimes: np.ndarray) -> np.ndarray:
+    """Position fraction of every predicted regime."""
+    regimes = np.asarray(regimes)
+    return np.select(
+        [regimes == 3, regimes == 4, regimes == 2, regimes == 1],
+        [0.8, 0.6, 0.4, 0.2],
+        default=0.05)
+
+
+def rankRegimes(regimes: np.ndarray, trainRegimes: np.ndarray, trainReturns: np.ndarray) -> np.ndarray:
+    """
+    Regimes renumbered by the mean return of their train bars, 0 for the lowest. A fit numbers its states in an
+    arbitrary order, so the ranks give the same regime the same number (and fraction) from a fit to the next. A state
+    without train bars ranks lowest.
+    """
+    regimes, trainRegimes = np.asarray(regimes, dtype=np.int64), np.asarray(trainRegimes, dtype=np.int64)
+    states = max(regimes.max(initial=-1), trainRegimes.max(initial=-1)) + 1
+    counts = np.bincount(trainRegimes, minlength=states)
+    sums = np.bincount(trainRegimes, weights=np.asarray(trainReturns, dtype=np.float64), minlength=states)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, -np.inf)
+    ranks = np.empty(states, dtype=np.int64)
+    ranks[np.argsort(means, kind="stable")] = np.arange(states)
+    return ranks[regimes]
+
+
 class HMMPositionSizer(BasePositionSizer):
     """Automatic adjust position sizing based on market regime."""
     
@@ -58,17 +84,33 @@ class HMMPositionSizer(BasePositionSizer):
 
         return availableCash * positionSize
 
-    def _initializeData(self):
-        self.features = [
-            AdjustedReturnRate(tradeFees=self.tradeFees),
-            Volatility(windowSize=self.lookBackPeriod)
+    def getPositionFractions(self, index: pd.Index) -> pd.Series:
+        """Position fraction of the regime predicted at every bar, predicted once for the whole index."""
+        if not self.model.isFitted:
+            raise BacktesterError("algorithm/model-not-fitted")
+        
+        if self.df is None:
+            raise BacktesterError("strategy/data-not-loaded")
+        
+        fractions = getRegimeFractions(self.model.predict(self.df))
+
+        # The bars without features yet (warm-up) take the most defensive fraction
+        return pd.Series(fractions, index=self.df.index).reindex(index, method="ffill").fillna(0.05)
+
+    @staticmethod
+    def getFeatures(lookBackPeriod: int = 30, tradeFees: float = 0.0006) -> List[Feature]:
+        """Features of the regimes, whose input columns and warm-up the feature loader has to read."""
+        return [
+            AdjustedReturnRate(tradeFees=tradeFees),
+            Volatility(windowSize=lookBackPeriod)
         ]
-        self.df = self.loader.loadFeatures(features=self.features)[self.selectedFeatures]
+
+    def _initializeData(self):
+        self.features = self.getFeatures(self.lookBackPeriod, self.tradeFees)
+        self.df = self.loader.loadFeatures(features=self.features, columns=self.selectedFeatures)
         print("Index", self.df.index)
         self.df.dropna(inplace=True)
 
-        self.df.to_csv(f"{PathConfig.FEATURES_DIR}/hmm_features.csv")
-
     def _trainModel(self):
         if self.df is None:
             raise BacktesterError("strategy/data-not-loaded")
@@ -1,6 +1,6 @@
 import pandas as pd
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Tuple
 
 from algorithms.algorithm import Algorithm
 
@@ -17,3 +17,24 @@ class BaseStrategy(ABC):
     def generateSignals(self) -> pd.Series:
         """Generate the trade signals (BUY = 1, SELL = -1, HOLD = 0)"""
         pass
+
+    def getModelData(self) -> Optional[Tuple[pd.DataFrame, pd.Series]]:
+        """
+        Features and labels (SELL = 0, HOLD = 1, BUY = 2) of a strategy trading the predictions of an XGBModel, which
+        the walk-forward test refits on every fold. None for a strategy without a model.
+        """
+        return None
+
+    def getLabelHorizon(self) -> Optional[int]:
+        """
+        Number of bars after a bar that its label of `getModelData` looks at (e.g. 24 for the return of the next day),
+        purged from the end of every train window of the walk-forward test. None for BacktestConfig's default.
+        """
+        return None
+
+    def generateWeights(self, prices: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Target weights of every asset (columns of `prices`) at every bar of a multi-asset backtest, NaN to keep the
+        previous ones. None to hold the weights of the request.
+        """
+        return None
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules import each other from the source root (e.g. `from configs.data import DataConfig`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from configs.data import DataConfig
+from configs.path import PathConfig
+from data.storage import DatasetStore
+from pipeline.merge import AlignmentPolicy
+
+# Libraries of the HMM and XGBoost models, imported by the walk-forward engine and the backtester service
+MODEL_LIBRARIES = ["hmmlearn", "sklearn", "xgboost", "joblib"]
+
+
+def importModelModule(name: str):
+    """Import a module depending on the model libraries, or skip the test without them."""
+    for library in MODEL_LIBRARIES:
+        pytest.importorskip(library)
+    return __import__(name, fromlist=["_"])
+
+
+@pytest.fixture
+def backtesterService():
+    return importModelModule("services.backtester").BacktesterService()
+
+
+@pytest.fixture
+def rawDataDir(tmp_path, monkeypatch):
+    """A merged dataset of two years of hourly bars with market and on-chain columns, stored in the configured format."""
+    index = pd.date_range("2024-01-01", "2025-12-31 23:00", freq="h", name="datetime")
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+    merged = pd.DataFrame({
+        "close": close, "open": close, "high": close * 1.01, "low": close * 0.99, "volume": rng.random(len(index)),
+        "exchange_reserve": rng.random(len(index)), "mvrv": rng.random(len(index))
+    }, index=index)
+
+    mergedDataName = "cryptoquant_full_data" if DataConfig.MERGE_ALIGNMENT == AlignmentPolicy.EXACT else "cryptoquant_full_data_asof"
+    DatasetStore(directory=str(tmp_path)).save(merged, mergedDataName)
+    monkeypatch.setattr(PathConfig, "RAW_DATA_DIR", str(tmp_path))
+    return merged
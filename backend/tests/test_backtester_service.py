@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize("method", ["run", "sweep", "runPortfolio"])
+def test_requests_run_off_the_event_loop(backtesterService, monkeypatch, method):
+    finished = []
+
+    def simulate(settings):
+        time.sleep(0.5)     # CPU-bound work holding its thread
+        finished.append(time.monotonic())
+        return settings
+
+    monkeypatch.setattr(backtesterService, f"_{method}", simulate)
+
+    async def run():
+        ticks = []
+
+        async def tick():
+            for _ in range(10):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.02)
+
+        result, _ = await asyncio.gather(getattr(backtesterService, method)("settings"), tick())
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+
+    assert result == "settings"
+    # The loop kept ticking while the request was running, instead of waiting for it
+    assert sum(at < finished[0] for at in ticks) >= 5
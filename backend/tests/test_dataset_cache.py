@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.dataset_cache import DatasetCache
+
+
+def makeData(rows: int = 100) -> pd.DataFrame:
+    return pd.DataFrame({ "close": np.arange(rows, dtype=float) }, index=pd.date_range("2025-01-01", periods=rows, freq="h"))
+
+
+@pytest.fixture
+def loads():
+    """Counter of the loader calls of every key."""
+    return {}
+
+
+def getData(cache: DatasetCache, key: str, loads: dict, rows: int = 100) -> pd.DataFrame:
+    def loader():
+        loads[key] = loads.get(key, 0) + 1
+        return makeData(rows)
+
+    return cache.get(key, paths=[], loader=loader)
+
+
+def test_least_recently_used_datasets_are_evicted_past_max_entries(loads):
+    cache = DatasetCache(maxEntries=2)
+
+    getData(cache, "a", loads)
+    getData(cache, "b", loads)
+    getData(cache, "a", loads)      # "b" is now the least recently used
+    getData(cache, "c", loads)
+
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.getStats()["evictions"] == 1
+
+    getData(cache, "b", loads)
+    assert loads == { "a": 1, "b": 2, "c": 1 }
+    assert list(cache.entries) == ["c", "b"]
+
+
+def test_datasets_are_evicted_past_max_bytes_but_the_last_one_is_kept(loads):
+    entryBytes = int(makeData().memory_usage(index=True, deep=True).sum())
+    cache = DatasetCache(maxEntries=100, maxBytes=int(2.5 * entryBytes))
+
+    for key in ["a", "b", "c"]:
+        getData(cache, key, loads)
+
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.getStats()["memoryBytes"] == 2 * entryBytes
+
+    # A dataset larger than the budget replaces every other one, and is still served from the cache
+    getData(cache, "large", loads, rows=1000)
+    getData(cache, "large", loads, rows=1000)
+    assert list(cache.entries) == ["large"]
+    assert loads["large"] == 1
+    assert cache.getStats()["evictions"] == 3
@@ -0,0 +1,77 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.decoder import decodeRows
+from pipeline.feature_graph import FeatureGraph
+from pipeline.indicator_engine import IndicatorEngine
+from pipeline.indicators import Volatility
+
+
+def decodeRowsWithDataFrame(rows: List[Dict[str, Any]], timeKey: str = "datetime", prefix: Optional[str] = None) -> pd.DataFrame:
+    """The row-oriented decoding replaced by `decodeRows`, as DataLoader used to do it."""
+    data = pd.DataFrame(rows).drop(columns="start_time")
+    data.rename(columns={ timeKey: "datetime" }, inplace=True)
+    data["datetime"] = pd.to_datetime(data["datetime"])
+    data.set_index("datetime", inplace=True)
+
+    if prefix:
+        data.rename(columns={ name: f"{prefix}{name}" for name in data.columns }, inplace=True)
+    return data
+
+
+def makeRows(values: Dict[str, List[Any]], timeKey: str = "datetime") -> List[Dict[str, Any]]:
+    """Rows of hourly (or daily, keyed by 'date') timestamps holding `values`. A value of `...` leaves the key out."""
+    rows = []
+    for position in range(len(next(iter(values.values())))):
+        timestamp = pd.Timestamp("2025-01-01") + position * (pd.Timedelta(days=1) if timeKey == "date" else pd.Timedelta(hours=1))
+        row = { "start_time": int(timestamp.timestamp() * 1000), timeKey: str(timestamp.date()) if timeKey == "date" else str(timestamp) }
+        row.update({ column: columnValues[position] for column, columnValues in values.items() if columnValues[position] is not ... })
+        rows.append(row)
+    return rows
+
+
+COLUMNS = {
+    "floats": [1.5, 2.0, 3.25],
+    "integers": [1, 2, 3],
+    "largeIntegers": [2 ** 62, 1, 2],
+    "integersAndFloats": [1, 2.5, 3],
+    "integersAndNone": [1, None, 3],
+    "booleans": [True, False, True],
+    "booleansAndNone": [True, None, False],
+    "strings": ["a", "b", None],
+    "numericStrings": ["1", "2", "3"],
+    "none": [None, None, None],
+    "missingKeys": [..., 2.0, ...]
+}
+
+
+@pytest.mark.parametrize("column", COLUMNS)
+def test_dtypes_match_the_dataframe_decoding(column):
+    rows = makeRows({ "value": COLUMNS[column] })
+    pd.testing.assert_frame_equal(decodeRows(rows), decodeRowsWithDataFrame(rows))
+
+
+def test_daily_rows_with_a_prefix_match_the_dataframe_decoding():
+    rows = makeRows({ "inflow": [1, 2, 3], "outflow": [0.5, None, 1.5], "reserve": [..., 7, 8] }, timeKey="date")
+
+    decoded = decodeRows(rows, timeKey="date", prefix="miner_")
+
+    pd.testing.assert_frame_equal(decoded, decodeRowsWithDataFrame(rows, timeKey="date", prefix="miner_"))
+    assert list(decoded.columns) == ["miner_inflow", "miner_outflow", "miner_reserve"]
+    assert decoded.index.name == "datetime" and decoded.index.dtype == "datetime64[ns]"
+
+
+def test_integer_columns_give_the_features_of_their_float_values():
+    rng = np.random.default_rng(0)
+    decoded = decodeRows(makeRows({ "close": rng.integers(90, 110, 300).tolist(), "transactions": rng.integers(0, 1000, 300).tolist() }))
+    asFloats = decoded.astype(np.float64)
+    assert (decoded.dtypes == np.int64).all()
+
+    engine = IndicatorEngine({ "ema": [12], "rsi": [14], "roc": [1], "zscore": [24], "percentile_rank": [24], "bollinger_pb": [20] })
+    pd.testing.assert_frame_equal(engine.applyFrame(decoded), engine.applyFrame(asFloats))
+
+    graph = FeatureGraph([Volatility(windowSize=[5, 24])], workers=1)
+    pd.testing.assert_frame_equal(graph.transform(decoded, columns=graph.outputs), graph.transform(asFloats, columns=graph.outputs))
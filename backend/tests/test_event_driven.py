@@ -0,0 +1,98 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.event_driven import BUY, SELL, EventDrivenBacktester
+from schemas.order import OrderStatus, OrderType
+
+
+def makeBars(bars: List[Tuple[float, float, float, float]]) -> pd.DataFrame:
+    """Hourly bars from (open, high, low, close) tuples."""
+    return pd.DataFrame(bars, columns=["open", "high", "low", "close"], index=pd.date_range("2025-01-01", periods=len(bars), freq="h"))
+
+
+def runScript(engine: EventDrivenBacktester, data: pd.DataFrame, script: dict):
+    """Run the engine, calling `script[bar](engine)` after the bars listed in the script."""
+    return engine.run(data, lambda engine, bar: script[bar](engine) if bar in script else None)
+
+
+def test_oco_group_cancels_the_other_orders_of_the_group_only():
+    data = makeBars([(100, 100, 100, 100), (100, 101, 94, 96), (96, 97, 95, 96)])
+
+    def submit(engine):
+        engine.submitOrder(BUY, 1, OrderType.LIMIT, price=95, ocoGroup=7)
+        engine.submitOrder(BUY, 1, OrderType.STOP, stopPrice=105, ocoGroup=7)
+        engine.submitOrder(BUY, 1, OrderType.LIMIT, price=50)
+
+    result = runScript(EventDrivenBacktester(commissionRate=0.0), data, { 0: submit })
+    limit, stop, ungrouped = result.orders
+
+    assert limit.status == OrderStatus.COMPLETED and limit.fillBar == 1 and limit.fillPrice == 95
+    assert stop.status == OrderStatus.CANCELLED
+    assert ungrouped.status == OrderStatus.PENDING
+
+
+def test_protective_orders_leave_the_resting_orders_of_the_strategy():
+    data = makeBars([(100, 100, 100, 100), (100, 102, 99, 101), (99, 101, 94, 96), (96, 97, 95, 96)])
+
+    def submit(engine):
+        engine.submitOrder(BUY, 1)
+        engine.submitOrder(BUY, 1, OrderType.LIMIT, price=50)                  # Ungrouped
+        engine.submitOrder(BUY, 1, OrderType.LIMIT, price=60, ocoGroup=3)      # Group of the id of the next order
+
+    engine = EventDrivenBacktester(commissionRate=0.0, stopLoss=0.05, takeProfit=0.1)
+    result = runScript(engine, data, { 0: submit })
+    entry, ungrouped, grouped, stop, target = result.orders
+
+    assert entry.fillPrice == 100
+    assert ungrouped.status == grouped.status == OrderStatus.PENDING
+    assert [order.isProtective for order in result.orders] == [False, False, False, True, True]
+
+    # The stop is hit on the second bar, which cancels the target but none of the orders of the strategy
+    assert (stop.orderType, stop.stopPrice, stop.fillBar, stop.fillPrice) == (OrderType.STOP, 95, 2, 95)
+    assert (target.orderType, target.price, target.status) == (OrderType.TAKE_PROFIT, pytest.approx(110), OrderStatus.CANCELLED)
+    assert result.position.quantity == 0
+    assert result.cash[-1] == pytest.approx(100000 - 5)
+
+
+def test_protective_orders_follow_a_partial_exit():
+    data = makeBars([(100, 100, 100, 100), (100, 101, 99, 100), (100, 101, 99, 100), (100, 101, 99, 100)])
+
+    engine = EventDrivenBacktester(commissionRate=0.0, stopLoss=0.1, takeProfit=0.2)
+    result = runScript(engine, data, { 0: lambda engine: engine.submitOrder(BUY, 2), 1: lambda engine: engine.submitOrder(SELL, 0.5) })
+
+    working = [order for order in result.orders if order.status == OrderStatus.PENDING]
+    assert result.position.quantity == pytest.approx(1.5)
+    assert all(order.isProtective for order in working)
+    assert sorted((order.orderType.value, order.quantity) for order in working) == [(OrderType.STOP.value, 1.5), (OrderType.TAKE_PROFIT.value, 1.5)]
+    assert sorted(order.stopPrice or order.price for order in working) == pytest.approx([90, 120])
+    # The first pair was replaced, not left working next to the new one
+    assert sum(order.cancelReason == "Position changed." for order in result.orders) == 2
+
+
+def test_protective_orders_cover_a_buy_partially_filled_by_a_gap():
+    # The order is sized at 100 but the next open gaps to 125: the cash only affords part of the quantity
+    data = makeBars([(100, 100, 100, 100), (125, 126, 124, 125), (125, 126, 124, 125)])
+
+    engine = EventDrivenBacktester(initialCapital=1000.0, commissionRate=0.0, stopLoss=0.05)
+    result = runScript(engine, data, { 0: lambda engine: engine.buyFraction(1.0) })
+    entry, stop = result.orders
+
+    assert entry.quantity == pytest.approx(8) and entry.fillPrice == 125
+    assert result.cash[-1] == pytest.approx(0)
+    assert stop.isProtective and stop.quantity == pytest.approx(8) and stop.stopPrice == pytest.approx(118.75)
+    assert stop.status == OrderStatus.PENDING
+
+
+def test_stop_is_matched_before_the_target_on_a_bar_reaching_both():
+    data = makeBars([(100, 100, 100, 100), (100, 100, 100, 100), (100, 111, 94, 100)])
+
+    engine = EventDrivenBacktester(commissionRate=0.0, stopLoss=0.05, takeProfit=0.1)
+    result = runScript(engine, data, { 0: lambda engine: engine.submitOrder(BUY, 1) })
+    _, stop, target = result.orders
+
+    assert stop.status == OrderStatus.COMPLETED and stop.fillPrice == 95
+    assert target.status == OrderStatus.CANCELLED
+    assert np.isclose(result.finalEquity, 100000 - 5)
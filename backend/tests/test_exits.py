@@ -0,0 +1,146 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from engine.exits import ExitReason, resolveExits
+from engine.vectorized import VectorizedBacktester
+
+
+def resolveExitsPerBar(entryBars, exitBars, entryPrices, exitPrices, openPrices, highPrices, lowPrices, stopLoss, takeProfit, tieBreak):
+    """Reference: scan the bars of every trade one by one until a level is reached."""
+    resultBars, resultPrices, resultReasons = [], [], []
+
+    for entryBar, exitBar, entryPrice, exitPrice in zip(entryBars, exitBars, entryPrices, exitPrices):
+        stop = entryPrice * (1 - stopLoss) if stopLoss is not None else -np.inf
+        target = entryPrice * (1 + takeProfit) if takeProfit is not None else np.inf
+        result = (exitBar, exitPrice, ExitReason.SIGNAL if exitBar >= 0 else ExitReason.OPEN)
+
+        for bar in range(entryBar + 1, (exitBar if exitBar >= 0 else len(highPrices) - 1) + 1):
+            isStop, isTarget = lowPrices[bar] <= stop, highPrices[bar] >= target
+            if isStop and isTarget:
+                if openPrices[bar] <= stop or openPrices[bar] >= target:
+                    isStop = openPrices[bar] <= stop
+                elif tieBreak == "stop-first":
+                    isStop = True
+                elif tieBreak == "target-first":
+                    isStop = False
+                else:
+                    isStop = openPrices[bar] - stop <= target - openPrices[bar]
+
+            if isStop:
+                result = (bar, min(openPrices[bar], stop), ExitReason.STOP_LOSS)
+                break
+            if isTarget:
+                result = (bar, max(openPrices[bar], target), ExitReason.TAKE_PROFIT)
+                break
+
+        for values, value in zip((resultBars, resultPrices, resultReasons), result):
+            values.append(value)
+
+    return np.array(resultBars), np.array(resultPrices), np.array(resultReasons)
+
+
+def makeBars(bars: List[Tuple[float, float, float]]):
+    """Open, high and low arrays from (open, high, low) tuples."""
+    return tuple(np.array(column, dtype=float) for column in zip(*bars))
+
+
+def test_bar_reaching_both_levels_is_resolved_by_the_tie_break():
+    openPrices, highPrices, lowPrices = makeBars([(100, 100, 100), (100, 111, 94), (100, 100, 100)])
+    trade = dict(entryBars=np.array([0]), exitBars=np.array([-1]), entryPrices=np.array([100.0]), exitPrices=np.array([np.nan]))
+
+    for tieBreak, reason, price in [("stop-first", ExitReason.STOP_LOSS, 95), ("target-first", ExitReason.TAKE_PROFIT, 110)]:
+        exitBars, exitPrices, exitReasons = resolveExits(**trade, openPrices=openPrices, highPrices=highPrices, lowPrices=lowPrices, stopLoss=0.05, takeProfit=0.1, tieBreak=tieBreak)
+        assert (exitBars[0], exitPrices[0], exitReasons[0]) == (1, pytest.approx(price), reason)
+
+    # The open is 6 above the stop and 9 below the target
+    exitBars, exitPrices, exitReasons = resolveExits(**trade, openPrices=openPrices + [0, 1, 0], highPrices=highPrices, lowPrices=lowPrices, stopLoss=0.05, takeProfit=0.1, tieBreak="nearest-to-open")
+    assert (exitReasons[0], exitPrices[0]) == (ExitReason.STOP_LOSS, pytest.approx(95))
+
+
+def test_gap_through_a_level_fills_at_the_open_whatever_the_tie_break():
+    # The second bar opens at 90, below the stop at 95, and still reaches the target
+    openPrices, highPrices, lowPrices = makeBars([(100, 100, 100), (90, 111, 89), (100, 100, 100)])
+
+    exitBars, exitPrices, exitReasons = resolveExits(
+        np.array([0]), np.array([2]), np.array([100.0]), np.array([100.0]), openPrices, highPrices, lowPrices,
+        stopLoss=0.05, takeProfit=0.1, tieBreak="target-first")
+
+    assert (exitBars[0], exitPrices[0], exitReasons[0]) == (1, 90, ExitReason.STOP_LOSS)
+
+    # And a gap above the target fills at the open, above it
+    exitBars, exitPrices, exitReasons = resolveExits(
+        np.array([0]), np.array([2]), np.array([100.0]), np.array([100.0]), *makeBars([(100, 100, 100), (115, 116, 112), (100, 100, 100)]),
+        stopLoss=0.05, takeProfit=0.1)
+
+    assert (exitBars[0], exitPrices[0], exitReasons[0]) == (1, 115, ExitReason.TAKE_PROFIT)
+
+
+def test_trade_entered_after_an_exit_uses_its_own_levels_from_its_entry():
+    # The first trade is stopped on bar 2. The second one enters on bar 4 at 80: the lows of bars 2-4 are below the
+    # stop of the first trade, not below its own stop at 76, and it exits on its signal
+    openPrices, highPrices, lowPrices = makeBars([(100, 100, 100), (100, 101, 99), (96, 97, 90), (85, 86, 79), (80, 81, 78), (80, 82, 77), (80, 80, 80)])
+
+    exitBars, exitPrices, exitReasons = resolveExits(
+        np.array([0, 4]), np.array([3, 6]), np.array([100.0, 80.0]), np.array([85.0, 80.0]), openPrices, highPrices, lowPrices,
+        stopLoss=0.05, takeProfit=0.1)
+
+    assert exitBars.tolist() == [2, 6]
+    assert exitPrices.tolist() == pytest.approx([95, 80])
+    assert exitReasons.tolist() == [ExitReason.STOP_LOSS, ExitReason.SIGNAL]
+
+
+def makeRandomTrades(bars: int = 400, seed: int = 0):
+    """Random OHLC bars with gaps at the opens, and back to back trades, the last one still open."""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    openPrices = np.concatenate([[100.0], closes[:-1]]) * np.exp(rng.normal(0, 0.01, bars))
+    highPrices = np.maximum(openPrices, closes) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    lowPrices = np.minimum(openPrices, closes) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+
+    fills = np.sort(rng.choice(np.arange(1, bars), 41, replace=False))
+    entryBars, exitBars = fills[0::2], np.append(fills[1::2], -1)
+    exitPrices = np.where(exitBars >= 0, closes[exitBars], np.nan)
+    return dict(entryBars=entryBars, exitBars=exitBars, entryPrices=closes[entryBars], exitPrices=exitPrices), (openPrices, highPrices, lowPrices)
+
+
+@pytest.mark.parametrize("tieBreak", ["stop-first", "target-first", "nearest-to-open"])
+@pytest.mark.parametrize("stopLoss, takeProfit", [(0.02, 0.03), (0.01, 0.01), (0.03, None), (None, 0.02), (None, None)])
+def test_exits_match_the_per_bar_reference(tieBreak, stopLoss, takeProfit):
+    trades, (openPrices, highPrices, lowPrices) = makeRandomTrades()
+
+    result = resolveExits(**trades, openPrices=openPrices, highPrices=highPrices, lowPrices=lowPrices, stopLoss=stopLoss, takeProfit=takeProfit, tieBreak=tieBreak)
+    expected = resolveExitsPerBar(*trades.values(), openPrices, highPrices, lowPrices, stopLoss, takeProfit, tieBreak)
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_allclose(result[1], expected[1], rtol=1e-12)
+    np.testing.assert_array_equal(result[2], expected[2])
+
+
+def test_several_levels_at_once_match_every_level_alone():
+    trades, (openPrices, highPrices, lowPrices) = makeRandomTrades(seed=1)
+    stopLoss = np.array([0.005, 0.01, 0.02, np.nan, 0.05])
+    takeProfit = np.array([0.01, np.nan, 0.02, 0.03, 0.05])
+
+    exitBars, exitPrices, exitReasons = resolveExits(**trades, openPrices=openPrices, highPrices=highPrices, lowPrices=lowPrices, stopLoss=stopLoss, takeProfit=takeProfit, tieBreak="stop-first")
+
+    for run, (stop, target) in enumerate(zip(stopLoss, takeProfit)):
+        expected = resolveExitsPerBar(*trades.values(), openPrices, highPrices, lowPrices, None if np.isnan(stop) else stop, None if np.isnan(target) else target, "stop-first")
+        np.testing.assert_array_equal(exitBars[run], expected[0])
+        np.testing.assert_allclose(exitPrices[run], expected[1], rtol=1e-12)
+        np.testing.assert_array_equal(exitReasons[run], expected[2])
+
+
+def test_backtest_stays_flat_after_a_stop_until_the_next_entry_signal():
+    prices = np.array([100, 100, 100, 100, 100, 100, 100, 104, 104, 104.0])
+    lowPrices = prices.copy()
+    lowPrices[2] = 94      # Stops the first trade, entered on bar 1 at 100
+    signals = np.array([1, 0, 0, 1, 0, -1, 1, 0, -1, 0.0])     # The BUY of bar 3 is within the first trade
+
+    result = VectorizedBacktester(commissionRate=0.0, stopLoss=0.05).run(prices, signals, openPrices=prices, highPrices=prices, lowPrices=lowPrices)
+
+    assert result.entryBars.tolist() == [1, 7]
+    assert result.exitBars.tolist() == [2, 9]
+    assert result.exitReasons.tolist() == [ExitReason.STOP_LOSS, ExitReason.SIGNAL]
+    assert result.positions.tolist() == [0, 1000, 0, 0, 0, 0, 0, pytest.approx(95000 / 104), pytest.approx(95000 / 104), 0]
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import data.storage
+from configs.data import DataConfig
+from data.storage import DatasetStore
+from pipeline.feature_loader import FeatureLoader
+from pipeline.indicators import Volatility
+from schemas.backtest import BacktestRequestModel
+
+
+@pytest.fixture
+def storeReads(monkeypatch):
+    """(columns, start, end, rows read) of every dataset read from storage."""
+    reads = []
+    load = DatasetStore.load
+
+    def recordLoad(self, name, columns=None, start=None, end=None):
+        data = load(self, name, columns=columns, start=start, end=end)
+        reads.append((columns, start, end, len(data)))
+        return data
+
+    monkeypatch.setattr(DatasetStore, "load", recordLoad)
+    return reads
+
+
+def test_only_the_projected_columns_and_rows_are_read(rawDataDir, storeReads, monkeypatch):
+    readColumns = []
+    readParquet = data.storage.pd.read_parquet
+
+    def recordReadParquet(path, columns=None, **kwargs):
+        readColumns.append(columns)
+        return readParquet(path, columns=columns, **kwargs)
+
+    monkeypatch.setattr(data.storage.pd, "read_parquet", recordReadParquet)
+
+    loader = FeatureLoader(backtestDate="2025-06-30", columns=["close"], startDate="2025-03-01", endDate="2025-06-30", features=[Volatility(windowSize=24)])
+
+    # The warm-up of the 24-bar volatility and its return are read before the start date, the whole end day is read
+    assert list(loader.data.columns) == ["close"]
+    assert loader.data.index[0] == pd.Timestamp("2025-03-01") - 25 * pd.Timedelta(hours=1)
+    assert loader.data.index[-1] == pd.Timestamp("2025-06-30 23:00")
+    assert storeReads[-1][3] == len(loader.data) == len(rawDataDir.loc["2025-02-27 23:00":"2025-06-30 23:00"])
+    if DataConfig.STORAGE_FORMAT == "parquet":
+        assert readColumns == [["close"]]
+
+
+def makeSettings(**settings) -> BacktestRequestModel:
+    return BacktestRequestModel(**{ "strategyName": "none", "startDate": "2024-03-01", "endDate": "2025-06-30", "positionSizingMode": "fixed", **settings })
+
+
+def test_backtest_request_reads_the_market_columns_of_its_window(rawDataDir, storeReads, backtesterService):
+    loader = backtesterService.createFeatureLoader(makeSettings())
+
+    assert storeReads[-1][:3] == (FeatureLoader.marketColumns, pd.Timestamp("2024-03-01"), makeSettings().endDate)
+    assert list(loader.data.columns) == FeatureLoader.marketColumns
+    assert loader.data.index[0] == pd.Timestamp("2024-03-01") and loader.data.index[-1] == pd.Timestamp("2025-06-30 23:00")
+
+
+def test_walk_forward_and_hmm_requests_read_the_history_up_to_their_last_date(rawDataDir, storeReads, backtesterService):
+    settings = makeSettings(allowForwardTest=True, forwardStartDate="2025-07-01", forwardEndDate="2025-09-30")
+    loader = backtesterService.createFeatureLoader(settings)
+    assert storeReads[-1][1] is None and loader.data.index[-1] == pd.Timestamp("2025-09-30 23:00")
+
+    loader = backtesterService.createFeatureLoader(makeSettings(positionSizingMode="auto"))
+    assert storeReads[-1][1] is None and loader.data.index[-1] == pd.Timestamp("2025-06-30 23:00")
+    assert list(loader.data.columns) == FeatureLoader.marketColumns
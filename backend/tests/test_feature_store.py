@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline.feature_loader
+import pipeline.feature_store
+from pipeline.feature_graph import FeatureGraph
+from pipeline.feature_loader import FeatureLoader
+from pipeline.feature_store import FeatureStore
+from pipeline.indicators import Volatility
+
+
+@pytest.fixture
+def featureStore(tmp_path, monkeypatch):
+    store = FeatureStore(directory=str(tmp_path / "features"))
+    monkeypatch.setattr(pipeline.feature_loader, "getFeatureStore", lambda: store)
+    return store
+
+
+@pytest.fixture
+def fingerprints(monkeypatch):
+    """Columns of every dataset hashed by the feature store."""
+    calls = []
+    fingerprint = pipeline.feature_store._fingerprint
+
+    def recordFingerprint(data, columns):
+        calls.append(columns)
+        return fingerprint(data, columns)
+
+    monkeypatch.setattr(pipeline.feature_store, "_fingerprint", recordFingerprint)
+    return calls
+
+
+def test_put_shares_a_read_only_copy_and_leaves_the_columns_writable(featureStore):
+    column = pd.Series(np.arange(5, dtype=float))
+    featureStore.put("key", { "value": column })
+
+    column.values[0] = 10.0
+    cached = featureStore.get("key")["value"]
+
+    assert cached.iloc[0] == 0.0
+    assert not cached.values.flags.writeable
+    assert column.values.flags.writeable
+
+
+def test_loaded_data_is_keyed_on_its_version_without_hashing_it(rawDataDir, featureStore, fingerprints):
+    def loadVolatility():
+        loader = FeatureLoader(backtestDate="2025-06-30", columns=["close"], startDate="2025-03-01", endDate="2025-06-30", features=[Volatility(windowSize=24)])
+        return loader, loader.loadFeatures(features=[Volatility(windowSize=24)], columns=["volatility"])["volatility"]
+
+    loader, first = loadVolatility()
+    _, second = loadVolatility()
+
+    # The returns and the volatility are served from memory the second time
+    assert featureStore.getStats()["memoryHits"] == 2
+    pd.testing.assert_series_equal(first, second)
+    assert fingerprints == []
+
+    # A new version of the dataset is a new key
+    loader.store.save(rawDataDir.assign(close=rawDataDir["close"] + 10), loader.mergedDataName)
+    _, third = loadVolatility()
+
+    assert featureStore.getStats()["memoryHits"] == 2
+    assert third.index.equals(first.index) and not np.allclose(third.to_numpy(), first.to_numpy(), equal_nan=True)
+
+
+def test_other_data_is_hashed_once_per_computation(featureStore, fingerprints):
+    data = pd.DataFrame({ "close": 100 + np.arange(200.0) % 7 }, index=pd.date_range("2025-01-01", periods=200, freq="h"))
+
+    first = FeatureGraph([Volatility(windowSize=[5, 24])], store=featureStore).transform(data)
+    second = FeatureGraph([Volatility(windowSize=[5, 24])], store=featureStore).transform(data)
+
+    assert fingerprints == [["close"], ["close"]]
+    assert featureStore.getStats()["memoryHits"] == 2
+    pd.testing.assert_frame_equal(first, second)
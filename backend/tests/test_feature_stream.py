@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.feature_graph import FeatureGraph
+from pipeline.feature_stream import FeatureStream
+from pipeline.indicators import AdjustedReturnRate, IndicatorSet, Returns, Volatility
+
+
+def makeData(rows: int = 400) -> pd.DataFrame:
+    """Random walks with leading and scattered missing values, and a flat stretch of the on-chain column."""
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({
+        "close": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows))),
+        "mvrv": np.cumsum(rng.normal(0, 1, rows)),
+        "exchange_reserve": rng.random(rows)
+    }, index=pd.date_range("2025-01-01", periods=rows, freq="h"))
+
+    data.iloc[rng.choice(np.arange(50, rows), 20, replace=False), 0] = np.nan
+    data.iloc[:7, 1] = np.nan
+    data.iloc[100:140, 1] = 1.5
+    data.iloc[rng.choice(rows, 30, replace=False), 2] = np.nan
+    return data
+
+
+TRANSFORMS = { "ema": [1, 12], "rsi": [14], "roc": [1, 24], "zscore": [2, 24], "percentile_rank": [1, 24], "bollinger_pb": [20] }
+
+# Features and relative tolerance. The rolling deviations of the batch are computed from running sums: by pandas for
+# the volatility, to 1e-9, and by `rollingMeanStd` for the indicators, to 1e-6 (see test_rolling)
+FEATURES = {
+    "returns": ([Returns()], 1e-12),
+    "adjustedReturnRate": ([AdjustedReturnRate()], 1e-12),
+    "volatility": ([Volatility(windowSize=24)], 1e-9),
+    "volatilityWindows": ([Volatility(windowSize=[5, 24])], 1e-9),
+    "indicatorSet": ([IndicatorSet(["close", "mvrv", "exchange_reserve"], TRANSFORMS)], 1e-6),
+    "indicatorSetFloat32": ([IndicatorSet(["mvrv"], { "ema": [12], "zscore": [24] }, dtype="float32")], 1e-6),
+    "all": ([AdjustedReturnRate(), Volatility(windowSize=[5, 24]), IndicatorSet(["mvrv"], TRANSFORMS)], 1e-6)
+}
+
+
+@pytest.mark.parametrize("name", FEATURES)
+def test_stream_matches_the_batch_features_bar_by_bar(name):
+    features, rtol = FEATURES[name]
+    data = makeData()
+    graph = FeatureGraph(features, workers=1)
+    batch = graph.transform(data, columns=graph.outputs)
+
+    stream = FeatureStream(features)
+    streamed = pd.DataFrame([stream.update(bar) for _, bar in data.iterrows()], index=data.index)
+
+    assert list(streamed.columns) == list(batch.columns)
+    np.testing.assert_allclose(streamed.to_numpy(), batch.to_numpy(dtype=np.float64), rtol=rtol, atol=rtol)
+
+
+def test_indicator_set_does_not_rebuild_a_dataframe_every_bar(monkeypatch):
+    feature = IndicatorSet(["mvrv"], TRANSFORMS)
+    state = feature.createState()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The batch computation was called")
+
+    monkeypatch.setattr(IndicatorSet, "compute", fail)
+    for value in makeData()["mvrv"].iloc[:50]:
+        outputs = feature.update(state, { "mvrv": value })
+
+    assert len(state["bars"]) == feature.lookback + 1
+    assert list(outputs) == feature.outputs
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from errors.base_exception import BacktesterError
+from pipeline.indicator_engine import IndicatorEngine
+
+
+def makeData(rows: int = 500) -> pd.DataFrame:
+    """Random walks of different scales with leading missing values (warm-up), scattered gaps and a flat stretch."""
+    rng = np.random.default_rng(7)
+    data = pd.DataFrame({
+        "price": 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, rows))),
+        "reserve": 2e6 + np.cumsum(rng.normal(0, 1e3, rows)),
+        "ratio": rng.normal(1, 0.2, rows)
+    }, index=pd.date_range("2025-01-01", periods=rows, freq="h"))
+
+    data.iloc[:5, 0] = np.nan
+    data.iloc[:30, 1] = np.nan
+    data.iloc[rng.choice(np.arange(40, rows), 25, replace=False), 2] = np.nan
+    data.iloc[200:240, 1] = 2e6
+    return data
+
+
+def rsi(values: pd.Series, horizon: int) -> pd.Series:
+    changes = values.diff()
+    gains = changes.clip(lower=0).ewm(alpha=1 / horizon, adjust=False).mean()
+    losses = (-changes).clip(lower=0).ewm(alpha=1 / horizon, adjust=False).mean()
+    return 100 * gains / (gains + losses)
+
+
+def bollingerPercentB(values: pd.Series, horizon: int) -> pd.Series:
+    mean, std = values.rolling(horizon).mean(), values.rolling(horizon).std()
+    lower = mean - 2 * std
+    return (values - lower) / (4 * std)
+
+
+# pandas reference of every transform, applied to a forward-filled column
+REFERENCES = {
+    "ema": lambda values, horizon: values.ewm(span=horizon, adjust=False).mean(),
+    "rsi": rsi,
+    "roc": lambda values, horizon: values / values.shift(horizon) - 1,
+    "zscore": lambda values, horizon: (values - values.rolling(horizon).mean()) / values.rolling(horizon).std(),
+    "percentile_rank": lambda values, horizon: values.rolling(horizon).rank(pct=True),
+    "bollinger_pb": bollingerPercentB
+}
+
+
+@pytest.mark.parametrize("transform", REFERENCES)
+@pytest.mark.parametrize("horizon", [1, 2, 14, 48])
+def test_indicators_match_their_pandas_reference(transform, horizon):
+    data = makeData()
+    result = IndicatorEngine({ transform: [horizon] }).applyFrame(data)
+
+    for column in data.columns:
+        expected = REFERENCES[transform](data[column].ffill(), horizon)
+        actual = result[f"{column}_{transform}_{horizon}"]
+
+        # Same warm-up rows, then the same values to the tolerance of the rolling kernel (see test_rolling)
+        np.testing.assert_array_equal(actual.isna().to_numpy(), expected.isna().to_numpy())
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-6, atol=1e-9)
+
+
+def test_columns_are_named_by_transform_then_column():
+    data = makeData()
+    result = IndicatorEngine({ "ema": [12, 24], "rsi": [14] }).applyFrame(data)
+
+    assert list(result.columns) == [
+        f"{column}_{transform}_{horizon}"
+        for transform, horizon in [("ema", 12), ("ema", 24), ("rsi", 14)] for column in data.columns
+    ]
+    assert result.index.equals(data.index)
+
+
+def test_float32_output_is_the_rounded_float64_output():
+    data = makeData()
+    transforms = { name: [14] for name in REFERENCES }
+
+    result = IndicatorEngine(transforms, dtype="float32").applyFrame(data)
+
+    assert (result.dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(result, IndicatorEngine(transforms).applyFrame(data).astype(np.float32))
+
+
+@pytest.mark.parametrize("transforms", [{ "macd": [12] }, { "ema": [0] }])
+def test_invalid_transforms_are_rejected(transforms):
+    with pytest.raises(BacktesterError) as error:
+        IndicatorEngine(transforms)
+    assert error.value.code == "feature/invalid-transform"
@@ -0,0 +1,111 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics.performance import PERFORMANCE_METRICS, getPerformanceMetrics
+
+BARS_PER_YEAR = 24 * 365
+
+
+def getMetricsOfCurve(equity: np.ndarray, initialCapital: float, tradeReturns: np.ndarray, exposure: np.ndarray, turnover: np.ndarray) -> Dict[str, float]:
+    """Reference: the metrics of a single curve with pandas, one at a time."""
+    curve = pd.Series(equity)
+    returns = curve.pct_change().iloc[1:]
+    drawdowns = 1 - curve / curve.cummax()
+    trades = tradeReturns[~np.isnan(tradeReturns)]
+
+    underwater, duration = 0, 0
+    for drawdown in drawdowns:
+        underwater = underwater + 1 if drawdown > 0 else 0
+        duration = max(duration, underwater)
+
+    growth = equity[-1] / initialCapital
+    annualizedReturn = growth ** (BARS_PER_YEAR / (len(equity) - 1)) - 1 if growth > 0 else -1.0
+    gains, losses = trades[trades > 0].sum(), np.abs(trades[trades < 0]).sum()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "finalEquity": equity[-1],
+            "totalReturn": growth - 1,
+            "annualizedReturn": annualizedReturn,
+            "volatility": returns.std() * np.sqrt(BARS_PER_YEAR),
+            "sharpeRatio": np.float64(returns.mean()) / returns.std() * np.sqrt(BARS_PER_YEAR),
+            "sortinoRatio": np.float64(returns.mean()) / np.sqrt((returns.clip(upper=0) ** 2).mean()) * np.sqrt(BARS_PER_YEAR),
+            "calmarRatio": np.float64(annualizedReturn) / drawdowns.max(),
+            "maxDrawdown": drawdowns.max(),
+            "maxDrawdownDuration": float(duration),
+            "winRate": (trades > 0).mean() if len(trades) else np.nan,
+            "profitFactor": np.float64(gains) / losses if len(trades) else np.nan,
+            "turnover": turnover.sum(),
+            "exposure": exposure.mean()
+        }
+
+
+def makeRuns(bars: int = 500):
+    """
+    Curves of several runs with their trade returns (NaN padded), exposures and turnovers: random runs, a run without
+    trade (flat curve), a run without losing trade (rising curve) and a run losing everything but a little.
+    """
+    rng = np.random.default_rng(11)
+    runs = 6
+    equity = 1000 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, (runs, bars)), axis=1))
+    equity[:, 0] = 1000
+    equity[3] = 1000
+    equity[4] = 1000 * np.linspace(1, 1.5, bars) ** 2
+    equity[5] = 1000 * np.linspace(1, 0.01, bars)
+
+    tradeReturns = np.full((runs, 12), np.nan)
+    tradeReturns[[0, 1, 2]] = rng.normal(1, 20, (3, 12))
+    tradeReturns[4, :5] = rng.uniform(1, 50, 5)
+    tradeReturns[5, :3] = [-500, -400, 10]
+
+    exposure = rng.uniform(0, 1, (runs, bars))
+    exposure[3] = 0.0
+    turnover = rng.uniform(0, 0.1, (runs, bars)) * (rng.random((runs, bars)) < 0.05)
+    turnover[3] = 0.0
+    return equity, tradeReturns, exposure, turnover
+
+
+def test_every_run_of_a_batch_has_the_metrics_of_its_curve():
+    equity, tradeReturns, exposure, turnover = makeRuns()
+
+    batch = getPerformanceMetrics(equity, 1000.0, tradeReturns, exposure, turnover, barsPerYear=BARS_PER_YEAR)
+    assert set(batch) == set(PERFORMANCE_METRICS)
+
+    for run in range(len(equity)):
+        single = getPerformanceMetrics(equity[run], 1000.0, tradeReturns[run], exposure[run], turnover[run], barsPerYear=BARS_PER_YEAR)
+        reference = getMetricsOfCurve(equity[run], 1000.0, tradeReturns[run], exposure[run], turnover[run])
+
+        for name in PERFORMANCE_METRICS:
+            assert batch[name][run] == pytest.approx(single[name], rel=1e-12, nan_ok=True), (run, name)
+            assert batch[name][run] == pytest.approx(reference[name], rel=1e-9, nan_ok=True), (run, name)
+
+
+def test_runs_without_trades_or_losses():
+    equity, tradeReturns, exposure, turnover = makeRuns()
+    metrics = getPerformanceMetrics(equity, 1000.0, tradeReturns, exposure, turnover, barsPerYear=BARS_PER_YEAR)
+
+    # No trade: no return, no risk, and the ratios and trade statistics are undefined
+    assert (metrics["totalReturn"][3], metrics["volatility"][3], metrics["maxDrawdown"][3], metrics["turnover"][3]) == (0, 0, 0, 0)
+    assert np.isnan([metrics[name][3] for name in ("sharpeRatio", "sortinoRatio", "calmarRatio", "winRate", "profitFactor")]).all()
+
+    # No loss: every trade wins, the profit factor and, without drawdown, the Calmar ratio are infinite
+    assert metrics["winRate"][4] == 1 and metrics["profitFactor"][4] == np.inf
+    assert metrics["maxDrawdown"][4] == 0 and metrics["calmarRatio"][4] == np.inf
+    assert metrics["sortinoRatio"][4] == np.inf
+
+    assert metrics["winRate"][5] == pytest.approx(1 / 3) and metrics["profitFactor"][5] == pytest.approx(10 / 900)
+    assert metrics["maxDrawdownDuration"][5] == len(equity[5]) - 1
+
+
+def test_win_rate_and_profit_factor_of_the_bars_without_trade_returns():
+    equity = np.array([[100.0, 110.0, 110.0, 99.0, 108.9]])
+
+    metrics = getPerformanceMetrics(equity)
+
+    # The non-zero bar returns: +10%, -10%, +10%
+    assert metrics["winRate"][0] == pytest.approx(2 / 3)
+    assert metrics["profitFactor"][0] == pytest.approx(2.0)
+    assert np.isnan(metrics["turnover"][0]) and np.isnan(metrics["exposure"][0])
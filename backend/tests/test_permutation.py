@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from engine.permutation import PERMUTATION_ARRAYS, PERMUTATION_METRICS, _getBlock, permuteBars, runPermutationTest
+from engine.vectorized import VectorizedBacktester
+
+
+def makeArrays(bars: int = 300, seed: int = 3):
+    """Random OHLC bars with gaps at the opens, random signals and position fractions."""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    openPrices = np.concatenate([[100.0], closes[:-1]]) * np.exp(rng.normal(0, 0.002, bars))
+    highPrices = np.maximum(openPrices, closes) * (1 + np.abs(rng.normal(0, 0.005, bars)))
+    lowPrices = np.minimum(openPrices, closes) * (1 - np.abs(rng.normal(0, 0.005, bars)))
+
+    return {
+        "prices": closes,
+        "signals": rng.choice([0, 1, -1], bars, p=[0.8, 0.1, 0.1]).astype(float),
+        "fractions": rng.uniform(0.2, 1.0, bars),
+        "openPrices": openPrices,
+        "highPrices": highPrices,
+        "lowPrices": lowPrices
+    }
+
+
+def getBarShapes(block: np.ndarray) -> np.ndarray:
+    """Gap from the previous close, and close, high and low relative to the open, of every bar after the first."""
+    closes, opens, highs, lows = np.log(block[:4])
+    return np.stack([opens[1:] - closes[:-1], closes[1:] - opens[1:], highs[1:] - opens[1:], lows[1:] - opens[1:]], axis=1)
+
+
+@pytest.mark.parametrize("method", ["shuffle", "block"])
+def test_results_only_depend_on_the_seed(method):
+    arrays = makeArrays()
+    backtester = VectorizedBacktester(commissionRate=0.001, stopLoss=0.01, takeProfit=0.02)
+    settings = dict(metric="sharpeRatio", permutations=20, method=method, blockSize=8, seed=42)
+
+    single = runPermutationTest(backtester, arrays, workers=1, **settings)
+    pooled = runPermutationTest(backtester, arrays, workers=3, **settings)
+
+    np.testing.assert_array_equal(pooled.distribution, single.distribution)
+    assert (pooled.observed, pooled.pValue) == (single.observed, single.pValue)
+
+    other = runPermutationTest(backtester, arrays, workers=1, **{ **settings, "seed": 43 })
+    assert not np.array_equal(other.distribution, single.distribution)
+
+
+def test_shuffled_bars_keep_their_gaps_and_offsets_from_the_open():
+    block = _getBlock(makeArrays())
+
+    permuted = permuteBars(block, np.random.default_rng(0), "shuffle", 1)
+
+    # Every bar is moved once: the same bar shapes in another order
+    shapes, permutedShapes = getBarShapes(block), getBarShapes(permuted)
+    assert not np.allclose(permutedShapes, shapes)
+    np.testing.assert_allclose(permutedShapes[np.lexsort(permutedShapes.T)], shapes[np.lexsort(shapes.T)], atol=1e-12)
+
+    # The first bar, the signals and the fractions stay in place, and the lows and highs still hold the bars
+    np.testing.assert_array_equal(permuted[:, 0], block[:, 0])
+    np.testing.assert_array_equal(permuted[PERMUTATION_ARRAYS.index("signals"):], block[PERMUTATION_ARRAYS.index("signals"):])
+    assert np.all(permuted[3] <= np.minimum(permuted[0], permuted[1]) * (1 + 1e-12))
+    assert np.all(permuted[2] >= np.maximum(permuted[0], permuted[1]) * (1 - 1e-12))
+
+
+def test_blocks_are_runs_of_consecutive_bars():
+    block = _getBlock(makeArrays())
+    blockSize = 10
+
+    permuted = permuteBars(block, np.random.default_rng(1), "block", blockSize)
+
+    # Every permuted bar is a real bar, and each block of bars follows each other in the real prices
+    shapes, permutedShapes = getBarShapes(block), getBarShapes(permuted)
+    distances = np.abs(permutedShapes[:, None, :] - shapes[None, :, :]).max(axis=2)
+    order = distances.argmin(axis=1)
+    assert np.all(distances.min(axis=1) < 1e-12)
+
+    for start in range(0, len(order), blockSize):
+        steps = np.diff(order[start:start + blockSize]) % len(shapes)
+        assert np.all(steps == 1)
+
+
+@pytest.mark.parametrize("metric", ["sharpeRatio", "maxDrawdown"])
+def test_p_value_is_the_share_of_permutations_doing_as_well(metric):
+    arrays = makeArrays()
+    permutations = 30
+
+    result = runPermutationTest(VectorizedBacktester(commissionRate=0.001), arrays, metric=metric, permutations=permutations, seed=7, workers=1)
+
+    better = result.distribution >= result.observed if PERMUTATION_METRICS[metric] else result.distribution <= result.observed
+    assert 1 / (1 + permutations) <= result.pValue <= 1
+    assert result.pValue == (1 + np.count_nonzero(better)) / (1 + permutations)
+    assert len(result.distribution) == permutations and not np.isnan(result.distribution).any()
+
+
+def test_strategy_without_trades_has_no_p_value():
+    arrays = { **makeArrays(), "signals": np.zeros(300) }
+
+    result = runPermutationTest(VectorizedBacktester(), arrays, metric="sharpeRatio", permutations=5, seed=7, workers=1)
+
+    assert np.isnan(result.observed) and result.pValue is None
+    assert result.toResponseModel().observed is None
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.rolling import rollingMeanStd, rollingZScore
+
+
+WINDOWS = [1, 5, 24, 168]
+
+
+def makeFrame(rows: int = 5000) -> pd.DataFrame:
+    """A column with missing values, a constant one, one with constant stretches and a trending one of a large level."""
+    rng = np.random.default_rng(7)
+
+    withNaN = rng.normal(0, 1, rows)
+    withNaN[rng.random(rows) < 0.05] = np.nan
+    withNaN[1000:1300] = np.nan
+
+    stretches = rng.normal(0, 1, rows)
+    stretches[2000:2400] = 3.0
+    stretches[4000:4030] = np.nan
+    stretches[4030:4300] = -1.5
+
+    trending = 1e9 + np.arange(rows) * 1e5 + rng.normal(0, 10, rows)
+
+    return pd.DataFrame({ "withNaN": withNaN, "constant": np.full(rows, 42.0), "stretches": stretches, "trending": trending })
+
+
+def assertMatches(actual: np.ndarray, expected: pd.DataFrame, rtol: float = 1e-6) -> None:
+    """Same missing values and zero deviations, and values within `rtol` (the prefix sums of the trending column lose
+    about 1e-6 on its 5-bar deviations, 1e-4 of its trend over a block)."""
+    expected = expected.to_numpy()
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_array_equal(actual == 0, expected == 0)
+    np.testing.assert_allclose(actual, expected, rtol=rtol, atol=0)
+
+
+@pytest.mark.parametrize("minPeriods", [None, 1, 3])
+def test_rolling_mean_std_matches_pandas(minPeriods):
+    data = makeFrame()
+    # pandas does not accept fewer bars than min_periods in a window
+    windows = [window for window in WINDOWS if minPeriods is None or window >= minPeriods]
+    results = rollingMeanStd(data.to_numpy(), windows, minPeriods=minPeriods)
+
+    for window in windows:
+        mean, std = results[window]
+        rolling = data.rolling(window, min_periods=minPeriods)
+        assertMatches(mean, rolling.mean())
+        assertMatches(std, rolling.std())
+
+
+def test_rolling_mean_std_of_a_vector():
+    data = makeFrame()["stretches"]
+    mean, std = rollingMeanStd(data.to_numpy(), [24])[24]
+
+    assert mean.shape == std.shape == (len(data),)
+    assertMatches(std, data.rolling(24).std())
+
+
+def test_constant_windows_have_zero_deviation():
+    data = makeFrame()
+    mean, std = rollingMeanStd(data.to_numpy(), [24])[24]
+
+    assert (std[23:, 1] == 0).all()
+    assert (mean[23:, 1] == 42.0).all()
+    assert (std[2023:2400, 2] == 0).all()
+    assert (mean[2023:2400, 2] == 3.0).all()
+
+
+def test_rolling_zscore_matches_pandas():
+    data = makeFrame()
+    expected = (data - data.rolling(720, min_periods=1).mean()) / data.rolling(720, min_periods=1).std().replace(0, 1)
+
+    result = rollingZScore(data, window=720, minPeriods=1)
+
+    assert list(result.columns) == list(data.columns)
+    assert result.index.equals(data.index)
+    # The deviations of the trending column are 1e-4 of its level: compare the z-scores on their own scale
+    np.testing.assert_array_equal(result.isna().to_numpy(), expected.isna().to_numpy())
+    np.testing.assert_allclose(result.fillna(0).to_numpy(), expected.fillna(0).to_numpy(), rtol=1e-6, atol=1e-6)
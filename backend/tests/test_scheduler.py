@@ -0,0 +1,179 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from aiohttp import web
+
+from data.api_client import AsyncAPIClient
+from data.scheduler import RequestScheduler, TokenBucket
+from errors.base_exception import BacktesterError
+
+
+class StubProvider:
+    """
+    Local provider answering the scripted (status, headers) of every path in turn, then 200 with an empty page.
+    The arrival time of every request is recorded per path.
+    """
+
+    def __init__(self, script: Optional[Dict[str, List[Tuple[int, Dict[str, str]]]]] = None):
+        self.script = { path: list(responses) for path, responses in (script or {}).items() }
+        self.arrivals: Dict[str, List[float]] = {}
+        self.runner: Optional[web.AppRunner] = None
+        self.baseUrl = ""
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.arrivals.setdefault(request.path, []).append(time.monotonic())
+        responses = self.script.get(request.path)
+
+        if responses:
+            status, headers = responses.pop(0)
+            return web.json_response({ "error": status }, status=status, headers=headers)
+
+        return web.json_response({ "data": [] })
+
+    async def __aenter__(self) -> "StubProvider":
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+
+        port = self.runner.addresses[0][1]
+        self.baseUrl = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.runner.cleanup()
+
+
+async def fetch(provider: StubProvider, scheduler: RequestScheduler, endpoints: List[str]) -> List:
+    """Request the endpoints concurrently through an AsyncAPIClient, the errors are returned in place of the data."""
+    async with AsyncAPIClient(provider="stub", apiKey="key", scheduler=scheduler) as client:
+        client.baseUrl = provider.baseUrl
+        return await asyncio.gather(*(client.get(endpoint) for endpoint in endpoints), return_exceptions=True)
+
+
+def makeScheduler(**settings) -> RequestScheduler:
+    """Fast scheduler: no pacing and millisecond backoffs unless overridden."""
+    defaults = dict(rate=1000.0, burst=1000, maxRetries=5, baseDelay=0.001, maxDelay=0.01, budgetRatio=1.0, minBudget=100, seed=1)
+    return RequestScheduler(**{ **defaults, **settings })
+
+
+def test_retries_throttled_and_server_errors_until_success():
+    async def run():
+        script = { "/stub/flows": [(429, {}), (503, {}), (500, {})] }
+        async with StubProvider(script) as provider:
+            scheduler = makeScheduler()
+            result = await fetch(provider, scheduler, ["flows"])
+            return result, provider.arrivals, scheduler.getStats()
+
+    result, arrivals, stats = asyncio.run(run())
+
+    assert result == [{ "data": [] }]
+    assert len(arrivals["/stub/flows"]) == 4
+    assert stats == { "requests": 4, "retries": 3, "throttled": 1, "budgetExhausted": 0 }
+
+
+def test_gives_up_after_max_retries():
+    async def run():
+        async with StubProvider({ "/stub/flows": [(502, {})] * 10 }) as provider:
+            result = await fetch(provider, makeScheduler(maxRetries=3), ["flows"])
+            return result, provider.arrivals
+
+    result, arrivals = asyncio.run(run())
+
+    assert isinstance(result[0], BacktesterError) and result[0].code == "data/fail-to-fetch-data"
+    assert len(arrivals["/stub/flows"]) == 4    # The first attempt and 3 retries
+
+
+def test_client_errors_are_not_retried():
+    async def run():
+        async with StubProvider({ "/stub/flows": [(404, {})] }) as provider:
+            scheduler = makeScheduler()
+            result = await fetch(provider, scheduler, ["flows"])
+            return result, provider.arrivals, scheduler.getStats()
+
+    result, arrivals, stats = asyncio.run(run())
+
+    assert isinstance(result[0], BacktesterError)
+    assert len(arrivals["/stub/flows"]) == 1
+    assert stats["retries"] == 0
+
+
+def test_retry_budget_is_shared_by_all_requests():
+    async def run():
+        script = { f"/stub/flows{index}": [(503, {})] * 10 for index in range(4) }
+        async with StubProvider(script) as provider:
+            scheduler = makeScheduler(maxRetries=10, budgetRatio=0.5, minBudget=2)
+            result = await fetch(provider, scheduler, [f"flows{index}" for index in range(4)])
+            return result, provider.arrivals, scheduler.getStats()
+
+    result, arrivals, stats = asyncio.run(run())
+
+    assert all(isinstance(error, BacktesterError) for error in result)
+    # A retry is allowed while retries < minBudget + budgetRatio * requests, and every retry is one more request:
+    # the 4 requests stop at 8 retries (8 >= 2 + 0.5 * 12) instead of the 40 of maxRetries
+    assert stats == { "requests": 12, "retries": 8, "throttled": 0, "budgetExhausted": 4 }
+    assert sum(len(times) for times in arrivals.values()) == 12
+
+
+def test_retry_after_pauses_every_request_and_is_capped():
+    async def run():
+        script = { "/stub/flows": [(429, { "Retry-After": "0.3" })], "/stub/slow": [(429, { "Retry-After": "3600" })] }
+        async with StubProvider(script) as provider:
+            scheduler = makeScheduler(maxDelay=0.5)
+            start = time.monotonic()
+            result = await fetch(provider, scheduler, ["flows", "other"])
+            flowsTimes = [at - start for at in provider.arrivals["/stub/flows"]]
+
+            start = time.monotonic()
+            await fetch(provider, scheduler, ["slow"])
+            slowTimes = [at - start for at in provider.arrivals["/stub/slow"]]
+            return result, flowsTimes, slowTimes
+
+    result, flowsTimes, slowTimes = asyncio.run(run())
+
+    assert result == [{ "data": [] }] * 2
+    assert 0.3 <= flowsTimes[1] < 0.45
+    # A Retry-After longer than maxDelay waits maxDelay
+    assert 0.5 <= slowTimes[1] - slowTimes[0] < 0.65
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_backoff_delays_are_bounded(attempt):
+    scheduler = RequestScheduler(rate=1.0, burst=1, maxRetries=10, baseDelay=0.5, maxDelay=4.0, budgetRatio=0.0, minBudget=10 ** 6, seed=attempt)
+    bound = min(4.0, 0.5 * 2 ** attempt)
+
+    delays = [scheduler._getRetryDelay(attempt, 503, None) for _ in range(500)]
+
+    assert all(0 <= delay <= bound for delay in delays)
+    # Full jitter: the delays spread over the whole interval
+    assert min(delays) < 0.1 * bound and max(delays) > 0.9 * bound
+
+
+def test_token_bucket_paces_requests_at_the_rate():
+    async def run():
+        async with StubProvider() as provider:
+            scheduler = makeScheduler(rate=40.0, burst=5)
+            start = time.monotonic()
+            await fetch(provider, scheduler, [f"flows{index}" for index in range(25)])
+            return sorted(at - start for times in provider.arrivals.values() for at in times)
+
+    arrivals = asyncio.run(run())
+
+    assert len(arrivals) == 25
+    # The burst goes out at once, the next 20 requests at 40 per second
+    assert arrivals[4] < 0.1
+    assert 0.5 - 0.02 <= arrivals[-1] < 0.5 + 0.15
+    assert all(arrivals[index] >= (index - 4) / 40 - 0.02 for index in range(5, 25))
+
+
+def test_token_bucket_reservations():
+    bucket = TokenBucket(rate=10.0, capacity=2)
+
+    waits = [bucket.reserve() for _ in range(5)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from configs.backtest import BacktestConfig
+from engine.sweep import SweepTask, expandGrid, rankResults, runSweep, toRows
+from engine.vectorized import VectorizedBacktester
+from errors.base_exception import BacktesterError
+
+
+def makeArrays(bars: int = 200):
+    """Rising prices with two round trips: every trade wins unless the commission eats the gain."""
+    prices = 100 * 1.001 ** np.arange(bars)
+    signals = np.zeros(bars)
+    signals[[10, 80]] = 1
+    signals[[50, 150]] = -1
+    return { "prices": prices, "signals": signals, "fractions": 1.0, "openPrices": prices / 1.001, "highPrices": prices, "lowPrices": prices / 1.002 }
+
+
+def test_rank_results_orders_infinite_values_as_the_best_and_worst():
+    table = pd.DataFrame({
+        "stopLoss": [0.01, 0.02, 0.03, 0.04, 0.05],
+        "profitFactor": [1.5, np.inf, np.nan, 0.5, -np.inf],
+        "maxDrawdown": [0.2, np.nan, 0.1, np.inf, 0.3]
+    })
+
+    # Higher is better: inf first, -inf last of the values, the missing values after them
+    assert rankResults(table, "profitFactor")["stopLoss"].tolist() == [0.02, 0.01, 0.04, 0.05, 0.03]
+    # Lower is better
+    assert rankResults(table, "maxDrawdown")["stopLoss"].tolist() == [0.03, 0.01, 0.05, 0.04, 0.02]
+    assert rankResults(table, "profitFactor", top=2)["stopLoss"].tolist() == [0.02, 0.01]
+
+
+def test_rank_results_rejects_unknown_metrics():
+    with pytest.raises(BacktesterError) as error:
+        rankResults(pd.DataFrame({ "x": [1] }), "luck")
+    assert error.value.code == "backtest/invalid-sweep-metric"
+
+
+def test_sweep_table_ranks_runs_without_losses_first_and_serialises_them_as_none():
+    groups, scalars = expandGrid({ "commissionRate": [0.05, 0.0], "stopLoss": [None, 0.5] }, defaults={})
+    task = SweepTask(groups[0], VectorizedBacktester(), makeArrays(), scalars)
+
+    table = rankResults(runSweep([task], workers=1), "profitFactor")
+    rows = toRows(table)
+
+    # Without commission both trades win: no loss, an infinite profit factor, ranked first
+    assert table["commissionRate"].tolist() == [0.0, 0.0, 0.05, 0.05]
+    assert np.isinf(table["profitFactor"].iloc[:2]).all() and np.isfinite(table["profitFactor"].iloc[2:]).all()
+
+    profitFactor = table.columns.get_loc("profitFactor")
+    stopLoss = table.columns.get_loc("stopLoss")
+    assert [row[profitFactor] for row in rows[:2]] == [None, None]
+    assert all(isinstance(row[profitFactor], float) for row in rows[2:])
+    assert [row[stopLoss] for row in rows] == [None, 0.5, None, 0.5]
+
+
+def makeRandomArrays(bars: int = 1000, seed: int = 2):
+    """Random walk with random signals and position fractions, and bars wide enough to reach the stops and targets."""
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    openPrices = np.concatenate([[100.0], prices[:-1]])
+    return {
+        "prices": prices,
+        "signals": rng.choice([0.0, 1.0, -1.0], bars, p=[0.9, 0.05, 0.05]),
+        "fractions": rng.uniform(0.2, 1.0, bars),
+        "openPrices": openPrices,
+        "highPrices": np.maximum(openPrices, prices) * 1.004,
+        "lowPrices": np.minimum(openPrices, prices) * 0.996
+    }
+
+
+@pytest.mark.parametrize("minCommission", [0.0, 20.0])
+def test_every_batch_run_equals_a_single_run_with_its_scalars(minCommission):
+    arrays = makeRandomArrays()
+    _, scalars = expandGrid({ "commissionRate": [0.0, 0.001], "maxPositionSize": [0.5, 1.0], "stopLoss": [None, 0.01], "takeProfit": [None, 0.02] }, defaults={})
+
+    batch = VectorizedBacktester(minCommission=minCommission).runBatch(
+        arrays["prices"], arrays["signals"], arrays["fractions"],
+        commissionRates=scalars["commissionRate"], maxFractions=scalars["maxPositionSize"], stopLoss=scalars["stopLoss"], takeProfit=scalars["takeProfit"],
+        openPrices=arrays["openPrices"], highPrices=arrays["highPrices"], lowPrices=arrays["lowPrices"])
+
+    for run in range(len(scalars["stopLoss"])):
+        stopLoss, takeProfit = scalars["stopLoss"][run], scalars["takeProfit"][run]
+        backtester = VectorizedBacktester(
+            commissionRate=scalars["commissionRate"][run],
+            minCommission=minCommission,
+            stopLoss=None if np.isnan(stopLoss) else stopLoss,
+            takeProfit=None if np.isnan(takeProfit) else takeProfit)
+        result = backtester.run(**{ **arrays, "fractions": np.minimum(arrays["fractions"], scalars["maxPositionSize"][run]) })
+
+        expected = { **result.getMetrics(), "numberOfTrades": result.numberOfTrades, "totalCommission": result.commissions.sum() }
+        assert set(batch) == set(expected)
+        for name, value in expected.items():
+            assert batch[name][run] == pytest.approx(value, rel=1e-9, nan_ok=True), name
+
+
+def test_sweep_rows_equal_single_runs():
+    arrays = makeRandomArrays(seed=4)
+    groups, scalars = expandGrid({ "stopLoss": [0.01, 0.02], "takeProfit": [0.03] }, defaults={ "maxPositionSize": None, "commissionRate": 0.001 })
+
+    table = runSweep([SweepTask(groups[0], VectorizedBacktester(), arrays, scalars)], workers=1)
+
+    for row in table.itertuples():
+        result = VectorizedBacktester(commissionRate=0.001, stopLoss=row.stopLoss, takeProfit=row.takeProfit).run(**arrays)
+        assert np.isnan(row.maxPositionSize)    # Not capped
+        assert row.totalReturn == pytest.approx(result.getMetrics()["totalReturn"], rel=1e-9)
+        assert row.numberOfTrades == result.numberOfTrades
+
+
+def test_expand_grid_splits_the_groups_and_the_scalar_combinations():
+    groups, scalars = expandGrid(
+        { "strategyName": ["a", "b"], "entryExitMode": ["x"], "stopLoss": [None, 0.01, 0.02], "commissionRate": [0.0, 2.5] },
+        defaults={ "maxPositionSize": 0.5, "takeProfit": None })
+
+    assert groups == [{ "strategyName": "a", "entryExitMode": "x" }, { "strategyName": "b", "entryExitMode": "x" }]
+    assert set(scalars) == { "maxPositionSize", "stopLoss", "takeProfit", "commissionRate" }
+    assert all(len(values) == 6 for values in scalars.values())
+    assert (scalars["maxPositionSize"] == 0.5).all() and np.isnan(scalars["takeProfit"]).all()
+    assert sorted(zip(np.nan_to_num(scalars["stopLoss"], nan=-1), scalars["commissionRate"])) == sorted(
+        (stopLoss, commissionRate) for stopLoss in (-1, 0.01, 0.02) for commissionRate in (0.0, 2.5))
+
+
+@pytest.mark.parametrize("grid", [
+    { "leverage": [1, 2] },                 # Not a sweepable parameter
+    { "stopLoss": [] },
+    { "stopLoss": [-0.01] },
+    { "takeProfit": [1.5] },
+    { "maxPositionSize": [True] },
+    { "commissionRate": ["0.001"] },
+    { "commissionRate": [-0.001] }
+])
+def test_expand_grid_rejects_invalid_grids(grid):
+    with pytest.raises(BacktesterError) as error:
+        expandGrid(grid, defaults={})
+    assert error.value.code == "backtest/invalid-sweep-parameter"
+
+
+def test_expand_grid_limits_the_number_of_runs(monkeypatch):
+    monkeypatch.setattr(BacktestConfig, "SWEEP_MAX_RUNS", 12)
+    grid = { "strategyName": ["a", "b"], "stopLoss": [0.01, 0.02, 0.03], "takeProfit": [0.01, 0.02] }
+
+    groups, scalars = expandGrid(grid, defaults={})
+    assert len(groups) * len(scalars["stopLoss"]) == 12
+
+    with pytest.raises(BacktesterError) as error:
+        expandGrid({ **grid, "commissionRate": [0.0, 0.001] }, defaults={})
+    assert error.value.code == "backtest/invalid-sweep-parameter" and "24 runs" in error.value.details
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.event_driven import BUY, SELL, EventDrivenBacktester
+from engine.vectorized import VectorizedBacktester
+from schemas.order import OrderStatus
+
+
+def makeFixture(bars: int = 300, seed: int = 5):
+    """
+    Random-walk closes and random signals, with redundant signals, a signal on the last bar and a trade left open.
+    The loop engine sizes a BUY at the close of the signal bar and the vectorized one at the fill price: the price is
+    flat from every BUY signal to its fill, so both invest the same quantity.
+    """
+    rng = np.random.default_rng(seed)
+    signals = rng.choice([0, 1, -1], bars, p=[0.9, 0.05, 0.05]).astype(float)
+    signals[-4:] = [-1, 1, 0, -1]
+
+    steps = rng.normal(0, 0.01, bars)
+    steps[1:][signals[:-1] > 0] = 0.0
+    prices = 100 * np.exp(np.cumsum(steps))
+    fractions = rng.uniform(0.2, 1.0, bars)
+
+    # One price per bar: the loop engine fills at the open of the next bar, the vectorized engine at its close
+    data = pd.DataFrame({ "open": prices, "high": prices, "low": prices, "close": prices }, index=pd.date_range("2025-01-01", periods=bars, freq="h"))
+    return data, signals, fractions
+
+
+@pytest.mark.parametrize("useFractions, minCommission", [(False, 0.0), (True, 0.0), (False, 150.0)])
+def test_run_matches_the_loop_engine(useFractions, minCommission):
+    data, signals, fractions = makeFixture()
+    fractions = fractions if useFractions else 1.0
+    settings = dict(initialCapital=100000.0, commissionRate=0.001, minCommission=minCommission)
+
+    vectorized = VectorizedBacktester(**settings).run(data["close"].to_numpy(), signals, fractions)
+    loop = EventDrivenBacktester(**settings).runSignals(data, signals, fractions)
+    fills = loop.trades.toFrame()
+    buys, sells = fills[fills["side"] == BUY], fills[fills["side"] == SELL]
+
+    # Equity, cash and position at every bar
+    np.testing.assert_allclose(vectorized.equity, loop.equity, rtol=1e-12)
+    np.testing.assert_allclose(vectorized.cash, loop.cash, rtol=1e-12, atol=1e-6)
+    np.testing.assert_allclose(vectorized.positions, loop.positions, rtol=1e-12)
+
+    # Same fills: the SELL of the last bar is never filled, the last trade is still open
+    assert vectorized.numberOfTrades == len(buys) == len(sells) + 1
+    assert vectorized.exitBars[-1] == -1 and loop.orders[-1].side == SELL and loop.orders[-1].status == OrderStatus.PENDING
+    np.testing.assert_array_equal(vectorized.entryBars, buys["timestamp"])     # Bars of the fills without an index
+    np.testing.assert_array_equal(vectorized.exitBars[:-1], sells["timestamp"])
+    np.testing.assert_allclose(vectorized.entryPrices, buys["price"], rtol=1e-12)
+    np.testing.assert_allclose(vectorized.exitPrices[:-1], sells["price"], rtol=1e-12)
+    np.testing.assert_allclose(vectorized.quantities, buys["quantity"], rtol=1e-12)
+
+    commissions = buys["commission"].to_numpy().copy()
+    commissions[:-1] += sells["commission"].to_numpy()
+    np.testing.assert_allclose(vectorized.commissions, commissions, rtol=1e-12)
+    assert vectorized.finalEquity == pytest.approx(loop.finalEquity, rel=1e-12)
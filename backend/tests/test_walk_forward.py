@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import importModelModule
+from configs.backtest import BacktestConfig
+from configs.path import PathConfig
+from engine.vectorized import VectorizedBacktester
+from errors.base_exception import BacktesterError
+
+INDEX = pd.date_range("2024-01-01", "2024-03-31 23:00", freq="h")
+
+
+@pytest.fixture
+def walkForward(monkeypatch):
+    monkeypatch.setattr(BacktestConfig, "WALK_FORWARD_MIN_TRAIN_BARS", 24)
+    return importModelModule("engine.walk_forward")
+
+
+def getWindows(folds):
+    return [(fold.trainStart, fold.trainEnd, fold.testStart, fold.testEnd) for fold in folds]
+
+
+def test_test_windows_are_half_open_but_the_last_one(walkForward):
+    folds = walkForward.getFolds(INDEX, "2024-02-01", "2024-03-01", mode="rolling", trainPeriod=pd.Timedelta(days=10), testPeriod=pd.Timedelta(days=10))
+
+    assert [fold.number for fold in folds] == [1, 2, 3]
+    assert [(fold.testStart, fold.testEnd) for fold in folds] == [
+        (pd.Timestamp("2024-02-01"), pd.Timestamp("2024-02-10 23:00")),
+        (pd.Timestamp("2024-02-11"), pd.Timestamp("2024-02-20 23:00")),
+        (pd.Timestamp("2024-03-01") - pd.Timedelta(days=9), pd.Timestamp("2024-03-01"))    # Inclusive of the end date
+    ]
+
+    # The test windows cover every bar of the forward period once
+    testBars = np.concatenate([INDEX[(INDEX >= fold.testStart) & (INDEX <= fold.testEnd)] for fold in folds])
+    np.testing.assert_array_equal(testBars, INDEX[(INDEX >= "2024-02-01") & (INDEX <= "2024-03-01")])
+
+
+def test_rolling_and_expanding_train_windows(walkForward):
+    settings = dict(trainStart="2024-01-05", trainPeriod=pd.Timedelta(days=10), testPeriod=pd.Timedelta(days=10))
+
+    rolling = walkForward.getFolds(INDEX, "2024-02-01", "2024-03-01", mode="rolling", **settings)
+    expanding = walkForward.getFolds(INDEX, "2024-02-01", "2024-03-01", mode="expanding", **settings)
+
+    # Both train up to the bar before the test window, from the same length of bars or from the train start
+    for rollingFold, expandingFold in zip(rolling, expanding):
+        assert rollingFold.trainEnd == expandingFold.trainEnd == rollingFold.testStart - pd.Timedelta(hours=1)
+        assert rollingFold.trainStart == rollingFold.testStart - pd.Timedelta(days=10)
+        assert expandingFold.trainStart == pd.Timestamp("2024-01-05")
+    assert getWindows(rolling) != getWindows(expanding)
+
+
+def test_windows_without_bars_are_skipped(walkForward):
+    index = INDEX[(INDEX < "2024-02-11") | (INDEX >= "2024-02-21")]
+
+    folds = walkForward.getFolds(index, "2024-02-01", "2024-03-01", mode="expanding", testPeriod=pd.Timedelta(days=10))
+
+    assert [(fold.number, fold.testStart) for fold in folds] == [(1, pd.Timestamp("2024-02-01")), (2, pd.Timestamp("2024-02-21"))]
+
+
+@pytest.mark.parametrize("settings", [
+    dict(mode="sliding"),
+    dict(trainPeriod=pd.Timedelta(hours=12)),       # Fewer bars to train on than WALK_FORWARD_MIN_TRAIN_BARS
+    dict(testPeriod=pd.Timedelta(0)),
+    dict(testEnd="2024-01-15")
+])
+def test_invalid_folds_are_rejected(walkForward, settings):
+    settings = { "testStart": "2024-02-01", "testEnd": "2024-03-01", "mode": "rolling", "trainPeriod": pd.Timedelta(days=10), **settings }
+
+    with pytest.raises(BacktesterError) as error:
+        walkForward.getFolds(INDEX, **settings)
+    assert error.value.code in ("backtest/invalid-walk-forward", "backtest/invalid-date-interval")
+
+
+def test_fitted_fold_models_are_reloaded_instead_of_refitted(walkForward, tmp_path, monkeypatch):
+    monkeypatch.setattr(PathConfig, "MODELS_DIR", str(tmp_path))
+    fits = []
+    fit = walkForward.HMMRegimeModel.fit
+    monkeypatch.setattr(walkForward.HMMRegimeModel, "fit", lambda model, *args, **kwargs: (fits.append(model.modelPath), fit(model, *args, **kwargs))[1])
+
+    rng = np.random.default_rng(0)
+    prices = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(INDEX)))), index=INDEX)
+    features = pd.DataFrame({ "daily_return": prices.pct_change().fillna(0), "volatility": rng.random(len(INDEX)) }, index=INDEX)
+    signals = pd.Series(rng.choice([0, 1, -1], len(INDEX), p=[0.9, 0.05, 0.05]).astype(float), index=INDEX)
+    folds = walkForward.getFolds(INDEX, "2024-02-01", "2024-03-01", mode="rolling", trainPeriod=pd.Timedelta(days=10), testPeriod=pd.Timedelta(days=10))
+
+    def runWalkForward(regimeFeatures):
+        return walkForward.runWalkForward(VectorizedBacktester(), prices, signals, 1.0, folds, regimeFeatures=regimeFeatures, workers=1)
+
+    first = runWalkForward(features)
+    assert first.cachedFolds == [False, False, False] and len(fits) == 3
+    assert all(os.path.exists(path) for path in fits)
+
+    second = runWalkForward(features)
+    assert second.cachedFolds == [True, True, True] and len(fits) == 3
+    np.testing.assert_array_equal(second.result.equity, first.result.equity)
+
+    # Other train data is another model: only the fold training on the changed bar is fitted again
+    changed = features.copy()
+    changed.loc["2024-02-15 12:00", "volatility"] += 1
+    third = runWalkForward(changed)
+    assert third.cachedFolds == [True, True, False] and fits[3:] == [walkForward.getFoldModelPath("hmm", folds[2], { "optimize": False }, changed.loc[folds[2].trainStart:folds[2].trainEnd])]